@@ -20,46 +20,71 @@ import {
 import Swal from 'sweetalert2';
 
 const TimetableList = () => {
-    const [timetables, setTimetables] = useState([]);
+    const [courses, setCourses] = useState([]);
+    const [grid, setGrid] = useState(null);
     const [loading, setLoading] = useState(true);
     const [error, setError] = useState(null);
     const [selectedCourseId, setSelectedCourseId] = useState(null);
-    
-    const daysOfWeek = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday'];
 
-    // Fetch all timetables on component mount
+    // Fetch the course list on mount; timetables are loaded one course at a time
     useEffect(() => {
-        const fetchTimetables = async () => {
+        const fetchCourses = async () => {
             try {
-                const response = await axios.get('http://127.0.0.1:8000/api/timetables/');
-
-                // Group timetables by course
-                const groupedByCourse = response.data.reduce((acc, timetable) => {
-                    const courseId = timetable.course.id;
-                    if (!acc[courseId]) {
-                        acc[courseId] = {
-                            courseName: timetable.course.name,
-                            timetables: []
-                        };
-                    }
-                    acc[courseId].timetables.push(timetable);
-                    return acc;
-                }, {});
-
-                setTimetables(groupedByCourse);
-                setSelectedCourseId(Object.keys(groupedByCourse)[0]); // Select first course by default
+                const response = await axios.get('http://127.0.0.1:8000/api/courses/');
+                setCourses(response.data);
+                if (response.data.length > 0) {
+                    setSelectedCourseId(response.data[0].id); // Select first course by default
+                }
                 setLoading(false);
             } catch (err) {
-                setError('Error fetching timetables');
+                setError('Error fetching courses');
                 setLoading(false);
             }
         };
-        fetchTimetables();
+        fetchCourses();
     }, []);
 
+    // Fetch the day x period grid of the selected course
+    useEffect(() => {
+        if (selectedCourseId === null) return;
+        setGrid(null);
+        const fetchGrid = async () => {
+            try {
+                const response = await axios.get(`http://127.0.0.1:8000/api/timetables/courses/${selectedCourseId}/grid/`);
+                setGrid(response.data);
+            } catch (err) {
+                setError('Error fetching timetables');
+            }
+        };
+        fetchGrid();
+    }, [selectedCourseId]);
+
+    // Generation runs as a background job; poll it until it finishes
+    const waitForGeneration = async (jobId) => {
+        while (true) {
+            const response = await axios.get(`http://127.0.0.1:8000/api/timetables/jobs/${jobId}/`);
+            const job = response.data;
+            if (job.status === 'succeeded') return job;
+            if (job.status === 'failed') throw new Error(job.error);
+            await new Promise((resolve) => setTimeout(resolve, 1000));
+        }
+    };
+
+    const startGeneration = async () => {
+        const response = await axios.post('http://127.0.0.1:8000/api/timetables/generate/');
+        if (response.data.clear_timetables) return response;
+        Swal.fire({
+            title: 'Generating timetables...',
+            allowOutsideClick: false,
+            didOpen: () => Swal.showLoading(),
+        });
+        await waitForGeneration(response.data.job_id);
+        return response;
+    };
+
     const generateTimetable = async () => {
         try {
-            const response = await axios.post('http://127.0.0.1:8000/api/timetables/generate/');
+            const response = await startGeneration();
     
             // Check if existing timetables were found
             if (response.data.clear_timetables) {
@@ -75,7 +100,7 @@ const TimetableList = () => {
                 if (isConfirmed) {
                     // Call API to clear timetables and generate new ones
                     await axios.post('http://127.0.0.1:8000/api/timetables/clear/');
-                    await axios.post('http://127.0.0.1:8000/api/timetables/generate/');
+                    await startGeneration();
                     await Swal.fire('Success!', 'Timetables cleared and new ones generated successfully!', 'success');
                 }
             } else {
@@ -88,26 +113,8 @@ const TimetableList = () => {
     };
     
 
-    // Organize timetables by period and day
-    const organizeTimetables = (timetablesForCourse) => {
-        const organizedData = {};
-        
-        timetablesForCourse.forEach(timetable => {
-            const day = timetable.day.name;
-            const period = timetable.period.start_time + ' - ' + timetable.period.end_time;
-
-            if (!organizedData[period]) {
-                organizedData[period] = {}; // Initialize periods
-            }
-            organizedData[period][day] = timetable.subject.name;
-        });
-
-        return organizedData;
-    };
-
-    // Get organized timetables for the selected course
-    const selectedCourseTimetables = selectedCourseId ? timetables[selectedCourseId]?.timetables || [] : [];
-    const organizedTimetables = organizeTimetables(selectedCourseTimetables);
+    const selectedCourse = courses.find((course) => course.id === selectedCourseId);
+    const hasTimetable = grid && grid.grid.some((row) => row.some((cell) => cell !== null));
 
     if (loading) return <p>Loading...</p>;
     if (error) return <p>{error}</p>;
@@ -131,39 +138,43 @@ const TimetableList = () => {
                             <CardBody>
                                 {/* Navbar for Course Selection */}
                                 <nav className="timetable-navbar mb-3">
-                                    {Object.entries(timetables).map(([courseId, courseData]) => (
+                                    {courses.map((course) => (
                                         <Button 
-                                            key={courseId} 
-                                            className={`m-1 ${selectedCourseId === courseId ? 'active' : ''}`}
-                                            onClick={() => setSelectedCourseId(courseId)}
+                                            key={course.id} 
+                                            className={`m-1 ${selectedCourseId === course.id ? 'active' : ''}`}
+                                            onClick={() => setSelectedCourseId(course.id)}
                                         >
-                                            {courseData.courseName}
+                                            {course.name}
                                         </Button>
                                     ))}
                                 </nav>
 
                                 {/* Display timetable for the selected course */}
-                                {selectedCourseTimetables.length > 0 ? (
+                                {hasTimetable ? (
                                     <div className="timetable-content">
-                                        <h2 className="timetable-title">Timetable for: {timetables[selectedCourseId].courseName}</h2>
+                                        <h2 className="timetable-title">Timetable for: {selectedCourse ? selectedCourse.name : grid.course.name}</h2>
                                         <Table bordered striped>
                                             <thead>
                                                 <tr>
                                                     <th className="timetable-header">Period</th>
-                                                    {daysOfWeek.map((day, index) => (
-                                                        <th key={index} className="timetable-header">{day}</th>
+                                                    {grid.days.map((day) => (
+                                                        <th key={day.id} className="timetable-header">{day.name}</th>
                                                     ))}
                                                 </tr>
                                             </thead>
                                             <tbody>
-                                                {Object.keys(organizedTimetables).map((period, index) => (
-                                                    <tr key={index}>
-                                                        <td className="timetable-period">{period}</td>
-                                                        {daysOfWeek.map((day) => (
-                                                            <td key={day} className="timetable-cell">
-                                                                {organizedTimetables[period][day] || 'No Class'}
-                                                            </td>
-                                                        ))}
+                                                {grid.periods.map((period, row) => (
+                                                    <tr key={period.id}>
+                                                        <td className="timetable-period">{period.start_time} - {period.end_time}</td>
+                                                        {grid.days.map((day, column) => {
+                                                            const cell = grid.grid[row][column];
+                                                            return (
+                                                                <td key={day.id} className="timetable-cell">
+                                                                    {cell ? cell.subject.name : 'No Class'}
+                                                                    {cell && cell.staff && <div className="text-muted small">{cell.staff.name}</div>}
+                                                                </td>
+                                                            );
+                                                        })}
                                                     </tr>
                                                 ))}
                                             </tbody>
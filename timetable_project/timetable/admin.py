@@ -1,5 +1,28 @@
 from django.contrib import admin
-from .models import Course, Subject, Staff, Day, Period, Timetable
+from .models import Course, Subject, Staff, Day, Period, Timetable, GenerationJob
+from .snapshots import rebuild_course_snapshots
+
+
+class TimetableAdmin(admin.ModelAdmin):
+    # Entries edited here bypass the API, so rebuild the snapshots of the
+    # courses they belong to (admin writes run in one transaction)
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        course_ids = {obj.course_id}
+        if change and 'course' in form.changed_data:
+            course_ids.add(form.initial['course'])
+        rebuild_course_snapshots(course_ids)
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        rebuild_course_snapshots([obj.course_id])
+
+    def delete_queryset(self, request, queryset):
+        course_ids = set(queryset.values_list('course_id', flat=True))
+        super().delete_queryset(request, queryset)
+        rebuild_course_snapshots(course_ids)
+
 
 # Register your models here.
 admin.site.register(Course)
@@ -7,4 +30,5 @@ admin.site.register(Subject)
 admin.site.register(Staff)
 admin.site.register(Day)
 admin.site.register(Period)
-admin.site.register(Timetable)
\ No newline at end of file
+admin.site.register(Timetable, TimetableAdmin)
+admin.site.register(GenerationJob)
@@ -0,0 +1,138 @@
+from collections import Counter
+
+from django.conf import settings
+from django.db.models import Count, IntegerField, OuterRef, Q, Subquery
+
+from .cache import cached_value
+from .grid import grid_axes
+from .models import Course, Day, Period, Staff, Subject, Timetable
+
+# Workload and coverage figures for the live timetable, computed by the
+# database with grouped COUNTs so no entry is loaded into Python:
+#
+#   staff     lessons per week and on the busiest day; overloaded when the
+#             busiest day is above the daily cap (TIMETABLE_MAX_DAILY_LOAD)
+#   subjects  lessons per week in their course; under-scheduled when below
+#             the balanced share, slots per course // subjects in the course
+#   courses   filled and unfilled slots of the live day x period grid
+#
+# Reports are cached under the version tokens of the models they read.
+# Timetable rows have no signals (they would disable fast deletes), so the
+# timetable write paths bump its version through snapshots.py.
+
+ANALYTICS_MODELS = [Course, Subject, Staff, Day, Period, Timetable]
+
+_LIVE_SLOT = Q(day__is_deleted=False, period__is_deleted=False)
+
+
+def _live_entries(prefix):
+    # Filter for live entries at live days and periods, across relation `prefix`
+    return Q(**{
+        f'{prefix}__is_deleted': False,
+        f'{prefix}__day__is_deleted': False,
+        f'{prefix}__period__is_deleted': False,
+    })
+
+
+def staff_load(max_daily_load=None):
+    busiest_day = Subquery(
+        Timetable.objects.live().filter(_LIVE_SLOT, staff=OuterRef('pk'))
+        .values('day_id').annotate(lessons=Count('id')).order_by('-lessons').values('lessons')[:1],
+        output_field=IntegerField(),
+    )
+    rows = (
+        Staff.objects.live()
+        .annotate(weekly=Count('timetables', filter=_live_entries('timetables')), daily=busiest_day)
+        .order_by('-weekly', 'id')
+        .values_list('id', 'name', 'weekly', 'daily')
+    )
+    return [
+        {
+            'id': staff_id,
+            'name': name,
+            'weekly_lessons': weekly,
+            'peak_daily_lessons': daily or 0,
+            'overloaded': max_daily_load is not None and (daily or 0) > max_daily_load,
+        }
+        for staff_id, name, weekly, daily in rows
+    ]
+
+
+def subject_frequency(slots_per_course):
+    rows = (
+        Subject.objects.live()
+        .filter(is_active=True, course__is_active=True, course__is_deleted=False)
+        .annotate(lessons=Count('timetables', filter=_live_entries('timetables')))
+        .order_by('course_id', 'id')
+        .values_list('id', 'name', 'course_id', 'course__name', 'lessons')
+    )
+    rows = list(rows)
+    subjects_in_course = Counter(course_id for _, _, course_id, _, _ in rows)
+    result = []
+    for subject_id, name, course_id, course_name, lessons in rows:
+        target = slots_per_course // subjects_in_course[course_id]
+        result.append({
+            'id': subject_id,
+            'name': name,
+            'course': {'id': course_id, 'name': course_name},
+            'lessons': lessons,
+            'target': target,
+            'under_scheduled': lessons < target,
+        })
+    return result
+
+
+def course_coverage(slots_per_course):
+    rows = (
+        Course.objects.live().filter(is_active=True)
+        .annotate(filled=Count('timing_tables', filter=_live_entries('timing_tables')))
+        .order_by('id')
+        .values_list('id', 'name', 'filled')
+    )
+    return [
+        {'id': course_id, 'name': name, 'filled': filled, 'unfilled': max(0, slots_per_course - filled)}
+        for course_id, name, filled in rows
+    ]
+
+
+def timetable_analytics(max_daily_load=None):
+    # Full report; max_daily_load defaults to settings.TIMETABLE_MAX_DAILY_LOAD
+    if max_daily_load is None:
+        max_daily_load = getattr(settings, 'TIMETABLE_MAX_DAILY_LOAD', None)
+
+    def build():
+        axes = grid_axes()
+        slots_per_course = len(axes['days']) * len(axes['periods'])
+        staff = staff_load(max_daily_load)
+        subjects = subject_frequency(slots_per_course)
+        courses = course_coverage(slots_per_course)
+        totals = Timetable.objects.live().filter(_LIVE_SLOT).aggregate(
+            entries=Count('id'), unstaffed=Count('id', filter=Q(staff__isnull=True)),
+        )
+        return {
+            'slots_per_course': slots_per_course,
+            'max_daily_load': max_daily_load,
+            'summary': {
+                **totals,
+                'unfilled_slots': sum(course['unfilled'] for course in courses),
+                'courses_with_unfilled_slots': sum(1 for course in courses if course['unfilled']),
+                'overloaded_staff': sum(1 for member in staff if member['overloaded']),
+                'idle_staff': sum(1 for member in staff if not member['weekly_lessons']),
+                'under_scheduled_subjects': sum(1 for subject in subjects if subject['under_scheduled']),
+            },
+            'staff': staff,
+            'subjects': subjects,
+            'courses': courses,
+        }
+    return cached_value(f'analytics:{max_daily_load}', ANALYTICS_MODELS, build)
+
+
+def problems_only(report):
+    # The report narrowed to overloaded staff, under-scheduled subjects and
+    # courses with unfilled slots
+    return {
+        **report,
+        'staff': [member for member in report['staff'] if member['overloaded']],
+        'subjects': [subject for subject in report['subjects'] if subject['under_scheduled']],
+        'courses': [course for course in report['courses'] if course['unfilled']],
+    }
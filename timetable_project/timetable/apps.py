@@ -4,3 +4,13 @@ from django.apps import AppConfig
 class TimetableConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'timetable'
+
+    def ready(self):
+        from .cache import connect_invalidation
+        from .models import Course, Subject, Staff, Day, Period
+        from .snapshots import connect_snapshot_invalidation
+
+        # Bump cached reference data whenever these models are written
+        connect_invalidation(Course, Subject, Staff, Day, Period)
+        # and mark the timetable snapshots that embed the written rows stale
+        connect_snapshot_invalidation()
@@ -0,0 +1,121 @@
+class AvailabilityMatrix:
+    # Packed (day, period) occupancy for a set of owners -- usually staff, but
+    # anything with an id works (courses for slot clashes, for example).
+    #
+    # Every owner gets one Python int used as a bitmask. Slot index i is
+    # day_index * len(period_ids) + period_index and bit i set means "busy".
+    # Conflict checks, free-slot listings and "who is free" lookups are then
+    # plain bitwise operations instead of list scans.
+
+    def __init__(self, day_ids, period_ids):
+        self.day_ids = list(day_ids)
+        self.period_ids = list(period_ids)
+        self._day_index = {day_id: i for i, day_id in enumerate(self.day_ids)}
+        self._period_index = {period_id: i for i, period_id in enumerate(self.period_ids)}
+        self.slot_count = len(self.day_ids) * len(self.period_ids)
+        self.full_mask = (1 << self.slot_count) - 1
+        self._busy = {}  # {owner_id: bitmask}
+
+    @classmethod
+    def from_entries(cls, day_ids, period_ids, entries):
+        # Build a matrix from (owner_id, day_id, period_id) rows, e.g. a
+        # values_list() over existing timetable entries.
+        matrix = cls(day_ids, period_ids)
+        for owner_id, day_id, period_id in entries:
+            matrix.book(owner_id, day_id, period_id)
+        return matrix
+
+    # Slot <-> bit helpers
+
+    def slot_index(self, day_id, period_id):
+        return self._day_index[day_id] * len(self.period_ids) + self._period_index[period_id]
+
+    def bit(self, day_id, period_id):
+        return 1 << self.slot_index(day_id, period_id)
+
+    def slot(self, index):
+        day_index, period_index = divmod(index, len(self.period_ids))
+        return self.day_ids[day_index], self.period_ids[period_index]
+
+    def slots(self, mask):
+        # Expand a bitmask into [(day_id, period_id), ...] in slot order.
+        result = []
+        while mask:
+            low = mask & -mask
+            result.append(self.slot(low.bit_length() - 1))
+            mask ^= low
+        return result
+
+    # Per-owner queries
+
+    def busy_mask(self, owner_id):
+        return self._busy.get(owner_id, 0)
+
+    def free_mask(self, owner_id):
+        return self.full_mask & ~self._busy.get(owner_id, 0)
+
+    def is_free(self, owner_id, day_id, period_id):
+        return not self._busy.get(owner_id, 0) & self.bit(day_id, period_id)
+
+    def is_free_bit(self, owner_id, bit):
+        return not self._busy.get(owner_id, 0) & bit
+
+    def free_slots(self, owner_id):
+        return self.slots(self.free_mask(owner_id))
+
+    def busy_slots(self, owner_id):
+        return self.slots(self.busy_mask(owner_id))
+
+    def load(self, owner_id):
+        return self._busy.get(owner_id, 0).bit_count()
+
+    def conflicts(self, owner_id, mask):
+        # Slots in `mask` that the owner already has booked.
+        return self.slots(self._busy.get(owner_id, 0) & mask)
+
+    # Multi-owner queries
+
+    def free_owners(self, owner_ids, day_id, period_id):
+        bit = self.bit(day_id, period_id)
+        return [owner_id for owner_id in owner_ids if not self._busy.get(owner_id, 0) & bit]
+
+    def first_free(self, owner_ids, bit):
+        # Hot path for the solver: first owner in `owner_ids` free at `bit`.
+        busy = self._busy
+        for owner_id in owner_ids:
+            if not busy.get(owner_id, 0) & bit:
+                return owner_id
+        return None
+
+    def common_free_mask(self, owner_ids):
+        # Slots where every owner in `owner_ids` is free.
+        taken = 0
+        for owner_id in owner_ids:
+            taken |= self._busy.get(owner_id, 0)
+        return self.full_mask & ~taken
+
+    # Mutation
+
+    def book(self, owner_id, day_id, period_id):
+        self.book_bit(owner_id, self.bit(day_id, period_id))
+
+    def book_bit(self, owner_id, bit):
+        self._busy[owner_id] = self._busy.get(owner_id, 0) | bit
+
+    def release(self, owner_id, day_id, period_id):
+        self.release_bit(owner_id, self.bit(day_id, period_id))
+
+    def release_bit(self, owner_id, bit):
+        mask = self._busy.get(owner_id, 0) & ~bit
+        if mask:
+            self._busy[owner_id] = mask
+        else:
+            self._busy.pop(owner_id, None)
+
+    def owners(self):
+        return self._busy.keys()
+
+    def merge(self, other):
+        # Fold another matrix over the same days/periods into this one.
+        for owner_id, mask in other._busy.items():
+            self._busy[owner_id] = self._busy.get(owner_id, 0) | mask
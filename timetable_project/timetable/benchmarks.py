@@ -0,0 +1,157 @@
+import random
+import statistics
+import time
+import tracemalloc
+from datetime import time as clock
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from .models import Course, Subject, Staff, Day, Period, Timetable
+
+# Helpers for the benchmark management commands: a synthetic data seeder and
+# small timing utilities. Nothing here is used by the API itself.
+
+SOFT_DELETE_MODELS = [Course, Subject, Day, Period, Staff, Timetable]
+
+
+def seed_synthetic_data(courses=500, subjects_per_course=6, staff=300, staff_subjects=3, days=5,
+                        periods=8, deleted_periods=5000, deleted_ratio=0.3, timetables=True, seed=0):
+    # Bulk-load a synthetic school. `deleted_ratio` of courses/subjects/staff
+    # are soft deleted, and `deleted_periods` historical periods are added as
+    # soft-deleted rows, so the live subset is what the indexes must find.
+    # Only the first `days` weekdays stay live; callers run this inside a
+    # transaction they roll back.
+    rng = random.Random(seed)
+
+    day_objs = []
+    for name, _ in Day.DAY_CHOICES[:days]:
+        day, _ = Day.objects.get_or_create(name=name)
+        day_objs.append(day)
+    Day.objects.filter(pk__in=[d.pk for d in day_objs]).update(is_deleted=False)
+    Day.objects.exclude(pk__in=[d.pk for d in day_objs]).update(is_deleted=True)
+
+    period_objs = Period.objects.bulk_create([
+        Period(start_time=clock(8 + i % 12, 0), end_time=clock(8 + i % 12, 50))
+        for i in range(periods)
+    ])
+    Period.objects.bulk_create([
+        Period(start_time=clock(i % 24, i % 60), end_time=clock(i % 24, i % 60, 30), is_deleted=True)
+        for i in range(deleted_periods)
+    ])
+
+    course_objs = Course.objects.bulk_create([
+        Course(name=f'Course {i}', is_deleted=rng.random() < deleted_ratio) for i in range(courses)
+    ])
+    subject_objs = Subject.objects.bulk_create([
+        Subject(name=f'Subject {c.pk}.{j}', course=c, is_deleted=rng.random() < deleted_ratio)
+        for c in course_objs
+        for j in range(subjects_per_course)
+    ])
+    staff_objs = Staff.objects.bulk_create([
+        Staff(name=f'Staff {i}', is_deleted=rng.random() < deleted_ratio) for i in range(staff)
+    ])
+
+    Link = Staff.subjects.through
+    links = set()
+    for member in staff_objs:
+        for subject in rng.sample(subject_objs, min(staff_subjects, len(subject_objs))):
+            links.add((member.pk, subject.pk))
+    Link.objects.bulk_create([Link(staff_id=staff_id, subject_id=subject_id) for staff_id, subject_id in links])
+
+    if timetables:
+        by_course = {}
+        for subject in subject_objs:
+            by_course.setdefault(subject.course_id, []).append(subject)
+        Timetable.objects.bulk_create([
+            Timetable(course=c, day=d, period=p, subject=rng.choice(by_course[c.pk]), is_deleted=c.is_deleted)
+            for c in course_objs
+            for d in day_objs
+            for p in period_objs
+        ], batch_size=2000)
+
+    return {
+        'courses': len(course_objs),
+        'subjects': len(subject_objs),
+        'staff': len(staff_objs),
+        'periods': periods + deleted_periods,
+        'timetables': Timetable.objects.count(),
+    }
+
+
+def time_call(fn, repeat=20):
+    # Median wall time of `fn()` in milliseconds
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def measure(fn, repeat=5, setup=None):
+    # Median wall time over `repeat` runs, then one extra run under
+    # tracemalloc and a query capture for the query count and peak Python
+    # memory, so tracing overhead never skews the timings. `setup()` runs
+    # untimed before every call. The last return value of `fn` is kept.
+    samples = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+
+    if setup:
+        setup()
+    tracemalloc.start()
+    try:
+        with CaptureQueriesContext(connection) as queries:
+            result = fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'wall_ms': round(statistics.median(samples), 3) if samples else None,
+        'queries': len(queries),
+        'db_ms': round(sum(float(q['time']) for q in queries.captured_queries) * 1000, 3),
+        'peak_kb': round(peak / 1024, 1),
+    }, result
+
+
+def analyze():
+    # Refresh planner statistics so index choices reflect the seeded data
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+
+
+def _existing_index_names(model):
+    with connection.cursor() as cursor:
+        return set(connection.introspection.get_constraints(cursor, model._meta.db_table))
+
+
+def drop_model_indexes(models=SOFT_DELETE_MODELS):
+    # Drop the Meta.indexes of `models` that exist in the database. Uses plain
+    # SQL statements so it also works inside an open transaction on SQLite.
+    dropped = []
+    for model in models:
+        existing = _existing_index_names(model)
+        for index in model._meta.indexes:
+            if index.name in existing:
+                with connection.cursor() as cursor:
+                    cursor.execute(f'DROP INDEX {connection.ops.quote_name(index.name)}')
+                dropped.append((model, index))
+    return dropped
+
+
+def create_model_indexes(models=SOFT_DELETE_MODELS):
+    # Create every Meta.index of `models` that is not in the database yet. The
+    # editor is only used to render SQL, never entered as a context.
+    editor = connection.schema_editor()
+    for model in models:
+        existing = _existing_index_names(model)
+        for index in model._meta.indexes:
+            if index.name not in existing:
+                with connection.cursor() as cursor:
+                    cursor.execute(str(index.create_sql(model, editor)))
@@ -0,0 +1,237 @@
+from bisect import bisect_left, insort
+
+from django.db import transaction
+
+from .cache import bump_model_version
+from .models import Course, Subject, Staff, Period
+from .serializers import (
+    CourseSerializer, SubjectSerializer, StaffSerializer, PeriodSerializer,
+    SubjectBulkSerializer, StaffBulkSerializer,
+)
+from .snapshots import reference_changed
+
+
+class IntervalSweep:
+    # Sorted, non-overlapping [start, end) intervals with O(log n) overlap
+    # checks. Existing rows are merged into disjoint blocks first, so a new
+    # interval overlaps something iff it overlaps the block just before its end.
+
+    def __init__(self, intervals=()):
+        self.starts = []
+        self.ends = []
+        for start, end in sorted(intervals):
+            if self.ends and start < self.ends[-1]:
+                self.ends[-1] = max(self.ends[-1], end)
+            else:
+                self.starts.append(start)
+                self.ends.append(end)
+
+    def overlaps(self, start, end):
+        i = bisect_left(self.starts, end) - 1
+        return i >= 0 and self.ends[i] > start
+
+    def add(self, start, end):
+        i = bisect_left(self.starts, start)
+        self.starts.insert(i, start)
+        self.ends.insert(i, end)
+
+
+def bulk_create_periods(items):
+    # Validate a list of period payloads against the live periods (loaded
+    # once) and against each other, then insert every valid one with a single
+    # bulk_create. Items are taken in order: one that overlaps an earlier
+    # accepted item is rejected. Returns (created rows, per-item errors).
+    errors = []
+    candidates = []
+    for index, item in enumerate(items):
+        serializer = PeriodSerializer(data=item, context={'check_overlaps': False})
+        if serializer.is_valid():
+            candidates.append((index, serializer.validated_data))
+        else:
+            errors.append({'index': index, 'errors': serializer.errors})
+
+    sweep = IntervalSweep(Period.objects.live().values_list('start_time', 'end_time'))
+    accepted = []
+    for index, data in candidates:
+        start_time, end_time = data['start_time'], data['end_time']
+        if sweep.overlaps(start_time, end_time):
+            errors.append({'index': index, 'errors': {'non_field_errors': ['This period overlaps with an existing period.']}})
+            continue
+        sweep.add(start_time, end_time)
+        accepted.append(Period(**data))
+
+    with transaction.atomic():
+        created = Period.objects.bulk_create(accepted)
+    if created:
+        bump_model_version(Period)
+
+    errors.sort(key=lambda error: error['index'])
+    return PeriodSerializer(created, many=True).data, errors
+
+
+def _int_or_none(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _error(index, errors):
+    return {'index': index, 'errors': errors}
+
+
+class BulkResource:
+    # Batch create / update / soft delete for one model.
+    #
+    # A batch is validated in one pass: related ids are preloaded with a single
+    # query per relation and checked in memory, existing rows for updates come
+    # from one in_bulk(). Writes use bulk_create / bulk_update and run in one
+    # transaction. Invalid items are reported by index and the valid ones are
+    # still written. Returns (serialized rows, errors).
+    model = None
+    read_serializer = None
+    write_serializer = None
+
+    def context(self, items):
+        return {}
+
+    def read_queryset(self, ids):
+        return self.model.objects.filter(id__in=ids).order_by('id')
+
+    def save_relations(self, pairs, created):
+        # pairs: [(instance, validated_data), ...] after the rows are written
+        pass
+
+    def _validate(self, items, instances=None):
+        if not isinstance(items, list):
+            return [], [_error(None, {'non_field_errors': ['Expected a list of items.']})]
+        context = self.context([item for item in items if isinstance(item, dict)])
+        valid, errors = [], []
+        for index, item in enumerate(items):
+            if not isinstance(item, dict):
+                errors.append(_error(index, {'non_field_errors': ['Expected an object.']}))
+                continue
+            instance = None
+            if instances is not None:
+                instance = instances.get(_int_or_none(item.get('id')))
+                if instance is None:
+                    errors.append(_error(index, {'id': ['Not found.']}))
+                    continue
+            serializer = self.write_serializer(instance, data=item, partial=instance is not None, context=context)
+            if serializer.is_valid():
+                valid.append((instance, serializer.validated_data))
+            else:
+                errors.append(_error(index, serializer.errors))
+        return valid, errors
+
+    def _model_fields(self, data):
+        concrete = {field.attname for field in self.model._meta.concrete_fields} | {
+            field.name for field in self.model._meta.concrete_fields
+        }
+        return {key: value for key, value in data.items() if key in concrete}
+
+    def _result(self, instances):
+        ids = [instance.pk for instance in instances]
+        return self.read_serializer(self.read_queryset(ids), many=True).data
+
+    def create(self, items):
+        valid, errors = self._validate(items)
+        with transaction.atomic():
+            created = self.model.objects.bulk_create([self.model(**self._model_fields(data)) for _, data in valid])
+            self.save_relations([(instance, data) for instance, (_, data) in zip(created, valid)], created=True)
+        if created:
+            bump_model_version(self.model)
+        return self._result(created), errors
+
+    def update(self, items):
+        ids = [_int_or_none(item.get('id')) for item in items if isinstance(item, dict)] if isinstance(items, list) else []
+        instances = self.model.objects.live().in_bulk([pk for pk in ids if pk is not None])
+        valid, errors = self._validate(items, instances=instances)
+
+        fields = set()
+        for instance, data in valid:
+            for key, value in self._model_fields(data).items():
+                setattr(instance, key, value)
+                fields.add(key)
+        updated = [instance for instance, _ in valid]
+        with transaction.atomic():
+            if fields:
+                self.model.objects.bulk_update(updated, sorted(fields))
+                reference_changed(self.model, [instance.pk for instance in updated])
+            self.save_relations(valid, created=False)
+        if updated:
+            bump_model_version(self.model)
+        return self._result(updated), errors
+
+    def delete(self, ids):
+        # Soft delete, like the single-object endpoints
+        if not isinstance(ids, list):
+            return [], [_error(None, {'non_field_errors': ['Expected a list of ids.']})]
+        wanted = {pk for pk in map(_int_or_none, ids) if pk is not None}
+        with transaction.atomic():
+            found = set(self.model.objects.live().filter(id__in=wanted).values_list('id', flat=True))
+            self.model.objects.filter(id__in=found).update(is_deleted=True)
+            if found:
+                reference_changed(self.model, found)
+        if found:
+            bump_model_version(self.model)
+        errors = [_error(index, {'id': ['Not found.']}) for index, pk in enumerate(ids) if _int_or_none(pk) not in found]
+        return sorted(found), errors
+
+
+class CourseBulk(BulkResource):
+    model = Course
+    read_serializer = CourseSerializer
+    write_serializer = CourseSerializer
+
+
+class SubjectBulk(BulkResource):
+    model = Subject
+    read_serializer = SubjectSerializer
+    write_serializer = SubjectBulkSerializer
+
+    def context(self, items):
+        ids = {_int_or_none(item.get('course_id')) for item in items}
+        return {'course_ids': set(Course.objects.filter(id__in=ids - {None}).values_list('id', flat=True))}
+
+    def read_queryset(self, ids):
+        return SubjectSerializer.setup_eager_loading(super().read_queryset(ids))
+
+
+class StaffBulk(BulkResource):
+    model = Staff
+    read_serializer = StaffSerializer
+    write_serializer = StaffBulkSerializer
+
+    def context(self, items):
+        ids = {
+            _int_or_none(pk)
+            for item in items if isinstance(item.get('subject_ids'), list)
+            for pk in item['subject_ids']
+        }
+        return {'subject_ids': set(Subject.objects.filter(id__in=ids - {None}).values_list('id', flat=True))}
+
+    def read_queryset(self, ids):
+        return StaffSerializer.setup_eager_loading(super().read_queryset(ids))
+
+    def save_relations(self, pairs, created):
+        # Replace the subjects of every staff member in the batch that sent
+        # subject_ids: one delete (updates only) and one insert on the through table.
+        Link = Staff.subjects.through
+        pairs = [(instance, data['subject_ids']) for instance, data in pairs if 'subject_ids' in data]
+        if not pairs:
+            return
+        if not created:
+            Link.objects.filter(staff_id__in=[instance.pk for instance, _ in pairs]).delete()
+        Link.objects.bulk_create([
+            Link(staff_id=instance.pk, subject_id=subject_id)
+            for instance, subject_ids in pairs
+            for subject_id in subject_ids
+        ])
+
+
+BULK_RESOURCES = {
+    'courses': CourseBulk(),
+    'subjects': SubjectBulk(),
+    'staff': StaffBulk(),
+}
@@ -0,0 +1,95 @@
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from rest_framework import status
+from rest_framework.response import Response
+
+# Read-through cache for the reference GET endpoints.
+#
+# Each model has a version token in the cache. Cached responses and ETags are
+# keyed by the versions of every model they were built from, so bumping a
+# version (on any save/delete of that model) invalidates them all at once
+# without having to know which keys exist. Tokens are time based, so a cache
+# that is wiped or a process that restarts never re-issues an old ETag.
+
+VERSION_KEY = 'timetable:version:{}'
+RESPONSE_KEY = 'timetable:response:{}'
+
+
+def _new_token():
+    return str(time.time_ns())
+
+
+def model_versions(models):
+    keys = [VERSION_KEY.format(model._meta.label_lower) for model in models]
+    versions = cache.get_many(keys)
+    missing = {key: _new_token() for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, timeout=None)
+        versions.update(missing)
+    return [versions[key] for key in keys]
+
+
+def bump_model_version(*models):
+    # Call after writes that bypass signals (bulk_create, queryset.update, ...)
+    cache.set_many({VERSION_KEY.format(model._meta.label_lower): _new_token() for model in models}, timeout=None)
+
+
+def _invalidate(sender, **kwargs):
+    bump_model_version(sender)
+
+
+def connect_invalidation(*models):
+    for model in models:
+        post_save.connect(_invalidate, sender=model, dispatch_uid=f'timetable-cache-save-{model._meta.label_lower}')
+        post_delete.connect(_invalidate, sender=model, dispatch_uid=f'timetable-cache-delete-{model._meta.label_lower}')
+
+
+def cached_value(name, models, build):
+    # Cache `build()` under the current versions of `models`, for derived
+    # data that is reused across requests (lookup tables, grid axes, ...)
+    digest = hashlib.md5('|'.join([name, *model_versions(models)]).encode(), usedforsecurity=False).hexdigest()
+    key = RESPONSE_KEY.format(digest)
+    value = cache.get(key)
+    if value is None:
+        value = build()
+        cache.set(key, value, timeout=getattr(settings, 'TIMETABLE_CACHE_TIMEOUT', 3600))
+    return value
+
+
+def cached_get(*models):
+    # Decorator for APIView.get methods whose output depends only on `models`
+    # and the request path. Serves If-None-Match hits with 304 straight from
+    # the version tokens, and other hits from the cached serialized data.
+    def decorator(method):
+        @wraps(method)
+        def wrapper(view, request, *args, **kwargs):
+            if request.query_params.get('stream'):
+                return method(view, request, *args, **kwargs)
+
+            versions = model_versions(models)
+            digest = hashlib.md5(
+                '|'.join([request.get_full_path(), *versions]).encode(), usedforsecurity=False
+            ).hexdigest()
+            etag = f'"{digest}"'
+
+            if etag in request.headers.get('If-None-Match', ''):
+                return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+
+            key = RESPONSE_KEY.format(digest)
+            data = cache.get(key)
+            if data is None:
+                response = method(view, request, *args, **kwargs)
+                if response.status_code != status.HTTP_200_OK:
+                    return response
+                cache.set(key, response.data, timeout=getattr(settings, 'TIMETABLE_CACHE_TIMEOUT', 3600))
+            else:
+                response = Response(data)
+            response['ETag'] = etag
+            return response
+        return wrapper
+    return decorator
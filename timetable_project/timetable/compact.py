@@ -0,0 +1,41 @@
+from .models import Course, Subject, Staff, Day, Period
+
+# Compact timetable representation: each course, subject, staff member, day
+# and period is sent once in a lookup block keyed by id, and the entries
+# themselves are rows of integer ids in ENTRY_FIELDS order. Built from
+# values_list() queries only, so no model instances or nested serializers
+# are involved.
+
+ENTRY_FIELDS = ['id', 'course', 'day', 'period', 'subject', 'staff']
+
+
+def compact_timetable_payload(queryset):
+    # Six queries: the entries plus one per lookup block. The lookup blocks
+    # only contain rows the entries actually reference.
+    entries = [
+        list(row) for row in
+        queryset.order_by('course_id', 'day_id', 'period_id')
+        .values_list('id', 'course_id', 'day_id', 'period_id', 'subject_id', 'staff_id')
+    ]
+
+    courses = Course.objects.filter(id__in=queryset.values('course_id')).values_list('id', 'name')
+    subjects = Subject.objects.filter(id__in=queryset.values('subject_id')).values_list('id', 'name', 'course_id')
+    staff = Staff.objects.filter(id__in=queryset.values('staff_id')).values_list('id', 'name')
+    days = Day.objects.filter(id__in=queryset.values('day_id')).values_list('id', 'name')
+    periods = Period.objects.filter(id__in=queryset.values('period_id')).values_list('id', 'start_time', 'end_time')
+
+    return {
+        'courses': {course_id: {'name': name} for course_id, name in courses},
+        'subjects': {
+            subject_id: {'name': name, 'course': course_id}
+            for subject_id, name, course_id in subjects
+        },
+        'staff': {staff_id: {'name': name} for staff_id, name in staff},
+        'days': {day_id: {'name': name} for day_id, name in days},
+        'periods': {
+            period_id: {'start_time': start_time.isoformat(), 'end_time': end_time.isoformat()}
+            for period_id, start_time, end_time in periods
+        },
+        'fields': ENTRY_FIELDS,
+        'entries': entries,
+    }
@@ -0,0 +1,129 @@
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+
+from .grid import grid_axes
+from .models import Staff, Subject, Timetable
+from .snapshots import invalidate_course_snapshots
+
+# Conflict-checked manual edits, for drag-and-drop editing of the grid.
+#
+# An edit locks the entries it changes, loads every row in the target slots
+# with one indexed query and checks the result in memory: the course must be
+# free in the slot and the teacher must not be busy elsewhere at that time.
+# The write, and dropping the course snapshot for the next read to rebuild,
+# happen in one transaction; the database constraints still catch a
+# concurrent edit that slips in between the check and the write.
+#
+# Swaps are limited to entries of one course and exchange the lessons (subject
+# and teacher) of the two slots, so the (course, day, period) uniqueness holds
+# at every step of the write.
+
+
+class InvalidEdit(Exception):
+    pass
+
+
+class EditConflict(InvalidEdit):
+    def __init__(self, message, conflicts=()):
+        super().__init__(message)
+        self.conflicts = list(conflicts)  # [{'id', 'course', 'staff', 'reason'}]
+
+
+def _check_slot(day_id, period_id):
+    axes = grid_axes()
+    if day_id not in {day['id'] for day in axes['days']}:
+        raise InvalidEdit(f'Unknown day {day_id}')
+    if period_id not in {period['id'] for period in axes['periods']}:
+        raise InvalidEdit(f'Unknown period {period_id}')
+
+
+def _check_teaching(course_id, subject_id, staff_id):
+    if staff_id is None:
+        if not Subject.objects.live().filter(pk=subject_id, course_id=course_id, is_active=True).exists():
+            raise InvalidEdit('Subject is not an active subject of this course')
+        return
+    teaches = Staff.subjects.through.objects.filter(
+        staff_id=staff_id, staff__is_active=True, staff__is_deleted=False,
+        subject_id=subject_id, subject__course_id=course_id, subject__is_active=True, subject__is_deleted=False,
+    )
+    if not teaches.exists():
+        raise InvalidEdit('Staff member does not teach this subject in this course')
+
+
+def _lock_entries(ids):
+    entries = {entry.pk: entry for entry in Timetable.objects.live().select_for_update().filter(pk__in=ids).order_by('pk')}
+    if len(entries) != len(set(ids)):
+        raise Timetable.DoesNotExist('Timetable entry not found')
+    return entries
+
+
+def _place(placements):
+    # placements: [(entry, day_id, period_id, subject_id, staff_id)]
+    moving = {entry.pk for entry, *_ in placements}
+    course_ids = {entry.course_id for entry, *_ in placements}
+    slots = Q()
+    for _, day_id, period_id, _, _ in placements:
+        # Live rows of every course, plus soft-deleted rows of the edited
+        # courses: those still hold the (course, day, period) key
+        slots |= Q(day_id=day_id, period_id=period_id) & (Q(is_deleted=False) | Q(course_id__in=course_ids))
+    rows = list(Timetable.objects.filter(slots).values_list(
+        'id', 'course_id', 'day_id', 'period_id', 'staff_id', 'is_deleted'))
+
+    conflicts, tombstones = [], set()
+    for entry, day_id, period_id, _, staff_id in placements:
+        for pk, course_id, row_day, row_period, row_staff, deleted in rows:
+            if pk in moving or (row_day, row_period) != (day_id, period_id):
+                continue
+            if deleted:
+                if course_id == entry.course_id:
+                    tombstones.add(pk)
+                continue
+            if course_id == entry.course_id:
+                conflicts.append({'id': pk, 'course': course_id, 'staff': row_staff, 'reason': 'course_slot'})
+            elif staff_id is not None and row_staff == staff_id:
+                conflicts.append({'id': pk, 'course': course_id, 'staff': row_staff, 'reason': 'staff_busy'})
+    if conflicts:
+        raise EditConflict('The target slot is not free', conflicts)
+
+    for entry, day_id, period_id, subject_id, staff_id in placements:
+        entry.day_id, entry.period_id, entry.subject_id, entry.staff_id = day_id, period_id, subject_id, staff_id
+    if tombstones:
+        Timetable.objects.filter(pk__in=tombstones).delete()
+    Timetable.objects.bulk_update([entry for entry, *_ in placements], ['day', 'period', 'subject', 'staff'])
+    invalidate_course_snapshots(course_ids)
+
+
+def move_entry(entry_id, day_id, period_id, subject_id=None, staff_id=None):
+    # Move an entry to another slot, optionally changing its subject or
+    # teacher (both default to the current ones). Returns the entry.
+    _check_slot(day_id, period_id)
+    try:
+        with transaction.atomic():
+            entry = _lock_entries([entry_id])[entry_id]
+            subject_id = subject_id or entry.subject_id
+            staff_id = staff_id or entry.staff_id
+            if (subject_id, staff_id) != (entry.subject_id, entry.staff_id):
+                _check_teaching(entry.course_id, subject_id, staff_id)
+            _place([(entry, day_id, period_id, subject_id, staff_id)])
+    except IntegrityError:
+        raise EditConflict('The target slot was taken by a concurrent edit')
+    return entry
+
+
+def swap_entries(first_id, second_id):
+    # Exchange the lessons of two entries of the same course. Returns both.
+    if first_id == second_id:
+        raise InvalidEdit('An entry cannot be swapped with itself')
+    try:
+        with transaction.atomic():
+            entries = _lock_entries([first_id, second_id])
+            first, second = entries[first_id], entries[second_id]
+            if first.course_id != second.course_id:
+                raise InvalidEdit('Only entries of the same course can be swapped')
+            _place([
+                (first, first.day_id, first.period_id, second.subject_id, second.staff_id),
+                (second, second.day_id, second.period_id, first.subject_id, first.staff_id),
+            ])
+    except IntegrityError:
+        raise EditConflict('The entries were changed by a concurrent edit')
+    return first, second
@@ -0,0 +1,137 @@
+import csv
+import json
+from datetime import date, datetime, timedelta, timezone
+from itertools import groupby
+
+from .models import Day, Timetable
+
+# Streaming timetable exports. Rows come straight from values_list() through
+# QuerySet.iterator(), so no model instances are built and memory stays flat
+# however many entries there are. Every writer is a generator of text chunks
+# suitable for StreamingHttpResponse or for writing to a file.
+
+EXPORT_COLUMNS = [
+    'id', 'course_id', 'course', 'day', 'start_time', 'end_time', 'subject_id', 'subject', 'staff_id', 'staff',
+]
+CALENDAR_GROUPS = {'course': (1, 2), 'staff': (8, 9)}  # row positions of the group's id and name
+EXPORT_FORMATS = ['csv', 'jsonl', 'ics']
+CONTENT_TYPES = {
+    'csv': 'text/csv',
+    'jsonl': 'application/x-ndjson',
+    'ics': 'text/calendar',
+}
+
+_WEEKDAYS = {name: index for index, (name, _) in enumerate(Day.DAY_CHOICES)}
+
+
+def export_rows(course_id=None, staff_id=None, group='course', chunk_size=2000):
+    # Rows in EXPORT_COLUMNS order, grouped by course (or staff) and in
+    # weekly order. Grouping by staff leaves out entries without a teacher.
+    queryset = Timetable.objects.live()
+    if course_id is not None:
+        queryset = queryset.filter(course_id=course_id)
+    if staff_id is not None:
+        queryset = queryset.filter(staff_id=staff_id)
+    if group == 'staff':
+        queryset = queryset.filter(staff__isnull=False)
+    return queryset.order_by(f'{group}_id', 'day_id', 'period__start_time').values_list(
+        'id', 'course_id', 'course__name', 'day__name', 'period__start_time', 'period__end_time',
+        'subject_id', 'subject__name', 'staff_id', 'staff__name',
+    ).iterator(chunk_size=chunk_size)
+
+
+class _Echo:
+    # csv.writer target that hands each formatted line back instead of buffering it
+    def write(self, value):
+        return value
+
+
+def iter_csv(rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(EXPORT_COLUMNS)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def iter_jsonl(rows):
+    for row in rows:
+        record = dict(zip(EXPORT_COLUMNS, row))
+        record['start_time'] = record['start_time'].isoformat()
+        record['end_time'] = record['end_time'].isoformat()
+        yield json.dumps(record) + '\n'
+
+
+# iCalendar
+
+def _ics_escape(text):
+    return str(text).replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,').replace('\n', '\\n')
+
+
+def _ics_line(line):
+    # Fold to 75 octets per RFC 5545
+    encoded = line.encode('utf-8')
+    if len(encoded) <= 75:
+        return line + '\r\n'
+    parts, current = [], b''
+    for char in line:
+        piece = char.encode('utf-8')
+        if len(current) + len(piece) > (75 if not parts else 74):
+            parts.append(current.decode('utf-8'))
+            current = b''
+        current += piece
+    parts.append(current.decode('utf-8'))
+    return '\r\n '.join(parts) + '\r\n'
+
+
+def week_start(today=None):
+    today = today or date.today()
+    return today - timedelta(days=today.weekday())
+
+
+def iter_ics(rows, calendar_name, week_of=None):
+    # One VCALENDAR with a weekly recurring VEVENT per entry, anchored on the
+    # week starting `week_of` (a Monday; defaults to the current week).
+    monday = week_of or week_start()
+    stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+    yield _ics_line('BEGIN:VCALENDAR')
+    yield _ics_line('VERSION:2.0')
+    yield _ics_line('PRODID:-//Timetable//Timetable export//EN')
+    yield _ics_line(f'X-WR-CALNAME:{_ics_escape(calendar_name)}')
+    for entry_id, _, course_name, day_name, start_time, end_time, _, subject_name, _, staff_name in rows:
+        day = monday + timedelta(days=_WEEKDAYS.get(day_name, 0))
+        yield _ics_line('BEGIN:VEVENT')
+        yield _ics_line(f'UID:timetable-{entry_id}@timetable')
+        yield _ics_line(f'DTSTAMP:{stamp}')
+        yield _ics_line(f"DTSTART:{datetime.combine(day, start_time).strftime('%Y%m%dT%H%M%S')}")
+        yield _ics_line(f"DTEND:{datetime.combine(day, end_time).strftime('%Y%m%dT%H%M%S')}")
+        yield _ics_line('RRULE:FREQ=WEEKLY')
+        yield _ics_line(f'SUMMARY:{_ics_escape(subject_name)}')
+        description = f'{course_name}, {staff_name}' if staff_name else course_name
+        yield _ics_line(f'DESCRIPTION:{_ics_escape(description)}')
+        yield _ics_line('END:VEVENT')
+    yield _ics_line('END:VCALENDAR')
+
+
+def iter_calendars(rows, group='course', week_of=None):
+    # Split a row stream ordered by `group` into (id, name, chunks) calendars,
+    # one course or staff member at a time.
+    id_position, name_position = CALENDAR_GROUPS[group]
+    for group_id, group_rows in groupby(rows, key=lambda row: row[id_position]):
+        first = next(group_rows)
+        name = first[name_position]
+        yield group_id, name, iter_ics(_prepend(first, group_rows), name, week_of)
+
+
+def _prepend(first, rest):
+    yield first
+    yield from rest
+
+
+def iter_export(fmt, rows, calendar_name='Timetable', week_of=None):
+    if fmt == 'csv':
+        return iter_csv(rows)
+    if fmt == 'jsonl':
+        return iter_jsonl(rows)
+    if fmt == 'ics':
+        return iter_ics(rows, calendar_name, week_of)
+    raise ValueError(f'Unknown export format {fmt!r}')
@@ -0,0 +1,56 @@
+from .cache import cached_value
+from .models import Course, Day, Period, Timetable
+
+# Server-side pivot of course timetables into day x period grids. The axes
+# (live days and periods) come from the reference cache, so a warm request
+# runs a single query: the course's live entries joined with their subject
+# and staff names, found through the course/day/period unique index.
+
+MAX_BATCH_COURSES = 100
+
+
+def grid_axes():
+    def build():
+        days = [{'id': day_id, 'name': name} for day_id, name in Day.objects.live().order_by('id').values_list('id', 'name')]
+        periods = [
+            {'id': period_id, 'start_time': start_time.isoformat(), 'end_time': end_time.isoformat()}
+            for period_id, start_time, end_time in
+            Period.objects.live().order_by('start_time', 'id').values_list('id', 'start_time', 'end_time')
+        ]
+        return {'days': days, 'periods': periods}
+    return cached_value('grid-axes', [Day, Period], build)
+
+
+def course_grids(course_ids, axes=None):
+    # {course_id: {'course': {...}, 'grid': [[cell or None per day] per period]}}
+    # for the live courses among `course_ids`; unknown ids are left out.
+    axes = axes or grid_axes()
+    day_columns = {day['id']: column for column, day in enumerate(axes['days'])}
+    period_rows = {period['id']: row for row, period in enumerate(axes['periods'])}
+
+    def empty_grid():
+        return [[None] * len(day_columns) for _ in period_rows]
+
+    grids = {}
+    entries = Timetable.objects.live().filter(course_id__in=course_ids, course__is_deleted=False).values_list(
+        'id', 'course_id', 'course__name', 'day_id', 'period_id', 'subject_id', 'subject__name', 'staff_id', 'staff__name',
+    )
+    for entry_id, course_id, course_name, day_id, period_id, subject_id, subject_name, staff_id, staff_name in entries:
+        course = grids.get(course_id)
+        if course is None:
+            course = grids[course_id] = {'course': {'id': course_id, 'name': course_name}, 'grid': empty_grid()}
+        row, column = period_rows.get(period_id), day_columns.get(day_id)
+        if row is None or column is None:
+            continue  # entry on a removed day or period
+        course['grid'][row][column] = {
+            'id': entry_id,
+            'subject': {'id': subject_id, 'name': subject_name},
+            'staff': {'id': staff_id, 'name': staff_name} if staff_id else None,
+        }
+
+    # Courses without any live entry still get an (empty) grid
+    missing = set(course_ids) - set(grids)
+    if missing:
+        for course_id, name in Course.objects.live().filter(id__in=missing).values_list('id', 'name'):
+            grids[course_id] = {'course': {'id': course_id, 'name': name}, 'grid': empty_grid()}
+    return grids
@@ -0,0 +1,213 @@
+import csv
+import json
+import time
+from itertools import islice
+
+from django.db import transaction
+from django.utils.dateparse import parse_time
+
+from .bulk import IntervalSweep
+from .cache import bump_model_version
+from .models import Course, Subject, Staff, Period
+
+# Streaming importer for master data files (CSV with a header row, or JSONL
+# with one object per line). Rows are read lazily and written chunk by chunk
+# with bulk_create, one transaction per chunk. Names are resolved to ids
+# through in-memory maps built with one query per model, and rows that
+# already exist (same name, or same staff/subject link) are skipped, so
+# re-running an import is safe.
+#
+# Columns:
+#   courses         name[, is_active]
+#   subjects        name, course[, is_active]
+#   staff           name[, is_active]
+#   staff_subjects  staff, course, subject
+#   periods         start_time, end_time
+
+IMPORT_ORDER = ['courses', 'subjects', 'staff', 'staff_subjects', 'periods']
+
+
+class RowError(Exception):
+    pass
+
+
+def read_rows(path, fmt=None):
+    fmt = fmt or ('jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv')
+    with open(path, newline='', encoding='utf-8') as handle:
+        if fmt == 'jsonl':
+            for line in handle:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            yield from csv.DictReader(handle)
+
+
+def _flag(row, key='is_active'):
+    value = row.get(key, True)
+    if isinstance(value, str):
+        return value.strip().lower() not in ('0', 'false', 'no', 'n', '')
+    return bool(value)
+
+
+def _name(row, key):
+    value = str(row.get(key) or '').strip()
+    if not value:
+        raise RowError(f'missing {key}')
+    return value
+
+
+def _time(row, key):
+    value = parse_time(_name(row, key))
+    if value is None:
+        raise RowError(f'invalid {key} {row.get(key)!r}')
+    return value
+
+
+class ImportStats:
+    def __init__(self, kind):
+        self.kind = kind
+        self.rows = 0
+        self.created = 0
+        self.skipped = 0
+        self.errors = []  # first few (row number, message) pairs
+        self.error_count = 0
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+
+    def error(self, row_number, message, keep=20):
+        self.error_count += 1
+        if len(self.errors) < keep:
+            self.errors.append((row_number, message))
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+
+class MasterDataImporter:
+    def __init__(self, chunk_size=5000):
+        self.chunk_size = chunk_size
+        self.courses = dict(Course.objects.live().values_list('name', 'id'))
+        self.subjects = {
+            (course_id, name): subject_id
+            for subject_id, course_id, name in Subject.objects.live().values_list('id', 'course_id', 'name')
+        }
+        self.staff = dict(Staff.objects.live().values_list('name', 'id'))
+        self.periods = set(Period.objects.live().values_list('start_time', 'end_time'))
+        self.sweep = IntervalSweep(self.periods)
+        self.links = None  # {(staff_id, subject_id)}, loaded on first use
+
+    def run(self, kind, rows):
+        stats = ImportStats(kind)
+        build = getattr(self, f'_build_{kind}')
+        write = getattr(self, f'_write_{kind}')
+        numbered = enumerate(rows, start=1)
+        while True:
+            chunk = list(islice(numbered, self.chunk_size))
+            if not chunk:
+                break
+            pending = []
+            for row_number, row in chunk:
+                stats.rows += 1
+                try:
+                    obj = build(row)
+                except (RowError, ValueError, TypeError) as e:
+                    stats.error(row_number, str(e))
+                    continue
+                if obj is None:
+                    stats.skipped += 1
+                else:
+                    pending.append(obj)
+            if pending:
+                with transaction.atomic():
+                    stats.created += write(pending)
+        stats.elapsed = time.perf_counter() - stats.started
+        return stats
+
+    # Builders turn a row into an unsaved object, None when it already
+    # exists, or raise RowError. They also reserve the key so duplicates
+    # later in the same file are skipped.
+
+    def _build_courses(self, row):
+        name = _name(row, 'name')
+        if name in self.courses:
+            return None
+        self.courses[name] = None
+        return Course(name=name, is_active=_flag(row))
+
+    def _build_subjects(self, row):
+        name, course_name = _name(row, 'name'), _name(row, 'course')
+        course_id = self.courses.get(course_name)
+        if course_id is None:
+            raise RowError(f'unknown course {course_name!r}')
+        if (course_id, name) in self.subjects:
+            return None
+        self.subjects[(course_id, name)] = None
+        return Subject(name=name, course_id=course_id, is_active=_flag(row))
+
+    def _build_staff(self, row):
+        name = _name(row, 'name')
+        if name in self.staff:
+            return None
+        self.staff[name] = None
+        return Staff(name=name, is_active=_flag(row))
+
+    def _build_staff_subjects(self, row):
+        staff_name, course_name, subject_name = _name(row, 'staff'), _name(row, 'course'), _name(row, 'subject')
+        staff_id = self.staff.get(staff_name)
+        if staff_id is None:
+            raise RowError(f'unknown staff {staff_name!r}')
+        subject_id = self.subjects.get((self.courses.get(course_name), subject_name))
+        if subject_id is None:
+            raise RowError(f'unknown subject {subject_name!r} in course {course_name!r}')
+        if self.links is None:
+            self.links = set(Staff.subjects.through.objects.values_list('staff_id', 'subject_id'))
+        if (staff_id, subject_id) in self.links:
+            return None
+        self.links.add((staff_id, subject_id))
+        return Staff.subjects.through(staff_id=staff_id, subject_id=subject_id)
+
+    def _build_periods(self, row):
+        start_time = _time(row, 'start_time')
+        end_time = _time(row, 'end_time')
+        if start_time >= end_time:
+            raise RowError('start_time must be earlier than end_time')
+        if (start_time, end_time) in self.periods:
+            return None
+        if self.sweep.overlaps(start_time, end_time):
+            raise RowError(f'period {start_time}-{end_time} overlaps an existing period')
+        self.sweep.add(start_time, end_time)
+        self.periods.add((start_time, end_time))
+        return Period(start_time=start_time, end_time=end_time)
+
+    # Writers insert one chunk and record the new ids in the lookup maps.
+
+    def _write_courses(self, objs):
+        for course in Course.objects.bulk_create(objs):
+            self.courses[course.name] = course.pk
+        bump_model_version(Course)
+        return len(objs)
+
+    def _write_subjects(self, objs):
+        for subject in Subject.objects.bulk_create(objs):
+            self.subjects[(subject.course_id, subject.name)] = subject.pk
+        bump_model_version(Subject)
+        return len(objs)
+
+    def _write_staff(self, objs):
+        for member in Staff.objects.bulk_create(objs):
+            self.staff[member.name] = member.pk
+        bump_model_version(Staff)
+        return len(objs)
+
+    def _write_staff_subjects(self, objs):
+        # Known links were skipped in memory; ignore_conflicts covers links
+        # written concurrently since the map was loaded.
+        Staff.subjects.through.objects.bulk_create(objs, ignore_conflicts=True)
+        bump_model_version(Staff)
+        return len(objs)
+
+    def _write_periods(self, objs):
+        Period.objects.bulk_create(objs)
+        bump_model_version(Period)
+        return len(objs)
@@ -0,0 +1,137 @@
+from django.db import transaction
+
+from .availability import AvailabilityMatrix
+from .models import Subject, Staff, Timetable
+from .scheduler import solve
+
+# Incremental regeneration: keep every existing assignment that is still
+# valid, recompute only the slots of affected courses plus any slot whose
+# assignment was invalidated (subject removed, staff no longer available,
+# new period, ...), and write the outcome as a minimal insert/update/delete
+# diff instead of clearing the table.
+#
+# Deletes here are hard deletes on purpose. A soft-deleted entry is the
+# tombstone of a slot someone cleared by hand, and regeneration keeps those
+# slots empty. Rows dropped by the diff (slots of inactive courses or removed
+# days and periods, slots the solver could not fill) carry no such intent; as
+# tombstones they would stop the slots from ever being filled again.
+
+
+def affected_course_ids(course_ids=(), subject_ids=(), staff_ids=()):
+    # Courses whose whole timetable should be recomputed after a change to the
+    # given courses, subjects or staff. Period changes need no course list:
+    # new slots are empty and removed slots are invalid, so both are repaired
+    # for every course anyway.
+    affected = set(course_ids)
+    if subject_ids:
+        affected.update(Subject.objects.filter(id__in=subject_ids).values_list('course_id', flat=True))
+    if staff_ids:
+        affected.update(
+            Staff.subjects.through.objects.filter(staff_id__in=staff_ids).values_list('subject__course_id', flat=True)
+        )
+    return affected
+
+
+def load_existing_entries():
+    return list(
+        Timetable.objects.order_by('id')
+        .values_list('id', 'course_id', 'day_id', 'period_id', 'subject_id', 'staff_id', 'is_deleted')
+    )
+
+
+class TimetableDiff:
+    def __init__(self):
+        self.inserts = []   # new Timetable instances
+        self.updates = []   # Timetable(id=..., subject_id=..., staff_id=..., is_deleted=False) to bulk_update
+        self.deletes = []   # ids of rows to remove
+        self.unchanged = 0
+        self.unfilled = []  # [(course_id, day_id, period_id), ...]
+
+    def summary(self):
+        return {
+            'inserted': len(self.inserts),
+            'updated': len(self.updates),
+            'deleted': len(self.deletes),
+            'unchanged': self.unchanged,
+            'unfilled': len(self.unfilled),
+        }
+
+
+def plan_incremental(data, existing, affected, rng=None):
+    # `existing` rows are (id, course_id, day_id, period_id, subject_id, staff_id, is_deleted).
+    availability = AvailabilityMatrix(data.day_ids, data.period_ids)
+    valid_days, valid_periods = set(data.day_ids), set(data.period_ids)
+    course_subjects = {course_id: set(subjects) for course_id, subjects in data.course_subjects.items()}
+
+    diff = TimetableDiff()
+    rows = {}      # {(course_id, day_id, period_id): (id, subject_id, staff_id, is_deleted)}
+    kept = set()   # slots whose subject stays as it is
+    restaff = []   # kept slots whose recorded teacher is missing, no longer qualified or double booked
+
+    for entry_id, course_id, day_id, period_id, subject_id, staff_id, is_deleted in existing:
+        if course_id not in data.course_names or day_id not in valid_days or period_id not in valid_periods:
+            diff.deletes.append(entry_id)  # the slot itself no longer exists
+            continue
+        slot = (course_id, day_id, period_id)
+        rows[slot] = (entry_id, subject_id, staff_id, is_deleted)
+        if course_id in affected:
+            continue
+        if is_deleted:
+            kept.add(slot)  # manually cleared slots stay empty
+            continue
+        if subject_id in course_subjects.get(course_id, ()):
+            # Recorded teachers are booked first so they keep their lessons
+            bit = availability.bit(day_id, period_id)
+            if staff_id in data.subject_staff.get(subject_id, ()) and availability.is_free_bit(staff_id, bit):
+                availability.book_bit(staff_id, bit)
+                kept.add(slot)
+                diff.unchanged += 1
+            else:
+                restaff.append((slot, bit))
+
+    # Then give the others any qualified teacher still free; if none is, the
+    # slot is recomputed by the solver.
+    for slot, bit in restaff:
+        entry_id, subject_id, _, _ = rows[slot]
+        staff_id = availability.first_free(data.subject_staff.get(subject_id, ()), bit)
+        if staff_id is not None:
+            availability.book_bit(staff_id, bit)
+            kept.add(slot)
+            diff.updates.append(Timetable(id=entry_id, subject_id=subject_id, staff_id=staff_id, is_deleted=False))
+
+    schedule = solve(data, rng=rng, availability=availability, filled=kept)
+    diff.unfilled = schedule.unfilled
+
+    assigned = set()
+    for course_id, day_id, period_id, subject_id, staff_id in schedule.assignments:
+        slot = (course_id, day_id, period_id)
+        assigned.add(slot)
+        row = rows.get(slot)
+        if row is None:
+            diff.inserts.append(Timetable(
+                course_id=course_id, day_id=day_id, period_id=period_id, subject_id=subject_id, staff_id=staff_id,
+            ))
+        elif row[1:] == (subject_id, staff_id, False):
+            diff.unchanged += 1
+        else:
+            diff.updates.append(Timetable(id=row[0], subject_id=subject_id, staff_id=staff_id, is_deleted=False))
+
+    for slot, (entry_id, _, _, is_deleted) in rows.items():
+        if slot not in kept and slot not in assigned and not is_deleted:
+            diff.deletes.append(entry_id)
+
+    return diff
+
+
+def apply_diff(diff):
+    with transaction.atomic():
+        if diff.deletes:
+            Timetable.objects.filter(id__in=diff.deletes).delete()
+        if diff.updates:
+            # Unique (staff, day, period) is checked row by row, so clear the
+            # teachers being moved before writing their new lessons.
+            Timetable.objects.filter(id__in=[entry.id for entry in diff.updates]).update(staff=None)
+            Timetable.objects.bulk_update(diff.updates, ['subject', 'staff', 'is_deleted'])
+        if diff.inserts:
+            Timetable.objects.bulk_create(diff.inserts)
+    return diff.summary()
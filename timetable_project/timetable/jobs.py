@@ -0,0 +1,155 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError, connection, transaction
+from django.utils import timezone
+
+from .models import GenerationJob
+from .solvers import make_solver
+from .tracing import GenerationTrace
+from .utils import generate_timetables_for_all_courses
+
+logger = logging.getLogger('timetable.generator')
+
+# Generation runs off the request thread. One worker is enough: runs are
+# serialised anyway because they all write the same table, and the job row in
+# the database is the only state a client needs to poll.
+#
+# The unique `active` flag on the job row admits one pending or running job
+# across every process. A job whose process died never finishes, so one that
+# has not written its row for TIMETABLE_JOB_TIMEOUT seconds is marked failed
+# before the next job is started. A running job writes a heartbeat from its
+# own thread, whatever the solver is doing, and only a row that is still
+# active is ever finished, so an expired job cannot overwrite its failure.
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='timetable-generation')
+
+
+class JobProgress:
+    # Progress callback for the generator that writes counters to the job row,
+    # at most once every `interval` seconds so large runs don't spam UPDATEs.
+
+    def __init__(self, job_id, interval=0.5):
+        self.job_id = job_id
+        self.interval = interval
+        self._last_write = 0.0
+
+    def __call__(self, courses_done, courses_total, slots_filled, slots_unfilled):
+        now = time.monotonic()
+        if courses_done < courses_total and now - self._last_write < self.interval:
+            return
+        self._last_write = now
+        GenerationJob.objects.filter(pk=self.job_id, active=True).update(
+            courses_done=courses_done,
+            courses_total=courses_total,
+            slots_filled=slots_filled,
+            slots_unfilled=slots_unfilled,
+            updated_at=timezone.now(),
+        )
+
+
+class JobHeartbeat:
+    # Context manager that touches the job row every `interval` seconds
+    # (default: a tenth of TIMETABLE_JOB_TIMEOUT) from a background thread.
+
+    def __init__(self, job_id, interval=None):
+        self.job_id = job_id
+        self.interval = interval or getattr(settings, 'TIMETABLE_JOB_TIMEOUT', 3600) / 10
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f'timetable-job-{job_id}-heartbeat', daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        try:
+            while not self._stop.wait(self.interval):
+                try:
+                    GenerationJob.objects.filter(pk=self.job_id, active=True).update(updated_at=timezone.now())
+                except DatabaseError:
+                    # e.g. SQLite locked by the run's own write; try again next beat
+                    logger.debug('Heartbeat of generation job %s skipped', self.job_id,
+                                 extra={'event': 'job.heartbeat_skipped', 'job_id': self.job_id}, exc_info=True)
+        finally:
+            connection.close()
+
+
+def expire_stale_jobs():
+    now = timezone.now()
+    cutoff = now - timedelta(seconds=getattr(settings, 'TIMETABLE_JOB_TIMEOUT', 3600))
+    return GenerationJob.objects.filter(active=True, updated_at__lt=cutoff).update(
+        status=GenerationJob.STATUS_FAILED, active=None, error='Job stopped responding',
+        finished_at=now, updated_at=now,
+    )
+
+
+def active_generation_job():
+    expire_stale_jobs()
+    return GenerationJob.objects.filter(active=True).first()
+
+
+def start_generation_job(workers=1, solver='greedy', time_budget=None, max_daily_load=None, seed=None):
+    # Record the job and hand it to the executor once the row is committed,
+    # so the worker thread is guaranteed to see it. Returns None if another
+    # job is already active.
+    expire_stale_jobs()
+    try:
+        with transaction.atomic():
+            job = GenerationJob.objects.create(
+                workers=workers, solver=solver, time_budget=time_budget, max_daily_load=max_daily_load, seed=seed,
+            )
+    except IntegrityError:
+        return None
+    transaction.on_commit(lambda: _executor.submit(_run_in_worker_thread, job.pk))
+    return job
+
+
+def run_generation_job(job_id):
+    # Only a job that is still active is run and finished: one expired while
+    # queued is skipped, one expired while running keeps its failure
+    started = GenerationJob.objects.filter(pk=job_id, active=True).update(
+        status=GenerationJob.STATUS_RUNNING, started_at=timezone.now(), updated_at=timezone.now()
+    )
+    if not started:
+        return
+    job = GenerationJob.objects.get(pk=job_id)
+    trace = GenerationTrace('generate')
+    live = GenerationJob.objects.filter(pk=job_id, active=True)
+    try:
+        with JobHeartbeat(job_id):
+            solver = make_solver(job.solver, time_budget=job.time_budget, max_daily_load=job.max_daily_load)
+            created = generate_timetables_for_all_courses(
+                workers=job.workers, progress=JobProgress(job_id), solver=solver, trace=trace, seed=job.seed,
+            )
+    except Exception as e:
+        logger.exception('Generation job %s failed', job_id, extra={'event': 'job.failed', 'job_id': job_id})
+        live.update(
+            status=GenerationJob.STATUS_FAILED, active=None, error=str(e),
+            finished_at=timezone.now(), updated_at=timezone.now(),
+        )
+        return
+    finished = live.update(
+        status=GenerationJob.STATUS_SUCCEEDED, active=None, entries_created=created,
+        finished_at=timezone.now(), updated_at=timezone.now(),
+        score=trace.counters['score'], iterations=trace.counters['iterations'],
+        cached=trace.counters['cache_hits'] > 0,
+    )
+    if not finished:
+        logger.warning('Generation job %s finished after it had been marked failed', job_id,
+                       extra={'event': 'job.finished_after_expiry', 'job_id': job_id, 'entries_created': created})
+
+
+def _run_in_worker_thread(job_id):
+    try:
+        run_generation_job(job_id)
+    finally:
+        # Connections are per thread; don't leak this one.
+        connection.close()
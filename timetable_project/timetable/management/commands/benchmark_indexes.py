@@ -0,0 +1,63 @@
+from datetime import time as clock
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from timetable.benchmarks import (
+    analyze, create_model_indexes, drop_model_indexes, seed_synthetic_data, time_call,
+)
+from timetable.models import Course, Subject, Staff, Period, Timetable
+
+class Command(BaseCommand):
+    help = 'Measure list and period-overlap query latency with and without the soft-delete indexes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--courses', type=int, default=2000)
+        parser.add_argument('--subjects-per-course', type=int, default=6)
+        parser.add_argument('--staff', type=int, default=2000)
+        parser.add_argument('--deleted-periods', type=int, default=20000)
+        parser.add_argument('--deleted-ratio', type=float, default=0.5)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        # Everything runs in one transaction that is rolled back, so the
+        # seeded rows and index changes never persist.
+        with transaction.atomic():
+            counts = seed_synthetic_data(
+                courses=options['courses'],
+                subjects_per_course=options['subjects_per_course'],
+                staff=options['staff'],
+                deleted_periods=options['deleted_periods'],
+                deleted_ratio=options['deleted_ratio'],
+            )
+            self.stdout.write(f'Seeded {counts}')
+
+            # A course from the middle of the live table
+            live_courses = Course.objects.live().order_by('id').values_list('id', flat=True)
+            course_id = live_courses[live_courses.count() // 2]
+            # and the keyset cursor from the middle of the live timetable
+            live_entries = Timetable.objects.live().order_by('id').values_list('id', flat=True)
+            entry_count = live_entries.count()
+            cursor = live_entries[entry_count // 2] if entry_count else 0
+            queries = {
+                'course list': lambda: list(Course.objects.live().order_by('id').values_list('id', 'name')),
+                'staff list': lambda: list(Staff.objects.live().order_by('id').values_list('id', 'name')),
+                'active subjects of a course': lambda: list(Subject.objects.active().filter(course_id=course_id).values_list('id')),
+                'timetable page (keyset)': lambda: list(Timetable.objects.live().filter(id__gt=cursor).order_by('id').values_list('id')[:100]),
+                'period overlap check': lambda: Period.objects.live().filter(
+                    start_time__lt=clock(10, 30), end_time__gt=clock(10, 0)).exists(),
+            }
+
+            drop_model_indexes()
+            analyze()
+            before = {name: time_call(fn, options['repeat']) for name, fn in queries.items()}
+
+            create_model_indexes()
+            analyze()
+            after = {name: time_call(fn, options['repeat']) for name, fn in queries.items()}
+
+            transaction.set_rollback(True)
+
+        self.stdout.write(f"{'query':<32}{'before ms':>12}{'after ms':>12}{'speedup':>10}")
+        for name in queries:
+            speedup = before[name] / after[name] if after[name] else float('inf')
+            self.stdout.write(f'{name:<32}{before[name]:>12.3f}{after[name]:>12.3f}{speedup:>9.1f}x')
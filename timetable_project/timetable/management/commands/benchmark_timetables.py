@@ -0,0 +1,157 @@
+import json
+import platform
+import subprocess
+from datetime import datetime, timezone
+from itertools import count
+
+import django
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.urls import resolve, reverse
+from rest_framework.test import APIRequestFactory
+from timetable.benchmarks import measure, seed_synthetic_data
+from timetable.bulk import BULK_RESOURCES
+from timetable.models import Subject, Timetable
+from timetable.utils import generate_timetables_for_all_courses
+
+LIST_ENDPOINTS = [
+    'course-list-create', 'subject-list-create', 'staff-list-create',
+    'day-list-create', 'period-list-create', 'timetable-list',
+]
+
+class Command(BaseCommand):
+    help = 'Benchmark generation, list endpoints and bulk writes on synthetic data and report JSON results'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--courses', type=int, default=200)
+        parser.add_argument('--subjects-per-course', type=int, default=6)
+        parser.add_argument('--staff', type=int, default=400)
+        parser.add_argument('--staff-subjects', type=int, default=3, help='Subjects each staff member can teach')
+        parser.add_argument('--days', type=int, default=5, choices=range(1, 6))
+        parser.add_argument('--periods', type=int, default=8)
+        parser.add_argument('--bulk-size', type=int, default=500, help='Items per bulk write')
+        parser.add_argument('--repeat', type=int, default=3)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', default='-', help='Write the JSON report here ("-" for stdout)')
+        parser.add_argument('--compare', metavar='PATH', help='Earlier JSON report to compare against')
+
+    def handle(self, *args, **options):
+        if options['repeat'] < 1:
+            raise CommandError('--repeat must be positive')
+        params = {key: options[key] for key in (
+            'courses', 'subjects_per_course', 'staff', 'staff_subjects', 'days', 'periods', 'bulk_size', 'repeat', 'seed')}
+        baseline = None
+        if options['compare']:
+            try:
+                with open(options['compare'], encoding='utf-8') as handle:
+                    baseline = json.load(handle)
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Cannot read {options['compare']}: {e}")
+
+        # Everything runs in one transaction that is rolled back, so the
+        # seeded and generated rows never persist.
+        with transaction.atomic():
+            seeded = seed_synthetic_data(
+                courses=params['courses'], subjects_per_course=params['subjects_per_course'],
+                staff=params['staff'], staff_subjects=params['staff_subjects'], days=params['days'],
+                periods=params['periods'], deleted_periods=0, deleted_ratio=0, timetables=False, seed=params['seed'],
+            )
+            results = self.run_cases(params)
+            transaction.set_rollback(True)
+
+        report = {
+            'meta': {
+                'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+                'commit': _git_commit(),
+                'database': connection.vendor,
+                'python': platform.python_version(),
+                'django': django.get_version(),
+            },
+            'params': params,
+            'seeded': seeded,
+            'results': results,
+        }
+        body = json.dumps(report, indent=2)
+        if options['output'] == '-':
+            self.stdout.write(body)
+        else:
+            with open(options['output'], 'w', encoding='utf-8') as handle:
+                handle.write(body + '\n')
+            self.stdout.write(self.style.SUCCESS(f"Wrote {len(results)} results to {options['output']}"))
+        if baseline:
+            self.print_comparison(baseline.get('results', {}), results)
+
+    def run_cases(self, params):
+        repeat = params['repeat']
+        results = {}
+
+        def clear_timetables():
+            Timetable.objects.all().delete()
+
+        def generate():
+            return generate_timetables_for_all_courses(quiet=True)
+
+        results['generate'], created = measure(generate, repeat=repeat, setup=clear_timetables)
+        results['generate']['entries'] = created
+
+        factory = APIRequestFactory()
+        for name in LIST_ENDPOINTS:
+            path = reverse(name)
+            view = resolve(path).func
+
+            def call(path=path, view=view):
+                response = view(factory.get(path))
+                if hasattr(response, 'render'):
+                    response.render()
+                return len(response.content)
+
+            # Cold calls: the reference cache is cleared before every run
+            results[f'list {path}'], size = measure(call, repeat=repeat, setup=cache.clear)
+            results[f'list {path}']['bytes'] = size
+
+        names = count()
+        size = params['bulk_size']
+        subject_ids = list(Subject.objects.live().values_list('id', flat=True)[:max(size, 1)])
+
+        def create_courses():
+            return BULK_RESOURCES['courses'].create([{'name': f'Bulk course {next(names)}'} for _ in range(size)])
+
+        def create_staff():
+            return BULK_RESOURCES['staff'].create([
+                {'name': f'Bulk staff {next(names)}', 'subject_ids': subject_ids[i % len(subject_ids):][:2]}
+                for i in range(size)
+            ])
+
+        def update_subjects():
+            return BULK_RESOURCES['subjects'].update([
+                {'id': pk, 'name': f'Renamed {next(names)}'} for pk in subject_ids[:size]
+            ])
+
+        results['bulk create courses'], _ = measure(create_courses, repeat=repeat)
+        if subject_ids:
+            results['bulk create staff'], _ = measure(create_staff, repeat=repeat)
+            results['bulk update subjects'], _ = measure(update_subjects, repeat=repeat)
+        return results
+
+    def print_comparison(self, before, after):
+        self.stdout.write(f"\n{'case':<32}{'wall ms':>12}{'was':>12}{'change':>9}{'queries':>9}{'was':>6}")
+        for name, result in after.items():
+            old = before.get(name)
+            if not old:
+                self.stdout.write(f"{name:<32}{result['wall_ms']:>12.3f}{'-':>12}{'':>9}{result['queries']:>9}{'-':>6}")
+                continue
+            change = (result['wall_ms'] / old['wall_ms'] - 1) * 100 if old['wall_ms'] else 0.0
+            self.stdout.write(
+                f"{name:<32}{result['wall_ms']:>12.3f}{old['wall_ms']:>12.3f}{change:>+8.1f}%"
+                f"{result['queries']:>9}{old['queries']:>6}"
+            )
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, timeout=5, check=True,
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
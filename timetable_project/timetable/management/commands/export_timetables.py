@@ -0,0 +1,59 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+from timetable.exports import CALENDAR_GROUPS, EXPORT_FORMATS, export_rows, iter_calendars, iter_export
+from timetable.models import Course, Staff
+
+class Command(BaseCommand):
+    help = 'Stream live timetable entries to CSV, JSONL or per-course/per-staff .ics calendars'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=EXPORT_FORMATS, default='csv', help='Output format (default: csv)')
+        parser.add_argument('--output', default='-', help='Output file, "-" for stdout; for .ics without --course/--staff, a directory')
+        parser.add_argument('--course', type=int, help='Only export this course')
+        parser.add_argument('--staff', type=int, help='Only export lessons of this staff member')
+        parser.add_argument('--by', choices=list(CALENDAR_GROUPS), default='course', help='One .ics file per course or per staff member')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Rows fetched per database round trip')
+
+    def handle(self, *args, **options):
+        fmt, output = options['format'], options['output']
+        course_id, staff_id, group = options['course'], options['staff'], options['by']
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be positive')
+        name = 'Timetable'
+        if course_id is not None:
+            course = Course.objects.live().filter(pk=course_id).first()
+            if course is None:
+                raise CommandError(f'Course {course_id} not found')
+            name = course.name
+        if staff_id is not None:
+            member = Staff.objects.live().filter(pk=staff_id).first()
+            if member is None:
+                raise CommandError(f'Staff {staff_id} not found')
+            name = member.name
+
+        if fmt == 'ics' and course_id is None and staff_id is None:
+            # One calendar file per course or staff member, written while the row stream passes by
+            if output == '-':
+                raise CommandError('--output must be a directory when exporting every calendar as .ics')
+            os.makedirs(output, exist_ok=True)
+            written = 0
+            rows = export_rows(group=group, chunk_size=options['chunk_size'])
+            for group_id, _, chunks in iter_calendars(rows, group=group):
+                self._write(os.path.join(output, f'timetable-{group}-{group_id}.ics'), chunks)
+                written += 1
+            self.stdout.write(self.style.SUCCESS(f'Wrote {written} {group} calendars to {output}'))
+            return
+
+        rows = export_rows(course_id=course_id, staff_id=staff_id, chunk_size=options['chunk_size'])
+        self._write(output, iter_export(fmt, rows, calendar_name=name))
+
+    def _write(self, path, chunks):
+        if path == '-':
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
+            return
+        # newline='' keeps the CRLF line endings csv and iCalendar require
+        with open(path, 'w', newline='', encoding='utf-8') as handle:
+            for chunk in chunks:
+                handle.write(chunk)
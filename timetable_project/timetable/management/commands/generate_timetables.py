@@ -0,0 +1,86 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from timetable.jobs import active_generation_job
+from timetable.models import Timetable
+from timetable.snapshots import rebuild_course_snapshots
+from timetable.solvers import SOLVERS, make_solver
+from timetable.utils import generate_timetables_for_all_courses, regenerate_timetables
+
+class Command(BaseCommand):
+    help = 'Generate timetables for all active courses'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=1,
+            help='Worker processes for independent course groups (0 = one per CPU)',
+        )
+        parser.add_argument('--solver', choices=list(SOLVERS), help='Solver backend (default: settings.TIMETABLE_SOLVER)')
+        parser.add_argument('--time-budget', type=float, help='Seconds the anneal solver may search (anytime: best so far is kept)')
+        parser.add_argument('--max-iterations', type=int, help='Stop the anneal solver after this many moves')
+        parser.add_argument('--seed', type=int, help='Random seed; seeded runs are reproducible and cached by input fingerprint')
+        parser.add_argument('--max-daily-load', type=int, help='Lessons per day above which a staff member is penalised')
+        parser.add_argument(
+            '--stream', action='store_true',
+            help='Solve greedily one course at a time and insert entries in batches, keeping memory flat',
+        )
+        parser.add_argument('--batch-size', type=int, help='Entries per bulk insert (default: settings.TIMETABLE_GENERATION_BATCH_SIZE)')
+        parser.add_argument(
+            '--clear', action='store_true',
+            help='Delete existing timetables before generating',
+        )
+        parser.add_argument(
+            '--incremental', action='store_true',
+            help='Keep valid existing entries and only recompute affected courses and invalid slots',
+        )
+        parser.add_argument('--course', type=int, action='append', default=[], help='Changed course id (repeatable)')
+        parser.add_argument('--subject', type=int, action='append', default=[], help='Changed subject id (repeatable)')
+        parser.add_argument('--staff', type=int, action='append', default=[], help='Changed staff id (repeatable)')
+        parser.add_argument(
+            '--quiet', action='store_true',
+            help='Only log summary counters, not every unfilled slot or unstaffed subject (also implied by -v 0)',
+        )
+
+    def handle(self, *args, **options):
+        if options['workers'] < 0:
+            raise CommandError('--workers must be a non-negative integer')
+        if options['batch_size'] is not None and options['batch_size'] < 1:
+            raise CommandError('--batch-size must be a positive integer')
+        quiet = options['quiet'] or options['verbosity'] == 0 or None
+        active_job = active_generation_job()
+        if active_job:
+            raise CommandError(f'Generation job {active_job.pk} is {active_job.status}; wait for it to finish.')
+
+        if options['incremental']:
+            summary = regenerate_timetables(
+                course_ids=options['course'], subject_ids=options['subject'], staff_ids=options['staff'], quiet=quiet,
+                seed=options['seed'],
+            )
+            self.stdout.write(self.style.SUCCESS(
+                'Inserted {inserted}, updated {updated}, deleted {deleted}, '
+                'unchanged {unchanged}, unfilled {unfilled}'.format(**summary)
+            ))
+            return
+
+        # Settle every option before --clear deletes anything
+        streaming = options['stream'] or getattr(settings, 'TIMETABLE_GENERATION_STREAMING', False)
+        solver = make_solver(
+            options['solver'] or ('greedy' if streaming else None), time_budget=options['time_budget'],
+            max_iterations=options['max_iterations'], max_daily_load=options['max_daily_load'],
+        )
+        if streaming and solver.name != 'greedy':
+            raise CommandError('--stream only supports the greedy solver')
+
+        if Timetable.objects.exists():
+            if not options['clear']:
+                raise CommandError('Existing timetables found. Re-run with --clear or --incremental.')
+            with transaction.atomic():
+                Timetable.objects.all().delete()
+                rebuild_course_snapshots()
+            self.stdout.write(self.style.WARNING('Existing timetables cleared'))
+
+        created = generate_timetables_for_all_courses(
+            workers=options['workers'], quiet=quiet, solver=solver, seed=options['seed'],
+            streaming=streaming, batch_size=options['batch_size'],
+        )
+        self.stdout.write(self.style.SUCCESS(f'Successfully created {created} timetable entries'))
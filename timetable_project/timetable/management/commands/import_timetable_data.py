@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+from timetable.importer import IMPORT_ORDER, MasterDataImporter, read_rows
+
+class Command(BaseCommand):
+    help = 'Stream courses, subjects, staff, staff-subject links and periods from CSV or JSONL files'
+
+    def add_arguments(self, parser):
+        for kind in IMPORT_ORDER:
+            parser.add_argument(f"--{kind.replace('_', '-')}", dest=kind, metavar='PATH', help=f'File of {kind.replace("_", " ")}')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='Input format (default: from file extension)')
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Rows per bulk insert and transaction')
+
+    def handle(self, *args, **options):
+        files = [(kind, options[kind]) for kind in IMPORT_ORDER if options[kind]]
+        if not files:
+            raise CommandError('Nothing to import. Pass at least one of: ' + ', '.join(
+                '--' + kind.replace('_', '-') for kind in IMPORT_ORDER))
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be positive')
+
+        # Files are loaded in dependency order so names resolve against
+        # rows imported earlier in the same run.
+        importer = MasterDataImporter(chunk_size=options['chunk_size'])
+        for kind, path in files:
+            try:
+                stats = importer.run(kind, read_rows(path, options['format']))
+            except OSError as e:
+                raise CommandError(str(e))
+
+            self.stdout.write(self.style.SUCCESS(
+                f'{kind}: {stats.rows} rows, {stats.created} created, {stats.skipped} already present, '
+                f'{stats.error_count} errors in {stats.elapsed:.2f}s ({stats.rows_per_second:,.0f} rows/s)'
+            ))
+            for row_number, message in stats.errors:
+                self.stdout.write(self.style.WARNING(f'  {kind} row {row_number}: {message}'))
+            if stats.error_count > len(stats.errors):
+                self.stdout.write(self.style.WARNING(f'  ... {stats.error_count - len(stats.errors)} more'))
@@ -0,0 +1,47 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from timetable.analytics import problems_only, timetable_analytics
+
+class Command(BaseCommand):
+    help = 'Report staff workload, subject frequency and unfilled slots of the live timetable'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--max-daily-load', type=int, help='Daily lessons above which staff count as overloaded (default: settings.TIMETABLE_MAX_DAILY_LOAD)')
+        parser.add_argument('--all', action='store_true', help='List every staff member, subject and course, not only problems')
+        parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+
+    def handle(self, *args, **options):
+        if options['max_daily_load'] is not None and options['max_daily_load'] < 1:
+            raise CommandError('--max-daily-load must be a positive integer')
+        report = timetable_analytics(options['max_daily_load'])
+        if not options['all']:
+            report = problems_only(report)
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+
+        summary = report['summary']
+        self.stdout.write(
+            f"{summary['entries']} entries ({summary['unstaffed']} without staff), {report['slots_per_course']} slots per course, "
+            f"daily cap {report['max_daily_load'] if report['max_daily_load'] is not None else 'none'}"
+        )
+        self.stdout.write(
+            f"{summary['unfilled_slots']} unfilled slots in {summary['courses_with_unfilled_slots']} courses, "
+            f"{summary['overloaded_staff']} overloaded and {summary['idle_staff']} idle staff, "
+            f"{summary['under_scheduled_subjects']} under-scheduled subjects"
+        )
+        if report['staff']:
+            self.stdout.write(self.style.MIGRATE_HEADING('Staff (weekly / busiest day)'))
+            for member in report['staff']:
+                flag = self.style.WARNING(' overloaded') if member['overloaded'] else ''
+                self.stdout.write(f"  {member['name']}: {member['weekly_lessons']} / {member['peak_daily_lessons']}{flag}")
+        if report['subjects']:
+            self.stdout.write(self.style.MIGRATE_HEADING('Subjects (lessons / balanced share)'))
+            for subject in report['subjects']:
+                flag = self.style.WARNING(' under-scheduled') if subject['under_scheduled'] else ''
+                self.stdout.write(f"  {subject['course']['name']} - {subject['name']}: {subject['lessons']} / {subject['target']}{flag}")
+        if report['courses']:
+            self.stdout.write(self.style.MIGRATE_HEADING('Courses (filled / unfilled)'))
+            for course in report['courses']:
+                self.stdout.write(f"  {course['name']}: {course['filled']} / {course['unfilled']}")
@@ -0,0 +1,162 @@
+import logging
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+from django.db import connection
+
+# Per-request instrumentation. RequestMetricsMiddleware times every request,
+# counts its queries and their database time through connection.execute_wrapper
+# and records the response size, aggregated per (view, method) in an
+# in-process registry that the metrics endpoint renders as Prometheus text.
+#
+# The registry is per process, like the local-memory cache: with several
+# server processes, scrape each one (or run a single process per port).
+# Queries issued while a StreamingHttpResponse is consumed happen after the
+# middleware returns and are not counted.
+
+logger = logging.getLogger('timetable.metrics')
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250)
+SIZE_BUCKETS = (1024, 10240, 102400, 1048576, 10485760)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def lines(self, name, labels):
+        cumulative = 0
+        for bound, bucket_count in zip((*self.buckets, '+Inf'), self.counts):
+            cumulative += bucket_count
+            yield f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}'
+        yield f'{name}_sum{{{labels}}} {self.sum:g}'
+        yield f'{name}_count{{{labels}}} {self.count}'
+
+
+class ViewMetrics:
+    def __init__(self):
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.queries = Histogram(QUERY_BUCKETS)
+        self.response_bytes = Histogram(SIZE_BUCKETS)
+        self.db_seconds = 0.0
+        self.statuses = {}  # {status code: requests}
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views = {}  # {(view, method): ViewMetrics}
+
+    def record(self, view, method, status, seconds, queries, db_seconds, size):
+        with self._lock:
+            metrics = self._views.get((view, method))
+            if metrics is None:
+                metrics = self._views[(view, method)] = ViewMetrics()
+            metrics.latency.observe(seconds)
+            metrics.queries.observe(queries)
+            if size is not None:
+                metrics.response_bytes.observe(size)
+            metrics.db_seconds += db_seconds
+            metrics.statuses[status] = metrics.statuses.get(status, 0) + 1
+
+    def reset(self):
+        with self._lock:
+            self._views.clear()
+
+    def render(self):
+        # Prometheus text exposition format 0.0.4
+        with self._lock:
+            views = sorted(self._views.items())
+            sections = {
+                'timetable_requests_total': ('counter', 'Requests by view, method and status code.', []),
+                'timetable_request_duration_seconds': ('histogram', 'Request latency in seconds.', []),
+                'timetable_request_queries': ('histogram', 'Database queries per request.', []),
+                'timetable_request_db_seconds_total': ('counter', 'Time spent in database queries.', []),
+                'timetable_response_bytes': ('histogram', 'Response body size in bytes (streaming responses excluded).', []),
+            }
+            for (view, method), metrics in views:
+                labels = f'view="{_escape(view)}",method="{method}"'
+                for code, total in sorted(metrics.statuses.items()):
+                    sections['timetable_requests_total'][2].append(
+                        f'timetable_requests_total{{{labels},status="{code}"}} {total}')
+                sections['timetable_request_duration_seconds'][2].extend(
+                    metrics.latency.lines('timetable_request_duration_seconds', labels))
+                sections['timetable_request_queries'][2].extend(
+                    metrics.queries.lines('timetable_request_queries', labels))
+                sections['timetable_request_db_seconds_total'][2].append(
+                    f'timetable_request_db_seconds_total{{{labels}}} {metrics.db_seconds:g}')
+                if metrics.response_bytes.count:
+                    sections['timetable_response_bytes'][2].extend(
+                        metrics.response_bytes.lines('timetable_response_bytes', labels))
+
+        lines = []
+        for name, (kind, help_text, samples) in sections.items():
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            lines.extend(samples)
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+registry = MetricsRegistry()
+
+
+class QueryRecorder:
+    # connection.execute_wrapper hook: counts queries and their time, and
+    # remembers the slowest statement for the slow-request log.
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.worst_seconds = 0.0
+        self.worst_sql = None
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.count += 1
+            self.seconds += elapsed
+            if elapsed > self.worst_seconds:
+                self.worst_seconds, self.worst_sql = elapsed, sql
+
+
+class RequestMetricsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        start = time.perf_counter()
+        with connection.execute_wrapper(recorder):
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - start
+
+        match = request.resolver_match
+        view = match.view_name if match else 'unmatched'
+        size = None if response.streaming else len(response.content)
+        registry.record(view, request.method, response.status_code, elapsed, recorder.count, recorder.seconds, size)
+
+        slow_ms = getattr(settings, 'TIMETABLE_SLOW_REQUEST_MS', None)
+        if slow_ms is not None and elapsed * 1000 >= slow_ms:
+            logger.warning(
+                'Slow request %s %s (%s): %.1f ms, %d queries, %.1f ms in db; slowest query %.1f ms: %s',
+                request.method, request.path, view, elapsed * 1000, recorder.count, recorder.seconds * 1000,
+                recorder.worst_seconds * 1000, (recorder.worst_sql or '-')[:500],
+            )
+        return response
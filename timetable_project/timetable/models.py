@@ -1,12 +1,40 @@
 from django.db import models
+from django.db.models import Q
 
 # Create your models here.
 
+# Nearly every query filters on is_deleted=False (and often is_active=True),
+# so the indexes below are partial on LIVE: smaller than full indexes and
+# usable for exactly those queries.
+LIVE = Q(is_deleted=False)
+
+
+class SoftDeleteQuerySet(models.QuerySet):
+    def live(self):
+        # Rows that have not been soft deleted
+        return self.filter(is_deleted=False)
+
+    def active(self):
+        # Live rows that are also switched on
+        return self.filter(is_active=True, is_deleted=False)
+
+
+SoftDeleteManager = models.Manager.from_queryset(SoftDeleteQuerySet)
+
+
 class Course(models.Model):
     name = models.CharField(max_length=100)
     is_active = models.BooleanField(default=True)
     is_deleted = models.BooleanField(default=False)
 
+    objects = SoftDeleteManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['id'], condition=LIVE, name='course_live_idx'),
+            models.Index(fields=['is_active', 'id'], condition=LIVE, name='course_active_idx'),
+        ]
+
     def __str__(self):
         return self.name
     
@@ -16,6 +44,14 @@ class Subject(models.Model):
     is_active = models.BooleanField(default=True)
     is_deleted = models.BooleanField(default=False)
 
+    objects = SoftDeleteManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['id'], condition=LIVE, name='subject_live_idx'),
+            models.Index(fields=['course', 'is_active'], condition=LIVE, name='subject_course_active_idx'),
+        ]
+
     def __str__(self):
         return self.name
     
@@ -32,6 +68,13 @@ class Day(models.Model):
     is_active = models.BooleanField(default=True)
     is_deleted = models.BooleanField(default=False)
 
+    objects = SoftDeleteManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['id'], condition=LIVE, name='day_live_idx'),
+        ]
+
     def __str__(self):
         return self.name
 
@@ -42,6 +85,14 @@ class Period(models.Model):
     is_active = models.BooleanField(default=True)
     is_deleted = models.BooleanField(default=False)
 
+    objects = SoftDeleteManager()
+
+    class Meta:
+        indexes = [
+            # Overlap checks: start_time < new_end AND end_time > new_start
+            models.Index(fields=['start_time', 'end_time'], condition=LIVE, name='period_live_range_idx'),
+        ]
+
     def __str__(self):
         return f"{self.start_time} - {self.end_time}"
 
@@ -51,6 +102,14 @@ class Staff(models.Model):
     is_active = models.BooleanField(default=True)
     is_deleted = models.BooleanField(default=False)
 
+    objects = SoftDeleteManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['id'], condition=LIVE, name='staff_live_idx'),
+            models.Index(fields=['is_active', 'id'], condition=LIVE, name='staff_active_idx'),
+        ]
+
     def __str__(self):
         return self.name
     
@@ -59,11 +118,86 @@ class Timetable(models.Model):
     day = models.ForeignKey(Day, related_name='timetables', on_delete=models.CASCADE)
     period = models.ForeignKey(Period, related_name='timetables', on_delete=models.CASCADE)
     subject = models.ForeignKey('Subject', related_name='timetables', on_delete=models.CASCADE)
+    # Teacher chosen by the generator; empty for entries made before staff were recorded
+    staff = models.ForeignKey('Staff', related_name='timetables', null=True, blank=True, on_delete=models.SET_NULL)
     is_active = models.BooleanField(default=True)
     is_deleted = models.BooleanField(default=False)
 
+    objects = SoftDeleteManager()
+
     class Meta:
         unique_together = ('course', 'day', 'period')
+        indexes = [
+            models.Index(fields=['id'], condition=LIVE, name='timetable_live_idx'),
+            # Who/what occupies a given slot across all courses
+            models.Index(fields=['day', 'period'], condition=LIVE, name='timetable_live_slot_idx'),
+        ]
+        constraints = [
+            # A staff member teaches at most one live lesson per slot. The
+            # index behind it also serves per-staff timetable lookups.
+            models.UniqueConstraint(fields=['staff', 'day', 'period'], condition=LIVE, name='timetable_live_staff_slot_uniq'),
+        ]
 
     def __str__(self):
         return f"{self.course.name} - {self.day.name} - {self.period.start_time} - {self.subject.name}"
+
+
+class CourseTimetableSnapshot(models.Model):
+    # Denormalized read model: the serialized live entries of one course as a
+    # ready-made JSON fragment, rebuilt by every timetable write path (see
+    # snapshots.py). Writes to data it embeds bump `version`; the payload is
+    # current while `built_version` matches it (NULL: never built).
+    course = models.OneToOneField(Course, primary_key=True, related_name='timetable_snapshot', on_delete=models.CASCADE)
+    version = models.PositiveBigIntegerField(default=0)
+    built_version = models.PositiveBigIntegerField(null=True, blank=True)
+    payload = models.TextField(blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Timetable snapshot of course {self.course_id}"
+
+
+class GenerationJob(models.Model):
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_SUCCEEDED = 'succeeded'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_SUCCEEDED, 'Succeeded'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    workers = models.PositiveIntegerField(default=1)
+    solver = models.CharField(max_length=20, default='greedy')
+    time_budget = models.FloatField(null=True, blank=True)
+    max_daily_load = models.PositiveIntegerField(null=True, blank=True)
+    seed = models.BigIntegerField(null=True, blank=True)
+    courses_total = models.PositiveIntegerField(default=0)
+    courses_done = models.PositiveIntegerField(default=0)
+    slots_filled = models.PositiveIntegerField(default=0)
+    slots_unfilled = models.PositiveIntegerField(default=0)
+    entries_created = models.PositiveIntegerField(null=True, blank=True)
+    score = models.PositiveIntegerField(null=True, blank=True)
+    iterations = models.PositiveIntegerField(null=True, blank=True)
+    cached = models.BooleanField(default=False)  # schedule reused from an identical earlier run
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)  # heartbeat, also set by every update() in jobs.py
+    # True while pending or running and NULL once finished: the unique index
+    # lets at most one job be active, NULLs never collide
+    active = models.BooleanField(null=True, unique=True, default=True, editable=False)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    @property
+    def is_finished(self):
+        return self.status in (self.STATUS_SUCCEEDED, self.STATUS_FAILED)
+
+    def __str__(self):
+        return f"Generation job {self.pk} ({self.status})"
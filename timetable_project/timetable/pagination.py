@@ -0,0 +1,57 @@
+import json
+from itertools import islice
+
+from django.http import StreamingHttpResponse
+from rest_framework.pagination import CursorPagination
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+
+class KeysetPagination(CursorPagination):
+    # Opaque cursor over the primary key: every page is an indexed
+    # `WHERE id > last_id ORDER BY id LIMIT n`, however deep the client goes.
+    ordering = 'id'
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+
+
+STREAM_CHUNK_SIZE = 500
+
+
+def stream_json_list(queryset, serializer_class, chunk_size=STREAM_CHUNK_SIZE):
+    # Serialize the queryset `chunk_size` rows at a time and write a JSON
+    # array incrementally, so memory stays flat regardless of table size.
+    # prefetch_related() is honoured per chunk by QuerySet.iterator().
+    def chunks():
+        rows = queryset.iterator(chunk_size=chunk_size)
+        yield '['
+        first = True
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                break
+            body = json.dumps(serializer_class(chunk, many=True).data, cls=JSONEncoder)[1:-1]
+            yield body if first else ',' + body
+            first = False
+        yield ']'
+
+    return StreamingHttpResponse(chunks(), content_type='application/json')
+
+
+def list_response(request, view, queryset, serializer_class):
+    # Shared GET-list behaviour for the API views:
+    #   ?stream=1               stream the whole list as chunked JSON
+    #   ?page_size=N / ?cursor  keyset-paginated {next, previous, results}
+    #   (neither)               the full list, as before
+    if request.query_params.get('stream') in ('1', 'true'):
+        return stream_json_list(queryset.order_by('id'), serializer_class)
+
+    params = request.query_params
+    if KeysetPagination.page_size_query_param in params or KeysetPagination.cursor_query_param in params:
+        paginator = KeysetPagination()
+        page = paginator.paginate_queryset(queryset, request, view=view)
+        serializer = serializer_class(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+    return Response(serializer_class(queryset, many=True).data)
@@ -0,0 +1,345 @@
+import hashlib
+import json
+import os
+import random
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .availability import AvailabilityMatrix
+from .models import Course, Subject, Staff, Day, Period, Timetable
+
+
+class SchedulingData:
+    # Compact, id-only view of everything the generator needs. Built once per
+    # run so the solver never has to touch the ORM.
+
+    def __init__(self, course_ids, course_names, day_ids, period_ids, course_subjects, subject_staff, subject_names):
+        self.course_ids = course_ids            # [course_id, ...]
+        self.course_names = course_names        # {course_id: name}
+        self.day_ids = day_ids                  # [day_id, ...] in weekday order
+        self.period_ids = period_ids            # [period_id, ...] in start_time order
+        self.course_subjects = course_subjects  # {course_id: [subject_id, ...]}
+        self.subject_staff = subject_staff      # {subject_id: [staff_id, ...]}
+        self.subject_names = subject_names      # {subject_id: name}
+
+    @property
+    def slots_per_course(self):
+        return len(self.day_ids) * len(self.period_ids)
+
+    def fingerprint(self):
+        # Content hash of everything the solver reads. Names are left out:
+        # renaming a course or subject does not change its schedule.
+        content = json.dumps([
+            self.course_ids,
+            self.day_ids,
+            self.period_ids,
+            sorted(self.course_subjects.items()),
+            sorted(self.subject_staff.items()),
+        ], separators=(',', ':'))
+        return hashlib.sha256(content.encode()).hexdigest()
+
+    def subset(self, course_ids):
+        # Same days/periods, restricted to the given courses and their subjects.
+        course_subjects = {c: self.course_subjects[c] for c in course_ids if c in self.course_subjects}
+        subject_ids = [s for subjects in course_subjects.values() for s in subjects]
+        return SchedulingData(
+            course_ids=list(course_ids),
+            course_names={c: self.course_names[c] for c in course_ids},
+            day_ids=self.day_ids,
+            period_ids=self.period_ids,
+            course_subjects=course_subjects,
+            subject_staff={s: self.subject_staff[s] for s in subject_ids if s in self.subject_staff},
+            subject_names={s: self.subject_names[s] for s in subject_ids},
+        )
+
+
+def load_scheduling_data():
+    # Five queries regardless of how many courses, subjects or staff exist.
+    courses = list(
+        Course.objects.active()
+        .order_by('id')
+        .values_list('id', 'name')
+    )
+    day_ids = list(Day.objects.live().order_by('id').values_list('id', flat=True))
+    period_ids = list(Period.objects.live().order_by('start_time', 'id').values_list('id', flat=True))
+
+    course_subjects = defaultdict(list)
+    subject_names = {}
+    subjects = Subject.objects.active().filter(
+        course__is_active=True, course__is_deleted=False
+    ).order_by('id').values_list('id', 'course_id', 'name')
+    for subject_id, course_id, name in subjects:
+        course_subjects[course_id].append(subject_id)
+        subject_names[subject_id] = name
+
+    subject_staff = defaultdict(list)
+    links = Staff.subjects.through.objects.filter(
+        staff__is_active=True, staff__is_deleted=False,
+        subject__is_active=True, subject__is_deleted=False,
+    ).order_by('subject_id', 'staff_id').values_list('subject_id', 'staff_id')
+    for subject_id, staff_id in links:
+        subject_staff[subject_id].append(staff_id)
+
+    return SchedulingData(
+        course_ids=[course_id for course_id, _ in courses],
+        course_names=dict(courses),
+        day_ids=day_ids,
+        period_ids=period_ids,
+        course_subjects=dict(course_subjects),
+        subject_staff=dict(subject_staff),
+        subject_names=subject_names,
+    )
+
+
+class Schedule:
+    # Result of a solver run. Assignments are plain tuples so they are cheap to
+    # hold, compare and ship around.
+
+    def __init__(self):
+        self.assignments = []  # [(course_id, day_id, period_id, subject_id, staff_id), ...]
+        self.unfilled = []     # [(course_id, day_id, period_id), ...]
+        self.skipped_courses = []
+        self.availability = None  # AvailabilityMatrix of staff bookings after solving
+        self.solver = None        # name of the backend that produced it
+        self.score = None         # penalty, lower is better (see solvers.py)
+        self.iterations = 0
+
+    def __len__(self):
+        return len(self.assignments)
+
+    def to_cache(self):
+        return {
+            'assignments': self.assignments,
+            'unfilled': self.unfilled,
+            'skipped_courses': self.skipped_courses,
+            'solver': self.solver,
+            'score': self.score,
+            'iterations': self.iterations,
+        }
+
+    @classmethod
+    def from_cache(cls, value):
+        schedule = cls()
+        for key, item in value.items():
+            setattr(schedule, key, item)
+        return schedule
+
+    def report(self, progress, courses_done, courses_total):
+        progress(
+            courses_done=courses_done,
+            courses_total=courses_total,
+            slots_filled=len(self.assignments),
+            slots_unfilled=len(self.unfilled),
+        )
+
+    def merge(self, other):
+        self.assignments.extend(other.assignments)
+        self.unfilled.extend(other.unfilled)
+        self.skipped_courses.extend(other.skipped_courses)
+        self.solver = self.solver or other.solver
+        if other.score is not None:
+            self.score = (self.score or 0) + other.score  # components share no courses or staff
+        self.iterations += other.iterations
+        if other.availability is not None:
+            if self.availability is None:
+                self.availability = other.availability
+            else:
+                self.availability.merge(other.availability)
+
+
+def iter_solve(data, rng=None, availability=None, filled=None):
+    # Greedy pass over every course against one shared staff-availability
+    # matrix, so a staff member can never be double-booked across courses.
+    # Yields (course_id, assignments, unfilled) one course at a time, with
+    # assignments=None for a course without subjects, so callers can write
+    # results out without holding the whole run. Slots in `filled`
+    # ({(course_id, day_id, period_id), ...}) are left alone; pass the
+    # matching staff bookings in `availability` when using it.
+    rng = rng or random.Random()
+    if availability is None:
+        availability = AvailabilityMatrix(data.day_ids, data.period_ids)
+    slots = [
+        (day_id, period_id, availability.bit(day_id, period_id))
+        for day_id in data.day_ids
+        for period_id in data.period_ids
+    ]
+
+    for course_id in data.course_ids:
+        subjects = list(data.course_subjects.get(course_id, ()))
+        if not subjects:
+            yield course_id, None, []
+            continue
+
+        assignments, unfilled = [], []
+        for day_id, period_id, bit in slots:
+            if filled and (course_id, day_id, period_id) in filled:
+                continue
+            rng.shuffle(subjects)  # Shuffle subjects for randomness
+            for subject_id in subjects:
+                staff_id = availability.first_free(data.subject_staff.get(subject_id, ()), bit)
+                if staff_id is not None:
+                    availability.book_bit(staff_id, bit)
+                    assignments.append((course_id, day_id, period_id, subject_id, staff_id))
+                    break
+            else:
+                unfilled.append((course_id, day_id, period_id))
+        yield course_id, assignments, unfilled
+
+
+def solve(data, rng=None, availability=None, progress=None, filled=None):
+    # iter_solve() collected into a Schedule. `progress`, if given, is called
+    # after every course with running counts.
+    schedule = Schedule()
+    if availability is None:
+        availability = AvailabilityMatrix(data.day_ids, data.period_ids)
+    courses = iter_solve(data, rng=rng, availability=availability, filled=filled)
+    for courses_done, (course_id, assignments, unfilled) in enumerate(courses, start=1):
+        if assignments is None:
+            schedule.skipped_courses.append(course_id)
+        else:
+            schedule.assignments.extend(assignments)
+            schedule.unfilled.extend(unfilled)
+        if progress:
+            schedule.report(progress, courses_done, len(data.course_ids))
+
+    schedule.availability = availability
+    return schedule
+
+
+def split_components(data):
+    # Courses are linked when any of their subjects share a staff member.
+    # Each connected component of that Staff-Subject-Course graph is an
+    # independent scheduling problem. Returned largest first.
+    parent = {course_id: course_id for course_id in data.course_ids}
+
+    def find(course_id):
+        while parent[course_id] != course_id:
+            parent[course_id] = parent[parent[course_id]]
+            course_id = parent[course_id]
+        return course_id
+
+    staff_course = {}
+    for course_id, subjects in data.course_subjects.items():
+        if course_id not in parent:
+            continue
+        for subject_id in subjects:
+            for staff_id in data.subject_staff.get(subject_id, ()):
+                other = staff_course.setdefault(staff_id, course_id)
+                root, other_root = find(course_id), find(other)
+                if root != other_root:
+                    parent[other_root] = root
+
+    components = defaultdict(list)
+    for course_id in data.course_ids:
+        components[find(course_id)].append(course_id)
+    return sorted(components.values(), key=len, reverse=True)
+
+
+def _run_solver(solver, data, rng, progress=None):
+    if solver is None:
+        return solve(data, rng=rng, progress=progress)
+    return solver.solve(data, rng=rng, progress=progress)
+
+
+def _solve_component(args):
+    data, seed, solver = args
+    return _run_solver(solver, data, random.Random(seed))
+
+
+def parallel_concurrency(workers, components):
+    # Worker processes solve_parallel() runs for `components`; 1 means it
+    # solves in-process. Component budgets scale with it, so it is part of
+    # the cache key of a seeded run.
+    if workers == 0:
+        workers = os.cpu_count() or 1
+    if workers <= 1 or len(components) <= 1:
+        return 1
+    return min(workers, len(components))
+
+
+def solve_parallel(data, workers=1, rng=None, progress=None, solver=None, components=None):
+    # Solve each connected component in its own worker process and merge the
+    # results. workers=0 means one worker per CPU; workers=1 stays in-process.
+    # `solver` is a backend from solvers.py (default: the plain greedy pass);
+    # each component gets a share of its budget proportional to its size.
+    # Pass `components` when split_components(data) is already at hand.
+    rng = rng or random.Random()
+    if workers == 1:
+        return _run_solver(solver, data, rng, progress)
+    if components is None:
+        components = split_components(data)
+    concurrency = parallel_concurrency(workers, components)
+    if concurrency == 1:
+        return _run_solver(solver, data, rng, progress)
+
+    tasks = []
+    for course_ids in components:
+        share = min(1.0, concurrency * len(course_ids) / len(data.course_ids))
+        tasks.append((data.subset(course_ids), rng.getrandbits(64), solver.scaled(share) if solver else None))
+    schedule = Schedule()
+    courses_done = 0
+    # Workers only run the pure in-memory solver, but django.setup() keeps
+    # them importable under the spawn start method as well as fork.
+    with ProcessPoolExecutor(max_workers=concurrency, initializer=django.setup) as executor:
+        futures = {executor.submit(_solve_component, task): len(task[0].course_ids) for task in tasks}
+        for future in as_completed(futures):
+            schedule.merge(future.result())
+            courses_done += futures[future]
+            if progress:
+                schedule.report(progress, courses_done, len(data.course_ids))
+    return schedule
+
+
+# Solved schedules are cached under (input fingerprint, seed, solver settings),
+# so a seeded run on unchanged data is answered without solving again.
+SCHEDULE_KEY = 'timetable:schedule:{}'
+
+
+def schedule_cache_key(data, seed, solver_settings):
+    content = json.dumps([data.fingerprint(), seed, solver_settings], sort_keys=True)
+    return SCHEDULE_KEY.format(hashlib.sha256(content.encode()).hexdigest())
+
+
+def get_cached_schedule(key):
+    value = cache.get(key)
+    return Schedule.from_cache(value) if value is not None else None
+
+
+def store_schedule(key, schedule):
+    cache.set(key, schedule.to_cache(), timeout=getattr(settings, 'TIMETABLE_SCHEDULE_CACHE_TIMEOUT', 86400))
+
+
+def write_assignments(assignments, batch_size=None, ids=None):
+    # bulk_create (course_id, day_id, period_id, subject_id, staff_id) tuples
+    # from any iterable, building at most `batch_size` model instances at a
+    # time (default: settings.TIMETABLE_GENERATION_BATCH_SIZE). The new
+    # primary keys are appended to `ids` when given (PostgreSQL and SQLite
+    # return them from bulk inserts).
+    batch_size = batch_size or getattr(settings, 'TIMETABLE_GENERATION_BATCH_SIZE', 2000)
+    written, batch = 0, []
+
+    def insert(batch):
+        Timetable.objects.bulk_create(batch)
+        if ids is not None:
+            ids.extend(entry.pk for entry in batch)
+        return len(batch)
+
+    for course_id, day_id, period_id, subject_id, staff_id in assignments:
+        batch.append(Timetable(course_id=course_id, day_id=day_id, period_id=period_id, subject_id=subject_id, staff_id=staff_id))
+        if len(batch) >= batch_size:
+            written += insert(batch)
+            batch = []
+    if batch:
+        written += insert(batch)
+    return written
+
+
+def persist(schedule, batch_size=None):
+    # Write the whole run in one transaction
+    with transaction.atomic():
+        return write_assignments(schedule.assignments, batch_size)
@@ -1,5 +1,6 @@
+from django.db.models import Prefetch
 from rest_framework import serializers
-from .models import Course, Subject, Staff, Day, Period, Timetable
+from .models import Course, Subject, Staff, Day, Period, Timetable, GenerationJob
 
 class CourseSerializer(serializers.ModelSerializer):
     class Meta:
@@ -16,6 +17,11 @@ class SubjectSerializer(serializers.ModelSerializer):
         model = Subject
         fields = ['id', 'name', 'is_active', 'is_deleted', 'course', 'course_id']
 
+    @staticmethod
+    def setup_eager_loading(queryset):
+        # Fetch the nested course in the same query
+        return queryset.select_related('course')
+
 
 class StaffSerializer(serializers.ModelSerializer):
     # Use SubjectSerializer for read operations to get full subject details
@@ -32,6 +38,44 @@ class StaffSerializer(serializers.ModelSerializer):
         model = Staff
         fields = ['id', 'name', 'subjects', 'subject_ids', 'is_active', 'is_deleted']
 
+    @staticmethod
+    def setup_eager_loading(queryset):
+        # One extra query for all subjects (with their courses) of every staff member
+        return queryset.prefetch_related(
+            Prefetch('subjects', queryset=SubjectSerializer.setup_eager_loading(Subject.objects.all()))
+        )
+
+class SubjectBulkSerializer(serializers.ModelSerializer):
+    # Write-side serializer for bulk requests: course_id is checked against
+    # ids preloaded into context['course_ids'] instead of one query per row
+    course_id = serializers.IntegerField()
+
+    class Meta:
+        model = Subject
+        fields = ['id', 'name', 'is_active', 'is_deleted', 'course_id']
+
+    def validate_course_id(self, value):
+        if value not in self.context['course_ids']:
+            raise serializers.ValidationError(f'Invalid pk "{value}" - object does not exist.')
+        return value
+
+
+class StaffBulkSerializer(serializers.ModelSerializer):
+    # Write-side serializer for bulk requests: subject_ids are checked against
+    # ids preloaded into context['subject_ids'] instead of one query per id
+    subject_ids = serializers.ListField(child=serializers.IntegerField(), required=True)
+
+    class Meta:
+        model = Staff
+        fields = ['id', 'name', 'subject_ids', 'is_active', 'is_deleted']
+
+    def validate_subject_ids(self, value):
+        missing = [pk for pk in value if pk not in self.context['subject_ids']]
+        if missing:
+            raise serializers.ValidationError(f'Invalid pk "{missing[0]}" - object does not exist.')
+        return list(dict.fromkeys(value))
+
+
 class DaySerializer(serializers.ModelSerializer):
     class Meta:
         model = Day
@@ -50,6 +94,10 @@ class PeriodSerializer(serializers.ModelSerializer):
         if start_time >= end_time:
             raise serializers.ValidationError("The start time must be earlier than the end time.")
 
+        # Bulk ingest checks overlaps for the whole batch in memory instead
+        if not self.context.get('check_overlaps', True):
+            return data
+
         # Check if the new period overlaps with any existing periods (that are not marked as deleted)
         overlapping_periods = Period.objects.filter(
             start_time__lt=end_time,  # Starts before this period ends
@@ -68,13 +116,36 @@ class PeriodSerializer(serializers.ModelSerializer):
         return data
 
     
+class TimetableStaffSerializer(serializers.ModelSerializer):
+    # Staff as shown on a timetable entry, without the subject list
+    class Meta:
+        model = Staff
+        fields = ['id', 'name']
+
+
 class TimetableSerializer(serializers.ModelSerializer):
     course = CourseSerializer()
     day = DaySerializer(read_only=True)
     period = PeriodSerializer(read_only=True)
     subject = SubjectSerializer(read_only=True)
+    staff = TimetableStaffSerializer(read_only=True)
 
     class Meta:
         model = Timetable
-        fields = ['id','course','day','period','subject','is_active','is_deleted']
+        fields = ['id','course','day','period','subject','staff','is_active','is_deleted']
+
+    @staticmethod
+    def setup_eager_loading(queryset):
+        # Every nested object comes from a single joined query
+        return queryset.select_related('course', 'day', 'period', 'subject__course', 'staff')
 
+
+class GenerationJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = GenerationJob
+        fields = [
+            'id', 'status', 'workers', 'solver', 'time_budget', 'max_daily_load', 'seed', 'cached',
+            'courses_total', 'courses_done', 'slots_filled', 'slots_unfilled',
+            'entries_created', 'score', 'iterations', 'error', 'created_at', 'started_at', 'finished_at', 'updated_at',
+        ]
+        read_only_fields = fields
@@ -0,0 +1,168 @@
+import json
+from itertools import groupby
+from operator import attrgetter
+
+from django.db import transaction
+from django.db.models import F, Q
+from django.db.models.signals import post_save, pre_delete
+from rest_framework.utils.encoders import JSONEncoder
+
+from .cache import bump_model_version
+from .models import Course, CourseTimetableSnapshot, Day, Period, Staff, Subject, Timetable
+from .serializers import TimetableSerializer
+
+# Materialized read model for the timetable list. Each course keeps its live
+# entries, serialized exactly as TimetableSerializer renders them, as one JSON
+# fragment in CourseTimetableSnapshot; the list endpoint joins the fragments
+# instead of loading and serializing every entry.
+#
+# Every path that writes timetable rows rebuilds the snapshots it touched in
+# the same transaction (generation, regeneration, clearing, edits through the
+# API or the admin), or marks them stale to be rebuilt on the next read
+# (moves and swaps). Entries embed their course, subject, staff, day and
+# period, so a write to one of those rows bumps the version of just the
+# snapshots whose entries reference it (signals, and the bulk endpoints
+# through reference_changed()); reads rebuild only those. Writes that bypass
+# these paths (the shell, raw SQL) should call rebuild_course_snapshots().
+# Timetable writes also bump the Timetable cache version once the
+# transaction commits, for reports cached on timetable contents.
+#
+# Snapshot writers lock the rows they touch in course order, so they never
+# deadlock, and a rebuild reads the versions under that lock before it reads
+# any entry: a write that lands meanwhile leaves the snapshot stale, never
+# wrongly current.
+
+# Timetable relations through which each model is embedded in a snapshot
+EMBEDDED_MODELS = {
+    Course: ('course', 'subject__course'),
+    Subject: ('subject',),
+    Staff: ('staff',),
+    Day: ('day',),
+    Period: ('period',),
+}
+
+
+def _lock(rows):
+    # {course_id: version} of the snapshot rows in `rows`, locked in order
+    return dict(rows.select_for_update().order_by('course_id').values_list('course_id', 'version'))
+
+
+def _fragment(rows):
+    # Same encoding as DRF's JSONRenderer, without the enclosing brackets
+    return json.dumps(rows, cls=JSONEncoder, ensure_ascii=False, separators=(',', ':'))[1:-1]
+
+
+def _course_fragments(ids, entries, chunk_size):
+    # (course_id, fragment) for every id in `ids` (sorted), from `entries`
+    # ordered by course, one course in memory at a time
+    serializer = TimetableSerializer()  # one instance, so its fields are built once
+    groups = groupby(entries.iterator(chunk_size=chunk_size), key=attrgetter('course_id'))
+    group = next(groups, None)
+    for course_id in ids:
+        rows = []
+        if group is not None and group[0] == course_id:
+            rows = [serializer.to_representation(entry) for entry in group[1]]
+            group = next(groups, None)
+        yield course_id, _fragment(rows)
+
+
+def rebuild_course_snapshots(course_ids=None, chunk_size=2000, batch_size=500):
+    # Re-serialize the live entries of `course_ids` (every course when None)
+    # and replace their snapshots atomically, writing `batch_size` snapshots
+    # per upsert. Returns the number of snapshots written.
+    courses = Course.objects.all()
+    rows = CourseTimetableSnapshot.objects.all()
+    entries = Timetable.objects.live()
+    if course_ids is not None:
+        courses = courses.filter(id__in=course_ids)
+        rows = rows.filter(course_id__in=course_ids)
+        entries = entries.filter(course_id__in=course_ids)
+
+    with transaction.atomic():
+        ids = list(courses.order_by('id').values_list('id', flat=True))
+        versions = _lock(rows)
+        missing = [course_id for course_id in ids if course_id not in versions]
+        for start in range(0, len(missing), batch_size):
+            CourseTimetableSnapshot.objects.bulk_create(
+                [CourseTimetableSnapshot(course_id=course_id) for course_id in missing[start:start + batch_size]],
+                ignore_conflicts=True,
+            )
+        versions.update(dict.fromkeys(missing, 0))
+
+        entries = TimetableSerializer.setup_eager_loading(entries).order_by('course_id', 'id')
+        batch = []
+        for course_id, fragment in _course_fragments(ids, entries, chunk_size):
+            batch.append(CourseTimetableSnapshot(course_id=course_id, built_version=versions[course_id], payload=fragment))
+            if len(batch) >= batch_size:
+                _upsert(batch)
+                batch = []
+        _upsert(batch)
+        transaction.on_commit(lambda: bump_model_version(Timetable))
+    return len(ids)
+
+
+def _upsert(snapshots):
+    CourseTimetableSnapshot.objects.bulk_create(
+        snapshots, update_conflicts=True, unique_fields=['course'], update_fields=['built_version', 'payload', 'updated_at'],
+    )
+
+
+def mark_snapshots_stale(course_ids=None):
+    # Bump the versions of the snapshots of `course_ids` (every course when
+    # None; a list or a values() subquery) in the caller's transaction, so the
+    # next read rebuilds them
+    rows = CourseTimetableSnapshot.objects.all()
+    if course_ids is not None:
+        rows = rows.filter(course_id__in=course_ids)
+    with transaction.atomic(savepoint=False):
+        _lock(rows)
+        rows.update(version=F('version') + 1)
+
+
+def invalidate_course_snapshots(course_ids):
+    # Mark the snapshots of `course_ids` stale after their entries changed.
+    # For latency-sensitive writes that should not pay for re-serializing.
+    mark_snapshots_stale(course_ids)
+    transaction.on_commit(lambda: bump_model_version(Timetable))
+
+
+def reference_changed(model, pks=None):
+    # Mark stale the snapshots whose live entries embed rows `pks` of `model`
+    # (one of EMBEDDED_MODELS; every snapshot when None). Call in the
+    # transaction of writes that bypass signals (queryset.update, ...).
+    if pks is None:
+        return mark_snapshots_stale()
+    embedding = Q()
+    for path in EMBEDDED_MODELS[model]:
+        embedding |= Q(**{f'{path}__in': pks})
+    mark_snapshots_stale(Timetable.objects.live().filter(embedding).values('course_id'))
+
+
+def _saved(sender, instance, created, raw=False, **kwargs):
+    # New rows are not embedded anywhere yet
+    if not created and not raw:
+        reference_changed(sender, [instance.pk])
+
+
+def _deleting(sender, instance, **kwargs):
+    # Before the delete, while cascaded entries still point at the row
+    reference_changed(sender, [instance.pk])
+
+
+def connect_snapshot_invalidation():
+    for model in EMBEDDED_MODELS:
+        post_save.connect(_saved, sender=model, dispatch_uid=f'timetable-snapshot-save-{model._meta.label_lower}')
+        pre_delete.connect(_deleting, sender=model, dispatch_uid=f'timetable-snapshot-delete-{model._meta.label_lower}')
+
+
+def timetable_list_json():
+    # The full timetable list as a JSON array, grouped by course. One query
+    # when every snapshot is current; missing or stale ones are rebuilt first.
+    snapshots = Course.objects.order_by('id').values_list(
+        'id', 'timetable_snapshot__version', 'timetable_snapshot__built_version', 'timetable_snapshot__payload')
+    rows = list(snapshots)
+    stale = [course_id for course_id, version, built, _ in rows if built is None or built != version]
+    if stale:
+        rebuild_course_snapshots(None if len(stale) == len(rows) else stale)
+        rows = list(snapshots.all())
+    return '[' + ','.join(payload for _, _, _, payload in rows if payload) + ']'
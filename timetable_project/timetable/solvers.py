@@ -0,0 +1,338 @@
+import math
+import random
+import time
+from collections import Counter
+
+from django.conf import settings
+
+from .availability import AvailabilityMatrix
+from .scheduler import Schedule, solve
+
+# Pluggable solver backends for timetable generation.
+#
+# Every backend takes a SchedulingData and returns a Schedule carrying a
+# `score` and an `iteration` count. The score is a penalty, so lower is
+# better and 0 is perfect:
+#
+#   UNFILLED_WEIGHT  per slot left without a subject
+#   OVERLOAD_WEIGHT  per lesson above `max_daily_load` for a staff member on one day
+#   BALANCE_WEIGHT   per unit of squared deviation from an even subject spread
+#                    within a course (0 when counts differ by at most one)
+#
+# GreedySolver is the original single pass. AnnealingSolver starts from it
+# and improves it by simulated annealing within a wall-clock budget, always
+# keeping the best schedule seen, so stopping at any time yields a result at
+# least as good as the greedy one.
+
+UNFILLED_WEIGHT = 1000
+OVERLOAD_WEIGHT = 10
+BALANCE_WEIGHT = 1
+
+
+def balance_floor(filled, subjects):
+    # Smallest possible sum of squared subject counts for `filled` lessons
+    # spread over `subjects` subjects
+    q, r = divmod(filled, subjects)
+    return r * (q + 1) ** 2 + (subjects - r) * q * q
+
+
+class Objective:
+    def __init__(self, max_daily_load=None):
+        self.max_daily_load = max_daily_load
+
+    def evaluate(self, data, schedule):
+        # Score a finished schedule from scratch: {'unfilled', 'imbalance', 'overload', 'score'}
+        subject_counts = Counter()
+        filled = Counter()
+        loads = Counter()
+        for course_id, day_id, _, subject_id, staff_id in schedule.assignments:
+            subject_counts[course_id, subject_id] += 1
+            filled[course_id] += 1
+            loads[staff_id, day_id] += 1
+
+        imbalance = 0
+        for course_id, subjects in data.course_subjects.items():
+            if subjects and course_id in data.course_names:
+                squares = sum(subject_counts[course_id, subject_id] ** 2 for subject_id in subjects)
+                imbalance += squares - balance_floor(filled[course_id], len(subjects))
+        overload = 0
+        if self.max_daily_load is not None:
+            overload = sum(max(0, load - self.max_daily_load) for load in loads.values())
+
+        unfilled = len(schedule.unfilled)
+        return {
+            'unfilled': unfilled,
+            'imbalance': imbalance,
+            'overload': overload,
+            'score': UNFILLED_WEIGHT * unfilled + BALANCE_WEIGHT * imbalance + OVERLOAD_WEIGHT * overload,
+        }
+
+
+class GreedySolver:
+    name = 'greedy'
+
+    def __init__(self, max_daily_load=None):
+        self.objective = Objective(max_daily_load)
+
+    def scaled(self, share):
+        return self
+
+    def settings(self):
+        return {'solver': self.name, 'max_daily_load': self.objective.max_daily_load}
+
+    def solve(self, data, rng=None, progress=None):
+        schedule = solve(data, rng=rng, progress=progress)
+        schedule.solver = self.name
+        schedule.score = self.objective.evaluate(data, schedule)['score']
+        schedule.iterations = 1
+        return schedule
+
+
+class _SearchState:
+    # Mutable schedule for local search with O(1) incremental scoring.
+    # Slots are indexed day-major: index = day_position * periods + period_position.
+
+    def __init__(self, data, objective):
+        self.data = data
+        self.cap = objective.max_daily_load
+        self.periods = len(data.period_ids)
+        self.size = len(data.day_ids) * self.periods
+        self.grid = {
+            course_id: [None] * self.size
+            for course_id in data.course_ids if data.course_subjects.get(course_id)
+        }
+        self.occupant = {}       # {(staff_id, slot): course_id}
+        self.counts = Counter()  # {(course_id, subject_id): lessons}
+        self.squares = Counter() # {course_id: sum of squared subject counts}
+        self.filled = Counter()  # {course_id: filled slots}
+        self.load = Counter()    # {(staff_id, day_position): lessons}
+        self.cost = sum(self._course_cost(course_id) for course_id in self.grid)
+
+    def _course_cost(self, course_id):
+        filled = self.filled[course_id]
+        imbalance = self.squares[course_id] - balance_floor(filled, len(self.data.course_subjects[course_id]))
+        return UNFILLED_WEIGHT * (self.size - filled) + BALANCE_WEIGHT * imbalance
+
+    def _overload(self, staff_id, day):
+        if self.cap is None:
+            return 0
+        return OVERLOAD_WEIGHT * max(0, self.load[staff_id, day] - self.cap)
+
+    def place(self, course_id, slot, subject_id, staff_id):
+        day = slot // self.periods
+        before = self._course_cost(course_id) + self._overload(staff_id, day)
+        self.grid[course_id][slot] = (subject_id, staff_id)
+        self.occupant[staff_id, slot] = course_id
+        count = self.counts[course_id, subject_id]
+        self.counts[course_id, subject_id] = count + 1
+        self.squares[course_id] += 2 * count + 1
+        self.filled[course_id] += 1
+        self.load[staff_id, day] += 1
+        delta = self._course_cost(course_id) + self._overload(staff_id, day) - before
+        self.cost += delta
+        return delta
+
+    def remove(self, course_id, slot):
+        subject_id, staff_id = entry = self.grid[course_id][slot]
+        day = slot // self.periods
+        before = self._course_cost(course_id) + self._overload(staff_id, day)
+        self.grid[course_id][slot] = None
+        del self.occupant[staff_id, slot]
+        count = self.counts[course_id, subject_id]
+        self.counts[course_id, subject_id] = count - 1
+        self.squares[course_id] -= 2 * count - 1
+        self.filled[course_id] -= 1
+        self.load[staff_id, day] -= 1
+        delta = self._course_cost(course_id) + self._overload(staff_id, day) - before
+        self.cost += delta
+        return entry
+
+    def snapshot(self):
+        return {course_id: list(slots) for course_id, slots in self.grid.items()}
+
+    # Moves return an undo callable, or None when the move is not applicable.
+
+    def reassign(self, rng, course_id):
+        # Give one slot a random subject and staff member; if that staff member
+        # teaches another course at that time, the other slot is emptied.
+        slots = self.grid[course_id]
+        if self.filled[course_id] < self.size and rng.random() < 0.5:
+            slot = rng.choice([i for i, entry in enumerate(slots) if entry is None])
+        else:
+            slot = rng.randrange(self.size)
+        subject_id = rng.choice(self.data.course_subjects[course_id])
+        staff = self.data.subject_staff.get(subject_id)
+        if not staff:
+            return None
+        staff_id = rng.choice(staff)
+        if slots[slot] == (subject_id, staff_id):
+            return None
+
+        restore = []
+        if slots[slot] is not None:
+            restore.append((course_id, slot, self.remove(course_id, slot)))
+        holder = self.occupant.get((staff_id, slot))
+        if holder is not None:
+            restore.append((holder, slot, self.remove(holder, slot)))
+        self.place(course_id, slot, subject_id, staff_id)
+
+        def undo():
+            self.remove(course_id, slot)
+            for other, other_slot, (other_subject, other_staff) in reversed(restore):
+                self.place(other, other_slot, other_subject, other_staff)
+        return undo
+
+    def swap(self, rng, course_id):
+        # Exchange the lessons of two slots of one course
+        first, second = rng.randrange(self.size), rng.randrange(self.size)
+        slots = self.grid[course_id]
+        a, b = slots[first], slots[second]
+        if first == second or a == b:
+            return None
+        if a is not None:
+            self.remove(course_id, first)
+        if b is not None:
+            self.remove(course_id, second)
+        if (a is not None and (a[1], second) in self.occupant) or (b is not None and (b[1], first) in self.occupant):
+            if a is not None:
+                self.place(course_id, first, *a)
+            if b is not None:
+                self.place(course_id, second, *b)
+            return None
+        if a is not None:
+            self.place(course_id, second, *a)
+        if b is not None:
+            self.place(course_id, first, *b)
+
+        def undo():
+            if a is not None:
+                self.remove(course_id, second)
+            if b is not None:
+                self.remove(course_id, first)
+            if a is not None:
+                self.place(course_id, first, *a)
+            if b is not None:
+                self.place(course_id, second, *b)
+        return undo
+
+
+class AnnealingSolver:
+    name = 'anneal'
+
+    def __init__(self, time_budget=None, max_iterations=None, max_daily_load=None,
+                 start_temperature=20.0, end_temperature=0.05):
+        # Runs until `time_budget` seconds or `max_iterations` moves, whichever
+        # comes first, or until the score reaches 0. With only
+        # `max_iterations` the result depends on the seed alone.
+        if time_budget is None and max_iterations is None:
+            time_budget = getattr(settings, 'TIMETABLE_SOLVER_TIME_BUDGET', 5.0)
+        self.time_budget = time_budget
+        self.max_iterations = max_iterations
+        self.objective = Objective(max_daily_load)
+        self.start_temperature = start_temperature
+        self.end_temperature = end_temperature
+
+    def scaled(self, share):
+        # Copy for one of several independent sub-problems solved side by side
+        return AnnealingSolver(
+            time_budget=self.time_budget * share if self.time_budget is not None else None,
+            max_iterations=max(1, int(self.max_iterations * share)) if self.max_iterations is not None else None,
+            max_daily_load=self.objective.max_daily_load,
+            start_temperature=self.start_temperature,
+            end_temperature=self.end_temperature,
+        )
+
+    def settings(self):
+        return {
+            'solver': self.name,
+            'time_budget': self.time_budget,
+            'max_iterations': self.max_iterations,
+            'max_daily_load': self.objective.max_daily_load,
+        }
+
+    def _elapsed_fraction(self, started, iterations):
+        fraction = 0.0
+        if self.time_budget is not None:
+            fraction = (time.perf_counter() - started) / self.time_budget if self.time_budget > 0 else 1.0
+        if self.max_iterations is not None:
+            fraction = max(fraction, iterations / self.max_iterations)
+        return fraction
+
+    def solve(self, data, rng=None, progress=None):
+        rng = rng or random.Random()
+        started = time.perf_counter()
+        initial = solve(data, rng=rng, progress=progress)
+
+        state = _SearchState(data, self.objective)
+        day_positions = {day_id: i for i, day_id in enumerate(data.day_ids)}
+        period_positions = {period_id: i for i, period_id in enumerate(data.period_ids)}
+        for course_id, day_id, period_id, subject_id, staff_id in initial.assignments:
+            slot = day_positions[day_id] * state.periods + period_positions[period_id]
+            state.place(course_id, slot, subject_id, staff_id)
+        best_cost, best_grid = state.cost, state.snapshot()
+
+        courses = list(state.grid)
+        iterations = 0
+        temperature = self.start_temperature
+        while courses and best_cost > 0:
+            if iterations % 256 == 0:
+                fraction = self._elapsed_fraction(started, iterations)
+                if fraction >= 1:
+                    break
+                temperature = self.start_temperature * (self.end_temperature / self.start_temperature) ** fraction
+            iterations += 1
+
+            course_id = rng.choice(courses)
+            before = state.cost
+            undo = state.reassign(rng, course_id) if rng.random() < 0.7 else state.swap(rng, course_id)
+            if undo is None:
+                continue
+            delta = state.cost - before
+            if delta <= 0 or rng.random() < math.exp(-delta / temperature):
+                if state.cost < best_cost:
+                    best_cost, best_grid = state.cost, state.snapshot()
+            else:
+                undo()
+
+        schedule = self._schedule(data, best_grid, initial.skipped_courses)
+        schedule.score = best_cost
+        schedule.iterations = iterations
+        if progress:
+            schedule.report(progress, len(data.course_ids), len(data.course_ids))
+        return schedule
+
+    def _schedule(self, data, grid, skipped_courses):
+        schedule = Schedule()
+        schedule.solver = self.name
+        schedule.skipped_courses = list(skipped_courses)
+        availability = AvailabilityMatrix(data.day_ids, data.period_ids)
+        periods = len(data.period_ids)
+        for course_id, slots in grid.items():
+            for slot, entry in enumerate(slots):
+                day_id, period_id = data.day_ids[slot // periods], data.period_ids[slot % periods]
+                if entry is None:
+                    schedule.unfilled.append((course_id, day_id, period_id))
+                else:
+                    subject_id, staff_id = entry
+                    availability.book(staff_id, day_id, period_id)
+                    schedule.assignments.append((course_id, day_id, period_id, subject_id, staff_id))
+        schedule.availability = availability
+        return schedule
+
+
+SOLVERS = {
+    GreedySolver.name: GreedySolver,
+    AnnealingSolver.name: AnnealingSolver,
+}
+
+
+def make_solver(name=None, time_budget=None, max_iterations=None, max_daily_load=None):
+    # Build a solver from request/command options, falling back to settings
+    name = name or getattr(settings, 'TIMETABLE_SOLVER', GreedySolver.name)
+    if max_daily_load is None:
+        max_daily_load = getattr(settings, 'TIMETABLE_MAX_DAILY_LOAD', None)
+    if name == GreedySolver.name:
+        return GreedySolver(max_daily_load=max_daily_load)
+    if name == AnnealingSolver.name:
+        return AnnealingSolver(time_budget=time_budget, max_iterations=max_iterations, max_daily_load=max_daily_load)
+    raise ValueError(f"Unknown solver {name!r}. Use one of: {', '.join(SOLVERS)}")
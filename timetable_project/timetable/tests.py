@@ -1,3 +1,926 @@
-from django.test import TestCase
+import io
+import json
+import os
+import random
+import tempfile
+import time as clock
+from datetime import time, timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .availability import AvailabilityMatrix
+from .cache import model_versions
+from .jobs import JobHeartbeat, expire_stale_jobs, run_generation_job, start_generation_job
+from .metrics import registry
+from .models import Course, CourseTimetableSnapshot, Subject, Staff, Day, Period, Timetable, GenerationJob
+from .serializers import TimetableSerializer
+from .scheduler import load_scheduling_data, parallel_concurrency, schedule_cache_key, split_components, solve_parallel
+from .solvers import AnnealingSolver, GreedySolver, Objective
+from .tracing import GenerationTrace
+from .utils import generate_timetables_for_all_courses, regenerate_timetables
+
+
+def seed_school(courses=2, subjects_per_course=3, periods=3, shared_staff=False):
+    days = [Day.objects.create(name=name) for name, _ in Day.DAY_CHOICES]
+    period_objs = [
+        Period.objects.create(start_time=time(8 + i), end_time=time(8 + i, 50))
+        for i in range(periods)
+    ]
+    course_objs = []
+    shared = Staff.objects.create(name='Shared') if shared_staff else None
+    for c in range(courses):
+        course = Course.objects.create(name=f'Course {c}')
+        course_objs.append(course)
+        for s in range(subjects_per_course):
+            subject = Subject.objects.create(name=f'Subject {c}.{s}', course=course)
+            staff = shared or Staff.objects.create(name=f'Staff {c}.{s}')
+            staff.subjects.add(subject)
+    return course_objs, days, period_objs
+
+
+def seed_school_more():
+    # Add rows to every table after seed_school() so list sizes grow
+    Period.objects.create(start_time=time(18), end_time=time(18, 50))
+    for c in range(2):
+        course = Course.objects.create(name=f'Added {c}')
+        for s in range(2):
+            subject = Subject.objects.create(name=f'Added {c}.{s}', course=course)
+            Staff.objects.create(name=f'Added {c}.{s}').subjects.add(subject)
+    Timetable.objects.all().delete()
+    generate_timetables_for_all_courses()
+
+
+class GenerateTimetablesTests(TestCase):
+    def test_fills_every_slot(self):
+        courses, days, periods = seed_school()
+        created = generate_timetables_for_all_courses()
+        self.assertEqual(created, len(courses) * len(days) * len(periods))
+        self.assertEqual(Timetable.objects.count(), created)
+
+    def test_query_count_does_not_grow_with_courses(self):
+        seed_school(courses=2)
+        with self.assertNumQueries(17):
+            generate_timetables_for_all_courses()
+
+        Timetable.objects.all().delete()
+        Course.objects.create(name='Extra')
+        for c in range(3):
+            course = Course.objects.create(name=f'More {c}')
+            subject = Subject.objects.create(name=f'More subject {c}', course=course)
+            Staff.objects.create(name=f'More staff {c}').subjects.add(subject)
+        with self.assertNumQueries(17):
+            generate_timetables_for_all_courses()
+
+    def test_shared_staff_is_never_double_booked(self):
+        seed_school(courses=2, shared_staff=True)
+        generate_timetables_for_all_courses()
+        # A single teacher can cover only one course per slot.
+        slots = Timetable.objects.values_list('day_id', 'period_id')
+        self.assertEqual(len(slots), len(set(slots)))
+
+
+    def test_logs_structured_summary_and_quiet_mode_skips_items(self):
+        seed_school(courses=2, shared_staff=True)
+        with self.assertLogs('timetable.generator', 'INFO') as logs:
+            generate_timetables_for_all_courses()
+        unfilled = [r for r in logs.records if r.event == 'generate.unfilled_slots']
+        summary = logs.records[-1]
+        self.assertTrue(unfilled)
+        self.assertEqual(summary.event, 'generate.summary')
+        self.assertEqual(summary.counters['unfilled_slots'], len(unfilled))
+        self.assertEqual(set(summary.phases_ms), {'load', 'solve', 'persist'})
+
+        Timetable.objects.all().delete()
+        with self.assertLogs('timetable.generator', 'INFO') as logs:
+            generate_timetables_for_all_courses(quiet=True)
+        self.assertEqual([r.event for r in logs.records], ['generate.summary'])
+        self.assertEqual(logs.records[0].counters['unfilled_slots'], len(unfilled))
+
+class SolverTests(TestCase):
+    def seed_greedy_trap(self):
+        # Greedy gives course A's teacher X every slot, leaving course B (which
+        # only X can teach) empty, although Y could take all of A's lessons.
+        days, periods = seed_school(courses=0, periods=2)[1:]
+        x, y = Staff.objects.create(name='X'), Staff.objects.create(name='Y')
+        a = Subject.objects.create(name='A1', course=Course.objects.create(name='A'))
+        b = Subject.objects.create(name='B1', course=Course.objects.create(name='B'))
+        x.subjects.add(a, b)
+        y.subjects.add(a)
+        return len(days) * len(periods)
+
+    def test_annealing_fills_slots_greedy_misses(self):
+        slots = self.seed_greedy_trap()
+        data = load_scheduling_data()
+        greedy = GreedySolver().solve(data, rng=random.Random(1))
+        self.assertEqual(len(greedy.unfilled), slots)
+
+        schedule = AnnealingSolver(max_iterations=20000).solve(data, rng=random.Random(1))
+        self.assertEqual(schedule.score, 0)
+        self.assertEqual(schedule.unfilled, [])
+        self.assertEqual(Objective().evaluate(data, schedule)['score'], 0)
+        self.assertLess(schedule.iterations, 20000)  # stopped at the perfect score
+        staff_slots = [(staff, day, period) for _, day, period, _, staff in schedule.assignments]
+        self.assertEqual(len(staff_slots), len(set(staff_slots)))
+
+    def test_daily_load_cap_and_balance(self):
+        seed_school(courses=1, subjects_per_course=2, periods=4)
+        extra = Staff.objects.create(name='Extra')
+        extra.subjects.add(*Subject.objects.all())
+        data = load_scheduling_data()
+
+        schedule = AnnealingSolver(max_iterations=20000, max_daily_load=1).solve(data, rng=random.Random(3))
+        breakdown = Objective(max_daily_load=1).evaluate(data, schedule)
+        self.assertEqual(breakdown['score'], schedule.score)
+        self.assertEqual((breakdown['unfilled'], breakdown['imbalance']), (0, 0))
+        # 4 lessons a day across 3 teachers: at least one extra lesson per day
+        self.assertEqual(breakdown['overload'], len(data.day_ids))
+
+    def test_generation_job_records_solver_score(self):
+        self.seed_greedy_trap()
+        job = GenerationJob.objects.create(solver='anneal', time_budget=5)
+        run_generation_job(job.pk)
+        job.refresh_from_db()
+        self.assertEqual(job.status, GenerationJob.STATUS_SUCCEEDED)
+        self.assertEqual(job.score, 0)
+        self.assertGreater(job.iterations, 0)
+        self.assertEqual(job.slots_unfilled, 0)
+
+
+class SeededGenerationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        seed_school(courses=3, shared_staff=True)
+
+    def entries(self):
+        return sorted(Timetable.objects.values_list('course_id', 'day_id', 'period_id', 'subject_id'))
+
+    def test_same_seed_reproduces_and_reuses_the_schedule(self):
+        generate_timetables_for_all_courses(seed=7)
+        first = self.entries()
+
+        Timetable.objects.all().delete()
+        trace = GenerationTrace('generate', quiet=True)
+        generate_timetables_for_all_courses(seed=7, trace=trace)
+        self.assertEqual(trace.counters['cache_hits'], 1)
+        self.assertNotIn('solve', trace.phases)
+        self.assertEqual(self.entries(), first)
+
+        # Same seed without the cache still gives the same schedule
+        cache.clear()
+        Timetable.objects.all().delete()
+        generate_timetables_for_all_courses(seed=7)
+        self.assertEqual(self.entries(), first)
+
+    def test_input_changes_and_solver_settings_change_the_key(self):
+        data = load_scheduling_data()
+        key = schedule_cache_key(data, 7, GreedySolver().settings())
+        self.assertNotEqual(key, schedule_cache_key(data, 8, GreedySolver().settings()))
+        self.assertNotEqual(key, schedule_cache_key(data, 7, GreedySolver(max_daily_load=2).settings()))
+
+        Course.objects.filter(name='Course 0').update(name='Renamed')
+        self.assertEqual(key, schedule_cache_key(load_scheduling_data(), 7, GreedySolver().settings()))
+        Subject.objects.filter(name='Subject 0.0').update(is_active=False)
+        self.assertNotEqual(key, schedule_cache_key(load_scheduling_data(), 7, GreedySolver().settings()))
+
+
+class StaffAssignmentTests(TestCase):
+    def setUp(self):
+        self.courses, self.days, _ = seed_school(courses=2, shared_staff=True)
+        self.extra = Staff.objects.create(name='Extra')
+        self.extra.subjects.add(*Subject.objects.filter(course=self.courses[1]))
+        generate_timetables_for_all_courses()
+
+    def test_generator_records_staff_and_db_rejects_clashes(self):
+        self.assertFalse(Timetable.objects.filter(staff__isnull=True).exists())
+        slots = list(Timetable.objects.values_list('staff_id', 'day_id', 'period_id'))
+        self.assertEqual(len(slots), len(set(slots)))
+
+        clash = Timetable.objects.filter(staff=self.extra).first()
+        other = Timetable.objects.exclude(staff=self.extra).get(day=clash.day, period=clash.period)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Timetable.objects.filter(pk=other.pk).update(staff=self.extra)
+        # Soft-deleted lessons don't block the slot
+        Timetable.objects.filter(pk=clash.pk).update(is_deleted=True)
+        Timetable.objects.filter(pk=other.pk).update(staff=self.extra)
+
+    def test_staff_timetable_endpoint(self):
+        member = Staff.objects.get(name='Shared')
+        url = reverse('staff-timetable', args=[member.pk])
+        with self.assertNumQueries(1):
+            rows = self.client.get(url).json()
+        self.assertEqual(len(rows), Timetable.objects.filter(staff=member).count())
+        self.assertTrue(all(row['staff']['id'] == member.pk for row in rows))
+
+        monday = self.client.get(url + '?day=monday').json()
+        self.assertEqual({row['day']['name'] for row in monday}, {'Monday'})
+        self.assertEqual(self.client.get(reverse('staff-timetable', args=[0])).status_code, 404)
+
+    def test_incremental_regeneration_keeps_recorded_staff(self):
+        before = dict(Timetable.objects.values_list('id', 'staff_id'))
+        summary = regenerate_timetables()
+        self.assertEqual((summary['updated'], summary['inserted'], summary['deleted']), (0, 0, 0))
+        self.assertEqual(dict(Timetable.objects.values_list('id', 'staff_id')), before)
+
+        # The extra teacher leaves: their lessons move to the shared teacher or are recomputed
+        self.extra.subjects.clear()
+        regenerate_timetables(staff_ids=[self.extra.pk])
+        self.assertFalse(Timetable.objects.filter(staff=self.extra, is_deleted=False).exists())
+        slots = list(Timetable.objects.live().values_list('staff_id', 'day_id', 'period_id'))
+        self.assertEqual(len(slots), len(set(slots)))
+
+
+class ParallelGenerationTests(TestCase):
+    def test_courses_sharing_staff_form_one_component(self):
+        seed_school(courses=3)
+        course = Course.objects.get(name='Course 0')
+        Staff.objects.get(name='Staff 1.0').subjects.add(course.subjects.first())
+        components = split_components(load_scheduling_data())
+        self.assertEqual(sorted(len(c) for c in components), [1, 2])
+
+    def test_concurrency_counts_only_usable_workers(self):
+        seed_school(courses=4)
+        components = split_components(load_scheduling_data())
+        self.assertEqual(len(components), 4)
+        self.assertEqual([parallel_concurrency(w, components) for w in (1, 2, 8)], [1, 2, 4])
+        self.assertEqual(parallel_concurrency(8, components[:1]), 1)
+
+    def test_parallel_solve_matches_serial_coverage(self):
+        seed_school(courses=4)
+        data = load_scheduling_data()
+        schedule = solve_parallel(data, workers=2)
+        self.assertEqual(len(schedule), 4 * data.slots_per_course)
+        self.assertFalse(schedule.unfilled)
+
+
+class StreamingGenerationTests(TestCase):
+    def entries(self):
+        return set(Timetable.objects.values_list('course_id', 'day_id', 'period_id', 'subject_id', 'staff_id'))
+
+    def test_streaming_matches_in_memory_run_and_writes_in_batches(self):
+        cache.clear()
+        seed_school(courses=3, shared_staff=True)
+        generate_timetables_for_all_courses(seed=5)
+        expected = self.entries()
+        Timetable.objects.all().delete()
+
+        with CaptureQueriesContext(connection) as queries:
+            created = generate_timetables_for_all_courses(seed=5, streaming=True, batch_size=7)
+        self.assertEqual(self.entries(), expected)
+        inserts = [q for q in queries.captured_queries if q['sql'].startswith('INSERT INTO "timetable_timetable"')]
+        self.assertEqual(len(inserts), -(-created // 7))
+        self.assertEqual(CourseTimetableSnapshot.objects.count(), 3)
+
+    def test_streaming_reports_progress_between_commits_and_cleans_up_on_failure(self):
+        seed_school(courses=3)
+        depth = len(connection.savepoint_ids)  # the test case's own transactions
+        seen = []
+
+        def progress(**counters):
+            # Called with no write transaction open, after the course's rows are in
+            self.assertEqual(len(connection.savepoint_ids), depth)
+            seen.append(Timetable.objects.count())
+            if len(seen) == 1:
+                # Another writer adds an entry while the run goes on
+                other = Course.objects.create(name='Other')
+                subject = Subject.objects.create(name='Other subject', course=other)
+                Timetable.objects.create(course=other, day=Day.objects.first(), period=Period.objects.first(), subject=subject)
+            if len(seen) == 2:
+                raise RuntimeError('worker stopped')
+
+        with self.assertRaises(RuntimeError):
+            generate_timetables_for_all_courses(streaming=True, batch_size=1, progress=progress)
+        self.assertEqual(seen, [15, 31])
+        self.assertEqual(list(Timetable.objects.values_list('course__name', flat=True)), ['Other'])
+
+    @override_settings(TIMETABLE_GENERATION_STREAMING=True)
+    def test_api_rejects_streaming_with_other_solver(self):
+        seed_school(courses=1)
+        response = self.client.post(reverse('generate_timetables'), {'solver': 'anneal'}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(GenerationJob.objects.exists())
+
+    def test_streaming_rejects_other_solvers(self):
+        seed_school(courses=1)
+        with self.assertRaises(ValueError):
+            generate_timetables_for_all_courses(solver=AnnealingSolver(time_budget=1), streaming=True)
+
+    def test_command_rejects_stream_with_other_solver_before_clearing(self):
+        seed_school(courses=1)
+        created = generate_timetables_for_all_courses()
+        with self.assertRaises(CommandError):
+            call_command('generate_timetables', '--clear', '--stream', '--solver', 'anneal', stdout=io.StringIO())
+        self.assertEqual(Timetable.objects.count(), created)
+
+
+class GenerationJobTests(TestCase):
+    def test_generate_returns_job_and_reports_progress(self):
+        seed_school(courses=2)
+        response = self.client.post(reverse('generate_timetables'), {'workers': 1}, content_type='application/json')
+        self.assertEqual(response.status_code, 202)
+        job_id = response.json()['job_id']
+
+        # A second request while the first is queued is rejected.
+        response = self.client.post(reverse('generate_timetables'))
+        self.assertEqual(response.status_code, 409)
+
+        run_generation_job(job_id)
+        job = self.client.get(reverse('generation_job_detail', args=[job_id])).json()
+        self.assertEqual(job['status'], GenerationJob.STATUS_SUCCEEDED)
+        self.assertEqual(job['courses_done'], 2)
+        self.assertEqual(job['courses_total'], 2)
+        self.assertEqual(job['slots_filled'], job['entries_created'])
+        self.assertEqual(job['slots_unfilled'], 0)
+
+    @override_settings(TIMETABLE_JOB_TIMEOUT=60)
+    def test_time_budget_must_fit_in_the_job_timeout(self):
+        seed_school(courses=1)
+        url = reverse('generate_timetables')
+        response = self.client.post(url, {'solver': 'anneal', 'time_budget': 60}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post(url, {'solver': 'anneal', 'time_budget': 30}, content_type='application/json')
+        self.assertEqual(response.status_code, 202)
+
+    def test_command_refuses_to_run_beside_an_active_job(self):
+        seed_school(courses=1)
+        start_generation_job()
+        for args in ([], ['--incremental'], ['--clear']):
+            with self.assertRaises(CommandError):
+                call_command('generate_timetables', *args, stdout=io.StringIO())
+        self.assertFalse(Timetable.objects.exists())
+
+    def test_database_admits_one_active_job(self):
+        self.assertIsNotNone(start_generation_job())
+        self.assertIsNone(start_generation_job())
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            GenerationJob.objects.create()
+
+    def test_job_orphaned_by_a_dead_process_expires(self):
+        seed_school(courses=1)
+        orphan = start_generation_job()
+        GenerationJob.objects.filter(pk=orphan.pk).update(
+            status=GenerationJob.STATUS_RUNNING, updated_at=timezone.now() - timedelta(hours=2),
+        )
+        response = self.client.post(reverse('generate_timetables'))
+        self.assertEqual(response.status_code, 202)
+        orphan.refresh_from_db()
+        self.assertEqual((orphan.status, orphan.active), (GenerationJob.STATUS_FAILED, None))
+        self.assertEqual(orphan.error, 'Job stopped responding')
+
+    def test_job_expired_while_running_keeps_its_failure(self):
+        seed_school(courses=1)
+        job = start_generation_job()
+
+        def expire_midway(**kwargs):
+            GenerationJob.objects.filter(pk=job.pk).update(updated_at=timezone.now() - timedelta(hours=2))
+            expire_stale_jobs()
+            return 0
+
+        with mock.patch('timetable.jobs.generate_timetables_for_all_courses', side_effect=expire_midway):
+            run_generation_job(job.pk)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.active, job.error), (GenerationJob.STATUS_FAILED, None, 'Job stopped responding'))
+
+
+class JobHeartbeatTests(TransactionTestCase):
+    def test_heartbeat_touches_the_running_job(self):
+        job = GenerationJob.objects.create(status=GenerationJob.STATUS_RUNNING)
+        GenerationJob.objects.filter(pk=job.pk).update(updated_at=timezone.now() - timedelta(hours=2))
+        with JobHeartbeat(job.pk, interval=0.01):
+            clock.sleep(0.2)
+        job.refresh_from_db()
+        self.assertGreater(job.updated_at, timezone.now() - timedelta(minutes=1))
+
+
+class IncrementalRegenerationTests(TestCase):
+    def setUp(self):
+        self.courses, self.days, self.periods = seed_school(courses=3)
+        generate_timetables_for_all_courses()
+        self.before = {row[0]: row for row in Timetable.objects.values_list('id', 'course_id', 'day_id', 'period_id', 'subject_id')}
+
+    def test_no_changes_is_a_no_op(self):
+        summary = regenerate_timetables()
+        self.assertEqual(summary['unchanged'], len(self.before))
+        self.assertEqual(summary['inserted'] + summary['updated'] + summary['deleted'], 0)
+
+    def test_only_affected_course_is_rewritten(self):
+        course = self.courses[0]
+        course.subjects.order_by('id').first().delete()
+        summary = regenerate_timetables(course_ids=[course.id])
+
+        after = {row[0]: row for row in Timetable.objects.values_list('id', 'course_id', 'day_id', 'period_id', 'subject_id')}
+        for entry_id, row in self.before.items():
+            if row[1] != course.id:
+                self.assertEqual(after[entry_id], row)
+        self.assertEqual(summary['unfilled'], 0)
+        self.assertEqual(Timetable.objects.filter(course=course).count(), len(self.days) * len(self.periods))
+
+    def test_new_period_only_inserts_new_slots(self):
+        Period.objects.create(start_time=time(16), end_time=time(16, 50))
+        summary = regenerate_timetables()
+        self.assertEqual(summary['inserted'], len(self.courses) * len(self.days))
+        self.assertEqual(summary['unchanged'], len(self.before))
+        self.assertEqual(summary['updated'] + summary['deleted'], 0)
+
+
+class BulkPeriodTests(TestCase):
+    def test_bulk_create_reports_each_rejected_item(self):
+        Period.objects.create(start_time=time(9), end_time=time(10))
+        payload = [
+            {'start_time': '08:00', 'end_time': '09:00'},    # ok, touches the existing one
+            {'start_time': '09:30', 'end_time': '10:30'},    # overlaps the existing period
+            {'start_time': '10:00', 'end_time': '11:00'},    # ok
+            {'start_time': '10:45', 'end_time': '11:15'},    # overlaps item 2 of this batch
+            {'start_time': '12:00', 'end_time': '11:00'},    # invalid range
+        ]
+        with self.assertNumQueries(4):
+            response = self.client.post(reverse('period-list-create'), payload, content_type='application/json')
+        self.assertEqual(response.status_code, 207)
+        body = response.json()
+        self.assertEqual([p['start_time'] for p in body['created']], ['08:00:00', '10:00:00'])
+        self.assertEqual([e['index'] for e in body['errors']], [1, 3, 4])
+        self.assertEqual(Period.objects.count(), 3)
+
+
+class BulkResourceTests(TestCase):
+    def test_staff_batch_create_update_delete(self):
+        courses, _, _ = seed_school(courses=2)
+        subject_ids = list(Subject.objects.values_list('id', flat=True))
+        payload = [
+            {'name': f'Teacher {i}', 'subject_ids': subject_ids[i % 3:i % 3 + 2]} for i in range(20)
+        ] + [{'name': 'Broken', 'subject_ids': [999999]}]
+
+        # Query count is independent of the batch size
+        with self.assertNumQueries(7):
+            response = self.client.post(reverse('staff-bulk'), payload, content_type='application/json')
+        self.assertEqual(response.status_code, 207)
+        created = response.json()['created']
+        self.assertEqual(len(created), 20)
+        self.assertEqual(response.json()['errors'][0]['index'], 20)
+        self.assertEqual(len(created[0]['subjects']), 2)
+
+        updates = [{'id': row['id'], 'name': row['name'] + '!', 'subject_ids': subject_ids[:1]} for row in created]
+        response = self.client.patch(reverse('staff-bulk'), updates, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(all(row['name'].endswith('!') and len(row['subjects']) == 1 for row in response.json()))
+
+        ids = [row['id'] for row in created[:5]] + [999999]
+        response = self.client.delete(reverse('staff-bulk'), ids, content_type='application/json')
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual(sorted(response.json()['deleted']), sorted(ids[:5]))
+        self.assertEqual(Staff.objects.filter(id__in=ids, is_deleted=True).count(), 5)
+
+    def test_subject_batch_create_checks_courses_in_one_query(self):
+        course = Course.objects.create(name='Maths')
+        payload = [{'name': f'Topic {i}', 'course_id': course.id} for i in range(30)]
+        with self.assertNumQueries(5):
+            response = self.client.post(reverse('subject-bulk'), payload, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()[0]['course']['name'], 'Maths')
+
+
+class ImportCommandTests(TestCase):
+    def test_import_resolves_names_and_is_idempotent(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            files = {
+                'courses': ('courses.csv', 'name\nPhysics\nChemistry\nPhysics\n'),
+                'subjects': ('subjects.jsonl', '{"name": "Optics", "course": "Physics"}\n{"name": "Acids", "course": "Chemistry"}\n{"name": "X", "course": "Nope"}\n'),
+                'staff': ('staff.csv', 'name\nAda\n'),
+                'staff_subjects': ('links.csv', 'staff,course,subject\nAda,Physics,Optics\nAda,Chemistry,Acids\n'),
+                'periods': ('periods.csv', 'start_time,end_time\n8:00,8:50\n9:00,9:50\n8:30,9:10\n'),
+            }
+            args = []
+            for kind, (name, content) in files.items():
+                path = os.path.join(tmp, name)
+                with open(path, 'w') as handle:
+                    handle.write(content)
+                args += ['--' + kind.replace('_', '-'), path]
+
+            staff_version = model_versions([Staff])
+            call_command('import_timetable_data', *args, stdout=io.StringIO())
+            self.assertNotEqual(model_versions([Staff]), staff_version)
+            self.assertEqual(Course.objects.count(), 2)
+            self.assertEqual(Subject.objects.count(), 2)
+            self.assertEqual(Staff.objects.get(name='Ada').subjects.count(), 2)
+            self.assertEqual(Period.objects.count(), 2)
+
+            out = io.StringIO()
+            call_command('import_timetable_data', *args, stdout=out)
+            self.assertEqual((Course.objects.count(), Subject.objects.count(), Period.objects.count()), (2, 2, 2))
+            self.assertIn('staff_subjects: 2 rows, 0 created, 2 already present', out.getvalue())
+
+
+class ListQueryCountTests(TestCase):
+    # Every list endpoint must run a fixed number of queries however many
+    # rows it returns. Seed, measure, double the data, measure again.
+
+    def assertConstantQueries(self, url_name, queries):
+        seed_school(courses=2)
+        generate_timetables_for_all_courses()
+        with self.assertNumQueries(queries):
+            first = self.client.get(reverse(url_name))
+        seed_school_more()
+        with self.assertNumQueries(queries):
+            second = self.client.get(reverse(url_name))
+        self.assertGreater(len(second.json()), len(first.json()))
+
+    def test_courses(self):
+        self.assertConstantQueries('course-list-create', 1)
+
+    def test_subjects(self):
+        self.assertConstantQueries('subject-list-create', 1)
+
+    def test_staff(self):
+        self.assertConstantQueries('staff-list-create', 2)
+
+    def test_periods(self):
+        self.assertConstantQueries('period-list-create', 1)
+
+    def test_days(self):
+        # Days are a fixed set, so only the count matters here
+        seed_school()
+        with self.assertNumQueries(1):
+            self.client.get(reverse('day-list-create'))
+
+    def test_timetables(self):
+        self.assertConstantQueries('timetable-list', 1)
+
+
+class ListPaginationTests(TestCase):
+    def setUp(self):
+        seed_school(courses=3)
+        generate_timetables_for_all_courses()
+
+    def test_keyset_pages_cover_every_row_once(self):
+        url, seen = reverse('timetable-list') + '?page_size=7', []
+        while url:
+            with self.assertNumQueries(1):
+                page = self.client.get(url).json()
+            seen.extend(row['id'] for row in page['results'])
+            url = page['next']
+        self.assertEqual(sorted(seen), list(Timetable.objects.order_by('id').values_list('id', flat=True)))
+
+    def test_stream_matches_full_list(self):
+        response = self.client.get(reverse('staff-list-create') + '?stream=1')
+        self.assertTrue(response.streaming)
+        streamed = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(streamed, self.client.get(reverse('staff-list-create')).json())
+
+
+class CompactTimetableTests(TestCase):
+    def test_compact_layout_rebuilds_nested_rows(self):
+        seed_school(courses=2)
+        generate_timetables_for_all_courses()
+        url = reverse('timetable-list')
+        with self.assertNumQueries(6):
+            compact = self.client.get(url + '?layout=compact').json()
+        nested = {row['id']: row for row in self.client.get(url).json()}
+
+        self.assertEqual(len(compact['entries']), len(nested))
+        for row in compact['entries']:
+            entry = dict(zip(compact['fields'], row))
+            expected = nested[entry['id']]
+            self.assertEqual(compact['courses'][str(entry['course'])]['name'], expected['course']['name'])
+            self.assertEqual(compact['subjects'][str(entry['subject'])]['name'], expected['subject']['name'])
+            self.assertEqual(compact['days'][str(entry['day'])]['name'], expected['day']['name'])
+            self.assertEqual(compact['periods'][str(entry['period'])]['start_time'], expected['period']['start_time'])
+            self.assertEqual(compact['staff'][str(entry['staff'])]['name'], expected['staff']['name'])
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.courses, _, _ = seed_school(courses=2)
+        generate_timetables_for_all_courses()
+
+    def test_csv_and_jsonl_stream_every_live_entry(self):
+        Timetable.objects.filter(pk=Timetable.objects.first().pk).update(is_deleted=True)
+        live = Timetable.objects.live().count()
+
+        response = self.client.get(reverse('timetable_export', args=['csv']))
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], 'id,course_id,course,day,start_time,end_time,subject_id,subject,staff_id,staff')
+        self.assertEqual(len(lines), live + 1)
+
+        out = io.StringIO()
+        with self.assertNumQueries(1):
+            call_command('export_timetables', '--format', 'jsonl', '--chunk-size', '5', stdout=out)
+        records = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual(len(records), live)
+        self.assertEqual(set(records[0]), {
+            'id', 'course_id', 'course', 'day', 'start_time', 'end_time', 'subject_id', 'subject', 'staff_id', 'staff',
+        })
+
+    def test_ics_per_course(self):
+        course = self.courses[0]
+        response = self.client.get(reverse('timetable_export', args=['ics']) + f'?course={course.pk}')
+        body = b''.join(response.streaming_content).decode()
+        self.assertTrue(body.startswith('BEGIN:VCALENDAR\r\n'))
+        self.assertEqual(body.count('BEGIN:VEVENT'), Timetable.objects.live().filter(course=course).count())
+        self.assertEqual(self.client.get(reverse('timetable_export', args=['ics'])).status_code, 400)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            call_command('export_timetables', '--format', 'ics', '--output', tmp, stdout=io.StringIO())
+            self.assertEqual(sorted(os.listdir(tmp)), sorted(f'timetable-course-{c.pk}.ics' for c in self.courses))
+
+        member = Staff.objects.first()
+        response = self.client.get(reverse('timetable_export', args=['ics']) + f'?staff={member.pk}')
+        body = b''.join(response.streaming_content).decode()
+        self.assertEqual(body.count('BEGIN:VEVENT'), Timetable.objects.live().filter(staff=member).count())
+
+
+class BenchmarkCommandTests(TestCase):
+    def test_report_is_json_and_rolled_back(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'bench.json')
+            call_command('benchmark_timetables', '--courses', '3', '--staff', '4', '--periods', '2', '--days', '2',
+                         '--bulk-size', '5', '--repeat', '1', '--output', path, stdout=io.StringIO())
+            with open(path) as handle:
+                report = json.load(handle)
+            out = io.StringIO()
+            call_command('benchmark_timetables', '--courses', '3', '--staff', '4', '--periods', '2', '--days', '2',
+                         '--bulk-size', '5', '--repeat', '1', '--output', path, '--compare', path, stdout=out)
+
+        self.assertEqual(report['seeded']['courses'], 3)
+        self.assertEqual(report['results']['generate']['entries'], 3 * 2 * 2)
+        for result in report['results'].values():
+            self.assertEqual(set(result) - {'entries', 'bytes'}, {'wall_ms', 'queries', 'db_ms', 'peak_kb'})
+        self.assertIn('bulk create staff', out.getvalue())
+        self.assertFalse(Course.objects.exists())
+
+
+class RequestMetricsTests(TestCase):
+    def setUp(self):
+        registry.reset()
+        cache.clear()
+        seed_school()
+
+    def test_metrics_endpoint_reports_per_view_counters(self):
+        self.client.get(reverse('staff-list-create'))
+        self.client.get(reverse('staff-list-create'))
+        body = self.client.get(reverse('metrics')).content.decode()
+
+        self.assertIn('timetable_requests_total{view="staff-list-create",method="GET",status="200"} 2', body)
+        self.assertIn('timetable_request_queries_sum{view="staff-list-create",method="GET"} 4', body)
+        self.assertIn('timetable_request_duration_seconds_bucket{view="staff-list-create",method="GET",le="+Inf"} 2', body)
+        self.assertIn('# TYPE timetable_response_bytes histogram', body)
+
+        forbidden = self.client.get(reverse('metrics'), REMOTE_ADDR='10.0.0.1')
+        self.assertEqual(forbidden.status_code, 403)
+        proxied = self.client.get(reverse('metrics'), HTTP_X_FORWARDED_FOR='203.0.113.7')
+        self.assertEqual(proxied.status_code, 403)
+
+    @override_settings(TIMETABLE_SLOW_REQUEST_MS=0)
+    def test_slow_requests_log_the_worst_query(self):
+        with self.assertLogs('timetable.metrics', 'WARNING') as logs:
+            self.client.get(reverse('subject-list-create'))
+        self.assertIn('subject-list-create', logs.output[0])
+        self.assertIn('SELECT', logs.output[0])
+
+
+class CourseGridTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.courses, self.days, self.periods = seed_school(courses=3)
+        generate_timetables_for_all_courses()
+
+    def test_grid_matches_entries_in_one_query_when_warm(self):
+        course = self.courses[1]
+        url = reverse('course_grid', args=[course.pk])
+        self.client.get(url)
+        with self.assertNumQueries(1):
+            grid = self.client.get(url).json()
+
+        self.assertEqual([d['id'] for d in grid['days']], [d.pk for d in self.days])
+        self.assertEqual([p['id'] for p in grid['periods']], [p.pk for p in self.periods])
+        for entry in Timetable.objects.filter(course=course).select_related('subject', 'staff'):
+            cell = grid['grid'][self.periods.index(entry.period)][self.days.index(entry.day)]
+            self.assertEqual((cell['id'], cell['subject']['name'], cell['staff']['name']),
+                             (entry.pk, entry.subject.name, entry.staff.name))
+        self.assertEqual(self.client.get(reverse('course_grid', args=[0])).status_code, 404)
+
+    def test_batch_and_empty_courses(self):
+        empty = Course.objects.create(name='Empty')
+        ids = f'{self.courses[0].pk},{empty.pk},{self.courses[2].pk},0'
+        body = self.client.get(reverse('course_grid_batch') + '?ids=' + ids).json()
+        self.assertEqual([c['course']['id'] for c in body['courses']], [self.courses[0].pk, empty.pk, self.courses[2].pk])
+        self.assertTrue(all(cell is None for row in body['courses'][1]['grid'] for cell in row))
+        self.assertEqual(self.client.get(reverse('course_grid_batch') + '?ids=x').status_code, 400)
+
+
+class TimetableSnapshotTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.courses, _, _ = seed_school(courses=3)
+        generate_timetables_for_all_courses()
+
+    def live_list(self):
+        entries = TimetableSerializer.setup_eager_loading(Timetable.objects.live()).order_by('course_id', 'id')
+        return json.loads(json.dumps(TimetableSerializer(entries, many=True).data))
+
+    def test_list_is_one_query_and_matches_live_entries(self):
+        self.assertEqual(CourseTimetableSnapshot.objects.count(), 3)
+        with self.assertNumQueries(1):
+            body = self.client.get(reverse('timetable-list')).json()
+        self.assertEqual(body, self.live_list())
+
+    def test_edits_and_renames_refresh_snapshots(self):
+        entry = Timetable.objects.live().first()
+        other = Subject.objects.filter(course_id=entry.course_id).exclude(pk=entry.subject_id).first()
+        self.client.delete(reverse('timetable_detail', args=[entry.pk]))
+        self.assertEqual(self.client.get(reverse('timetable-list')).json(), self.live_list())
+
+        other.name = 'Renamed'
+        other.save()
+        self.assertEqual(self.client.get(reverse('timetable-list')).json(), self.live_list())
+
+        self.client.post(reverse('clear_timetables'))
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(reverse('timetable-list')).json(), [])
+
+    def test_versions_live_in_the_database_and_only_touched_courses_rebuild(self):
+        # Another process has its own cache: a fresh cache must not rebuild
+        cache.clear()
+        with self.assertNumQueries(1):
+            self.client.get(reverse('timetable-list'))
+
+        # Renaming one teacher only marks the courses they teach stale
+        staff = Timetable.objects.live().filter(course=self.courses[1]).first().staff
+        staff.name = 'Renamed'
+        staff.save()
+        stale = CourseTimetableSnapshot.objects.exclude(built_version=F('version'))
+        self.assertEqual(list(stale.values_list('course_id', flat=True)), [self.courses[1].pk])
+        self.assertEqual(self.client.get(reverse('timetable-list')).json(), self.live_list())
+        self.assertFalse(stale.exists())
+
+    def test_admin_deletes_refresh_snapshots(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'secret'))
+        entry = Timetable.objects.live().first()
+        response = self.client.post(reverse('admin:timetable_timetable_delete', args=[entry.pk]), {'post': 'yes'})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.client.get(reverse('timetable-list')).json(), self.live_list())
+
+
+class TimetableEditTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.courses, self.days, self.periods = seed_school(courses=2)
+        generate_timetables_for_all_courses()
+        self.first, self.second = self.courses
+
+    def entry(self, course, day, period):
+        return Timetable.objects.get(course=course, day=day, period=period, is_deleted=False)
+
+    def move(self, entry, **body):
+        return self.client.post(reverse('timetable_move', args=[entry.pk]), body, content_type='application/json')
+
+    def test_patch_checks_slot_and_staff_changes_like_a_move(self):
+        entry = self.entry(self.first, self.days[1], self.periods[1])
+        url = reverse('timetable_detail', args=[entry.pk])
+        taken = self.client.patch(url, {'day': self.days[2].pk, 'period': self.periods[0].pk}, content_type='application/json')
+        self.assertEqual(taken.status_code, 409)
+        self.assertEqual(taken.json()['conflicts'][0]['reason'], 'course_slot')
+
+        stranger = Staff.objects.create(name='Stranger')
+        response = self.client.patch(url, {'staff': stranger.pk}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        entry.refresh_from_db()
+        self.assertEqual((entry.day_id, entry.period_id), (self.days[1].pk, self.periods[1].pk))
+        self.assertNotEqual(entry.staff_id, stranger.pk)
+
+    def test_move_into_freed_slot_and_reject_clashes(self):
+        freed = self.entry(self.first, self.days[0], self.periods[0])
+        self.client.delete(reverse('timetable_detail', args=[freed.pk]))
+        entry = self.entry(self.first, self.days[1], self.periods[1])
+
+        taken = self.move(entry, day=self.days[2].pk, period=self.periods[0].pk)
+        self.assertEqual(taken.status_code, 409)
+        self.assertEqual(taken.json()['conflicts'][0]['reason'], 'course_slot')
+
+        # A teacher of both courses is busy in the other course at that time
+        busy = Staff.objects.create(name='Busy')
+        busy.subjects.add(entry.subject, self.entry(self.second, self.days[0], self.periods[0]).subject)
+        Timetable.objects.filter(pk=self.entry(self.second, self.days[0], self.periods[0]).pk).update(staff=busy)
+        clash = self.move(entry, day=self.days[0].pk, period=self.periods[0].pk, staff=busy.pk)
+        self.assertEqual(clash.status_code, 409)
+        self.assertEqual(clash.json()['conflicts'][0]['reason'], 'staff_busy')
+        self.assertEqual(self.move(entry, day=self.days[0].pk, period='x').status_code, 400)
+
+        moved = self.move(entry, day=self.days[0].pk, period=self.periods[0].pk)
+        self.assertEqual(moved.status_code, 200)
+        self.assertEqual((moved.json()[0]['day']['id'], moved.json()[0]['period']['id']), (self.days[0].pk, self.periods[0].pk))
+        self.assertFalse(Timetable.objects.filter(pk=freed.pk).exists())
+        listed = {row['id']: row for row in self.client.get(reverse('timetable-list')).json()}
+        self.assertEqual(listed[entry.pk]['day']['id'], self.days[0].pk)
+
+    def test_swap_exchanges_lessons_within_a_course(self):
+        a = self.entry(self.first, self.days[0], self.periods[0])
+        b = Timetable.objects.live().filter(course=self.first).exclude(subject=a.subject).first()
+        response = self.client.post(reverse('timetable_swap', args=[a.pk]), {'with': b.pk}, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        a_after, b_after = Timetable.objects.get(pk=a.pk), Timetable.objects.get(pk=b.pk)
+        self.assertEqual((a_after.subject_id, a_after.staff_id, a_after.day_id), (b.subject_id, b.staff_id, a.day_id))
+        self.assertEqual((b_after.subject_id, b_after.staff_id), (a.subject_id, a.staff_id))
+
+        other = self.entry(self.second, self.days[0], self.periods[0])
+        cross = self.client.post(reverse('timetable_swap', args=[a.pk]), {'with': other.pk}, content_type='application/json')
+        self.assertEqual(cross.status_code, 400)
+        missing = self.client.post(reverse('timetable_swap', args=[a.pk]), {'with': 0}, content_type='application/json')
+        self.assertEqual(missing.status_code, 404)
+
+
+class TimetableAnalyticsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.courses, self.days, self.periods = seed_school(courses=2)
+        generate_timetables_for_all_courses()
+
+    def test_report_matches_entries_and_is_cached(self):
+        url = reverse('timetable_analytics') + '?all=1&max_daily_load=2'
+        report = self.client.get(url).json()
+        entries = Timetable.objects.live()
+        self.assertEqual(report['slots_per_course'], 15)
+        self.assertEqual(report['summary']['entries'], entries.count())
+        self.assertEqual(report['summary']['unfilled_slots'], 0)
+        for member in report['staff']:
+            lessons = entries.filter(staff_id=member['id'])
+            daily = max([lessons.filter(day=day).count() for day in self.days])
+            self.assertEqual((member['weekly_lessons'], member['peak_daily_lessons']), (lessons.count(), daily))
+            self.assertEqual(member['overloaded'], daily > 2)
+        for subject in report['subjects']:
+            self.assertEqual(subject['lessons'], entries.filter(subject_id=subject['id']).count())
+            self.assertEqual(subject['target'], 5)
+        with self.assertNumQueries(0):
+            self.client.get(url)
+
+        entry = entries.filter(course=self.courses[0]).first()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(reverse('timetable_detail', args=[entry.pk]))
+        problems = self.client.get(reverse('timetable_analytics')).json()
+        self.assertEqual(problems['summary']['unfilled_slots'], 1)
+        self.assertEqual(problems['courses'], [{'id': self.courses[0].pk, 'name': 'Course 0', 'filled': 14, 'unfilled': 1}])
+        self.assertEqual(self.client.get(reverse('timetable_analytics') + '?max_daily_load=0').status_code, 400)
+
+    def test_command_prints_summary(self):
+        out = io.StringIO()
+        call_command('timetable_analytics', '--max-daily-load', '1', stdout=out)
+        self.assertIn('30 entries (0 without staff), 15 slots per course', out.getvalue())
+        self.assertIn('overloaded', out.getvalue())
+
+
+class ReferenceCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        seed_school()
+
+    def test_repeat_get_is_served_from_cache(self):
+        url = reverse('subject-list-create')
+        with self.assertNumQueries(1):
+            first = self.client.get(url)
+        with self.assertNumQueries(0):
+            second = self.client.get(url)
+        self.assertEqual(first.json(), second.json())
+        self.assertEqual(first['ETag'], second['ETag'])
+
+    def test_etag_revalidation_and_invalidation_on_write(self):
+        url = reverse('subject-list-create')
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        # Renaming a course changes the nested subject payload
+        course = Course.objects.first()
+        response = self.client.patch(reverse('course-detail', args=[course.pk]), {'name': 'Renamed'}, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Renamed', {subject['course']['name'] for subject in response.json()})
+
+
+class AvailabilityMatrixTests(SimpleTestCase):
+    def setUp(self):
+        self.matrix = AvailabilityMatrix(day_ids=[1, 2], period_ids=[10, 20, 30])
+
+    def test_book_and_release(self):
+        self.matrix.book('a', 2, 20)
+        self.assertFalse(self.matrix.is_free('a', 2, 20))
+        self.assertTrue(self.matrix.is_free('a', 1, 20))
+        self.assertEqual(self.matrix.busy_slots('a'), [(2, 20)])
+        self.matrix.release('a', 2, 20)
+        self.assertEqual(self.matrix.load('a'), 0)
+
+    def test_multi_owner_queries(self):
+        self.matrix.book('a', 1, 10)
+        self.matrix.book('b', 1, 20)
+        self.assertEqual(self.matrix.free_owners(['a', 'b', 'c'], 1, 10), ['b', 'c'])
+        self.assertEqual(len(self.matrix.free_slots('a')), 5)
+        self.assertEqual(self.matrix.slots(self.matrix.common_free_mask(['a', 'b'])), [(1, 30), (2, 10), (2, 20), (2, 30)])
+        self.assertEqual(self.matrix.conflicts('a', self.matrix.full_mask), [(1, 10)])
@@ -0,0 +1,62 @@
+import logging
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from django.conf import settings
+
+# Structured logging for generation runs. Every record carries an `event`
+# name plus its fields in `extra`, so a JSON formatter can ship them as-is;
+# messages use %-style arguments and are only formatted when a handler
+# actually emits them.
+#
+# Per-item events (a subject without staff, a slot left empty, ...) are
+# logged individually unless the trace is quiet; they are always counted,
+# and the run ends with one summary record holding the counters and the
+# time spent in each phase.
+
+logger = logging.getLogger('timetable.generator')
+
+
+class GenerationTrace:
+    def __init__(self, run, quiet=None):
+        self.run = run
+        self.quiet = getattr(settings, 'TIMETABLE_GENERATION_QUIET', False) if quiet is None else quiet
+        self.counters = Counter()
+        self.phases = {}  # {phase: milliseconds}
+        self.started = time.perf_counter()
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = (time.perf_counter() - start) * 1000
+            self.phases[name] = self.phases.get(name, 0.0) + elapsed
+            logger.debug('%s: %s phase took %.1f ms', self.run, name, elapsed,
+                         extra={'event': f'{self.run}.phase', 'run': self.run, 'phase': name, 'ms': elapsed})
+
+    def count(self, counter, amount=1):
+        self.counters[counter] += amount
+
+    def item(self, counter, msg, *args, **fields):
+        # Count one occurrence of `counter` and, unless quiet, log it as a warning
+        self.counters[counter] += 1
+        if not self.quiet and logger.isEnabledFor(logging.WARNING):
+            logger.warning(msg, *args, extra={'event': f'{self.run}.{counter}', 'run': self.run, **fields})
+
+    def warning(self, msg, *args, **fields):
+        # Run-level problems are logged even when quiet
+        logger.warning(msg, *args, extra={'event': f'{self.run}.warning', 'run': self.run, **fields})
+
+    def summary(self, msg, *args):
+        total = (time.perf_counter() - self.started) * 1000
+        phases = ', '.join(f'{name} {ms:.1f} ms' for name, ms in self.phases.items())
+        logger.info(msg + ' in %.1f ms (%s)', *args, total, phases or 'no phases', extra={
+            'event': f'{self.run}.summary',
+            'run': self.run,
+            'counters': dict(self.counters),
+            'phases_ms': {name: round(ms, 3) for name, ms in self.phases.items()},
+            'total_ms': round(total, 3),
+        })
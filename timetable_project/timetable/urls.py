@@ -1,18 +1,32 @@
 from django.urls import path
-from .views import CourseAPIView, SubjectAPIView, StaffAPIView, DayAPIView, PeriodAPIView, GenerateTimetableAPIView, ClearTimetableAPIView, TimetableAPIView, TimetableDetailView
+from .views import BulkAPIView, CourseGridAPIView, StaffTimetableAPIView, CourseAPIView, SubjectAPIView, StaffAPIView, DayAPIView, PeriodAPIView, GenerateTimetableAPIView, RegenerateTimetableAPIView, GenerationJobAPIView, ClearTimetableAPIView, TimetableAPIView, TimetableDetailView, TimetableMoveAPIView, TimetableSwapAPIView, TimetableExportAPIView, TimetableAnalyticsAPIView, MetricsAPIView
 
 urlpatterns = [
     path('courses/', CourseAPIView.as_view(), name='course-list-create'),
+    path('courses/bulk/', BulkAPIView.as_view(resource='courses'), name='course-bulk'),
     path('courses/<int:pk>/', CourseAPIView.as_view(), name='course-detail'),
     path('subjects/', SubjectAPIView.as_view(), name='subject-list-create'),
+    path('subjects/bulk/', BulkAPIView.as_view(resource='subjects'), name='subject-bulk'),
     path('subjects/<int:pk>/', SubjectAPIView.as_view(), name='subject-detail'),
     path('staff/', StaffAPIView.as_view(), name='staff-list-create'),
+    path('staff/bulk/', BulkAPIView.as_view(resource='staff'), name='staff-bulk'),
     path('staff/<int:pk>/', StaffAPIView.as_view(), name='staff'),
+    path('staff/<int:pk>/timetable/', StaffTimetableAPIView.as_view(), name='staff-timetable'),
     path('days/', DayAPIView.as_view(), name='day-list-create'),
     path('periods/', PeriodAPIView.as_view(), name='period-list-create'),
     path('periods/<int:pk>/', PeriodAPIView.as_view(), name='period-detail'),
     path('timetables/generate/', GenerateTimetableAPIView.as_view(), name='generate_timetables'),
+    path('timetables/regenerate/', RegenerateTimetableAPIView.as_view(), name='regenerate_timetables'),
+    path('timetables/jobs/', GenerationJobAPIView.as_view(), name='generation_job_list'),
+    path('timetables/jobs/<int:job_id>/', GenerationJobAPIView.as_view(), name='generation_job_detail'),
     path('timetables/clear/', ClearTimetableAPIView.as_view(), name='clear_timetables'),
+    path('timetables/analytics/', TimetableAnalyticsAPIView.as_view(), name='timetable_analytics'),
+    path('timetables/export/<str:export_format>/', TimetableExportAPIView.as_view(), name='timetable_export'),
+    path('timetables/courses/grid/', CourseGridAPIView.as_view(), name='course_grid_batch'),
+    path('timetables/courses/<int:course_id>/grid/', CourseGridAPIView.as_view(), name='course_grid'),
     path('timetables/', TimetableAPIView.as_view(), name='timetable-list'),
     path('timetables/entry/<int:timetable_id>/', TimetableDetailView.as_view(), name='timetable_detail'),
+    path('timetables/entry/<int:timetable_id>/move/', TimetableMoveAPIView.as_view(), name='timetable_move'),
+    path('timetables/entry/<int:timetable_id>/swap/', TimetableSwapAPIView.as_view(), name='timetable_swap'),
+    path('metrics/', MetricsAPIView.as_view(), name='metrics'),
 ]
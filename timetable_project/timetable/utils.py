@@ -1,70 +1,182 @@
 import random
-from .models import Course, Period, Subject, Timetable, Staff, Day
-
-def generate_timetables_for_all_courses():
-    courses = Course.objects.filter(is_active=True, is_deleted=False)
-    periods = Period.objects.filter(is_deleted=False)
-    days = Day.objects.all()
-
-    print("Courses:", courses)
-    print("Periods:", periods)
-    print("Days:", days)
-
-    if not courses.exists():
-        print("No active courses found.")
-        return []
-    if not periods.exists():
-        print("No periods found.")
-        return []
-
-    for course in courses:
-        print(f"Processing course: {course}")
-        subjects = list(course.subjects.filter(is_active=True, is_deleted=False))
-        if not subjects:
-            print(f"Warning: No active subjects for course {course.name}.")
-            continue  # Skip this course if no subjects
-
-        timetable_entries = []
-        staff_schedule = {staff.id: {day.id: [] for day in days} for staff in Staff.objects.filter(is_active=True, is_deleted=False)}
-
-        for day in days:
-            for period in periods:
-                assigned = False
-                random.shuffle(subjects)  # Shuffle subjects for randomness
-
-                # Try to assign a subject to the period
-                for subject in subjects:
-                    staff_members = subject.staff_members.filter(is_active=True, is_deleted=False)
-
-                    if not staff_members:
-                        print(f"Warning: No staff members assigned to subject {subject.name}.")
-                        continue  # Skip if no staff members for this subject
-
-                    # Try to assign a staff member who is available for the period
-                    for staff in staff_members:
-                        if period.id not in staff_schedule[staff.id][day.id]:
-                            # Staff is available for this period on this day
-                            timetable_entries.append(
-                                Timetable(course=course, period=period, subject=subject, day=day)
-                            )
-                            staff_schedule[staff.id][day.id].append(period.id)  # Mark staff as assigned
-                            assigned = True
-                            print(f"Assigned {subject.name} to {staff.name} for {course.name} on {day.name} at {period.start_time}")
-                            break  # Exit staff loop as we've assigned a staff member
-
-                    if assigned:
-                        break  # Exit subject loop as we've assigned a subject
-
-                if not assigned:
-                    print(f"Warning: No available subject or staff for {course.name} on {day.name} during period {period.start_time}")
-
-        # Once assignments are done for the course, bulk create the timetable entries
-        if timetable_entries:
-            try:
-                Timetable.objects.bulk_create(timetable_entries)
-                print(f"Timetable for course {course.name} created successfully!")
-            except Exception as e:
-                print(f"Error during bulk creation for course {course.name}: {str(e)}")
-                raise
-
-    return len(timetable_entries)  # Return count of entries created
+from array import array
+
+from django.conf import settings
+from django.db import transaction
+
+from .cache import bump_model_version
+from .incremental import affected_course_ids, apply_diff, load_existing_entries, plan_incremental
+from .models import Timetable
+from .scheduler import (
+    get_cached_schedule, iter_solve, load_scheduling_data, parallel_concurrency, persist, schedule_cache_key,
+    solve_parallel, split_components, store_schedule, write_assignments,
+)
+from .snapshots import rebuild_course_snapshots
+from .solvers import make_solver
+from .tracing import GenerationTrace
+
+
+def generate_timetables_for_all_courses(workers=1, progress=None, quiet=None, solver=None, trace=None, seed=None,
+                                        streaming=None, batch_size=None):
+    # Load everything once, solve all courses together in memory, then write
+    # the result in one transaction. With workers > 1 (or 0 for every CPU),
+    # independent groups of courses are solved in parallel processes.
+    # `progress(courses_done=, courses_total=, slots_filled=, slots_unfilled=)`
+    # is called as courses complete. `quiet` logs only the summary counters
+    # (default: settings.TIMETABLE_GENERATION_QUIET). `solver` is a backend
+    # from solvers.py (default: settings.TIMETABLE_SOLVER). Pass a `trace`
+    # to read the run's counters, including the solver score and iterations.
+    # With a `seed` the run is reproducible and its schedule is cached under
+    # the input fingerprint, seed and solver settings, so repeating it on
+    # unchanged data skips solving. With `streaming` (default:
+    # settings.TIMETABLE_GENERATION_STREAMING) see generate_streaming().
+    trace = trace or GenerationTrace('generate', quiet=quiet)
+    solver = solver or make_solver()
+    if streaming is None:
+        streaming = getattr(settings, 'TIMETABLE_GENERATION_STREAMING', False)
+    if streaming and solver.name != 'greedy':
+        raise ValueError('Streaming generation only supports the greedy solver')
+    with trace.phase('load'):
+        data = load_scheduling_data()
+
+    if not data.course_ids:
+        trace.warning("No active courses found.")
+        return 0
+    if not data.period_ids:
+        trace.warning("No periods found.")
+        return 0
+
+    for subject_id, name in data.subject_names.items():
+        if subject_id not in data.subject_staff:
+            trace.item('subjects_without_staff', "No staff members assigned to subject %s.", name, subject_id=subject_id)
+
+    if streaming:
+        return generate_streaming(data, trace, progress=progress, seed=seed, batch_size=batch_size)
+
+    schedule = key = components = None
+    if seed is not None:
+        # Runs with a different number of worker processes draw different
+        # random streams and component budgets from a seed
+        components = split_components(data) if workers != 1 else None
+        concurrency = parallel_concurrency(workers, components) if components else 1
+        key = schedule_cache_key(data, seed, {**solver.settings(), 'concurrency': concurrency})
+        schedule = get_cached_schedule(key)
+    if schedule is not None:
+        trace.count('cache_hits')
+        if progress:
+            schedule.report(progress, len(data.course_ids), len(data.course_ids))
+    else:
+        with trace.phase('solve'):
+            schedule = solve_parallel(
+                data, workers=workers, rng=random.Random(seed), progress=progress, solver=solver, components=components,
+            )
+        if key is not None:
+            store_schedule(key, schedule)
+
+    for course_id in schedule.skipped_courses:
+        trace.item('courses_without_subjects', "No active subjects for course %s.", data.course_names[course_id], course_id=course_id)
+    for course_id, day_id, period_id in schedule.unfilled:
+        trace.item(
+            'unfilled_slots', "No available subject or staff for course %s on day %s during period %s",
+            data.course_names[course_id], day_id, period_id, course_id=course_id, day_id=day_id, period_id=period_id,
+        )
+
+    with trace.phase('persist'), transaction.atomic():
+        created = persist(schedule)
+        rebuild_course_snapshots()
+
+    courses = len(data.course_ids) - len(schedule.skipped_courses)
+    trace.count('entries_created', created)
+    trace.count('courses_scheduled', courses)
+    trace.count('score', schedule.score or 0)
+    trace.count('iterations', schedule.iterations)
+    trace.summary("Timetables created: %d entries for %d courses, %d slots unfilled, %s score %s after %d iterations",
+                  created, courses, len(schedule.unfilled), schedule.solver, schedule.score, schedule.iterations)
+    return created  # Return count of entries created
+
+
+def generate_streaming(data, trace, progress=None, seed=None, batch_size=None):
+    # Bounded-memory generation: courses are solved greedily one at a time
+    # and their assignment tuples are inserted in fixed-size batches, each
+    # committed on its own. Only the packed staff availability and the
+    # current batch are held, and unfilled slots are counted and logged as
+    # they are found instead of being collected. Progress is reported between
+    # transactions so pollers see it; a failed run deletes the entries it
+    # wrote, by id (8 bytes per entry), leaving other writers' rows alone. No
+    # solver score is computed and nothing is cached.
+    batch_size = batch_size or getattr(settings, 'TIMETABLE_GENERATION_BATCH_SIZE', 2000)
+    total = len(data.course_ids)
+    done = filled = unfilled_count = created = 0
+    pending = []
+    written = array('q')  # ids of the entries inserted so far
+
+    def flush(rows):
+        with transaction.atomic():
+            return write_assignments(rows, batch_size, ids=written)
+
+    try:
+        with trace.phase('stream'):
+            for course_id, rows, unfilled in iter_solve(data, rng=random.Random(seed)):
+                done += 1
+                if rows is None:
+                    trace.item('courses_without_subjects', "No active subjects for course %s.", data.course_names[course_id], course_id=course_id)
+                else:
+                    trace.count('courses_scheduled')
+                    for _, day_id, period_id in unfilled:
+                        trace.item(
+                            'unfilled_slots', "No available subject or staff for course %s on day %s during period %s",
+                            data.course_names[course_id], day_id, period_id, course_id=course_id, day_id=day_id, period_id=period_id,
+                        )
+                    filled += len(rows)
+                    unfilled_count += len(unfilled)
+                    pending.extend(rows)
+                    while len(pending) >= batch_size:
+                        created += flush(pending[:batch_size])
+                        del pending[:batch_size]
+                if progress:
+                    progress(courses_done=done, courses_total=total, slots_filled=filled, slots_unfilled=unfilled_count)
+            created += flush(pending)
+            rebuild_course_snapshots()
+    except Exception:
+        with transaction.atomic():
+            for start in range(0, len(written), batch_size):
+                Timetable.objects.filter(id__in=written[start:start + batch_size].tolist()).delete()
+        bump_model_version(Timetable)
+        raise
+
+    trace.count('entries_created', created)
+    trace.summary("Timetables streamed: %d entries for %d courses, %d slots unfilled",
+                  created, trace.counters['courses_scheduled'], unfilled_count)
+    return created
+
+
+def regenerate_timetables(course_ids=(), subject_ids=(), staff_ids=(), quiet=None, seed=None):
+    # Incremental counterpart of generate_timetables_for_all_courses(): only
+    # the affected courses and any invalidated slots are recomputed, and the
+    # changes are written as a diff. Returns counts of inserted, updated,
+    # deleted, unchanged and unfilled slots.
+    trace = GenerationTrace('regenerate', quiet=quiet)
+    with trace.phase('load'):
+        affected = affected_course_ids(course_ids, subject_ids, staff_ids)
+        data = load_scheduling_data()
+        existing = load_existing_entries()
+    with trace.phase('solve'):
+        diff = plan_incremental(data, existing, affected, rng=random.Random(seed))
+    for course_id, day_id, period_id in diff.unfilled:
+        trace.item(
+            'unfilled_slots', "No available subject or staff for course %s on day %s during period %s",
+            data.course_names[course_id], day_id, period_id, course_id=course_id, day_id=day_id, period_id=period_id,
+        )
+    with trace.phase('persist'), transaction.atomic():
+        touched = {entry.course_id for entry in diff.inserts}
+        touched.update(Timetable.objects.filter(
+            id__in=[entry.id for entry in diff.updates] + diff.deletes).values_list('course_id', flat=True))
+        summary = apply_diff(diff)
+        if touched:
+            rebuild_course_snapshots(touched)
+
+    for key, value in summary.items():
+        trace.count(key, value)
+    trace.summary("Timetables regenerated for %d affected courses: %d inserted, %d updated, %d deleted, %d unchanged",
+                  len(affected), summary['inserted'], summary['updated'], summary['deleted'], summary['unchanged'])
+    return summary
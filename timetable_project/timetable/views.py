@@ -2,15 +2,31 @@
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework import status
-from .models import Course, Subject, Staff, Day, Period, Timetable
-from .serializers import CourseSerializer, SubjectSerializer, StaffSerializer, DaySerializer, PeriodSerializer, TimetableSerializer
-from .utils import generate_timetables_for_all_courses
+from .models import Course, Subject, Staff, Day, Period, Timetable, GenerationJob
+from .serializers import CourseSerializer, SubjectSerializer, StaffSerializer, DaySerializer, PeriodSerializer, TimetableSerializer, GenerationJobSerializer
+from .analytics import problems_only, timetable_analytics
+from .bulk import BULK_RESOURCES, bulk_create_periods
+from .cache import cached_get
+from .compact import compact_timetable_payload
+from .edits import EditConflict, InvalidEdit, move_entry, swap_entries
+from .grid import MAX_BATCH_COURSES, course_grids, grid_axes
+from .exports import CONTENT_TYPES, EXPORT_FORMATS, export_rows, iter_export
+from .jobs import active_generation_job, start_generation_job
+from .metrics import registry
+from .solvers import SOLVERS
+from .pagination import list_response
+from .snapshots import rebuild_course_snapshots, timetable_list_json
+from .utils import regenerate_timetables
 from django.shortcuts import get_object_or_404
+from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse
+from django.db import transaction
 from django.db.models import Q
 
 class CourseAPIView(APIView):
     
     # Get all courses or a single course
+    @cached_get(Course)
     def get(self, request, pk=None):
         if pk:
             try:
@@ -20,9 +36,8 @@ class CourseAPIView(APIView):
                 return Response({'error': 'Course not found'}, status=status.HTTP_404_NOT_FOUND)
             return Response(serializer.data)
         else:
-            courses = Course.objects.filter(is_deleted=False)
-            serializer = CourseSerializer(courses, many=True)
-            return Response(serializer.data)
+            courses = Course.objects.live()
+            return list_response(request, self, courses, CourseSerializer)
     
     # Create a new course
     def post(self, request):
@@ -71,18 +86,18 @@ class CourseAPIView(APIView):
 # Subject API View
 class SubjectAPIView(APIView):
     # Get all subjects or a specific subject
+    @cached_get(Subject, Course)
     def get(self, request, pk=None):
         if pk:
             try:
-                subject = Subject.objects.get(pk=pk, is_deleted=False)
+                subject = SubjectSerializer.setup_eager_loading(Subject.objects).get(pk=pk, is_deleted=False)
                 serializer = SubjectSerializer(subject)
             except Subject.DoesNotExist:
                 return Response({'error': 'Subject not found'}, status=status.HTTP_404_NOT_FOUND)
             return Response(serializer.data)
         else:
-            subjects = Subject.objects.filter(is_deleted=False)
-            serializer = SubjectSerializer(subjects, many=True)
-            return Response(serializer.data)
+            subjects = SubjectSerializer.setup_eager_loading(Subject.objects.live())
+            return list_response(request, self, subjects, SubjectSerializer)
 
     # Create a new subject
     def post(self, request):
@@ -137,15 +152,14 @@ class StaffAPIView(APIView):
     def get(self, request, pk=None):
         if pk:
             try:
-                staff = Staff.objects.get(pk=pk, is_deleted=False)
+                staff = StaffSerializer.setup_eager_loading(Staff.objects).get(pk=pk, is_deleted=False)
                 serializer = StaffSerializer(staff)
             except Staff.DoesNotExist:
                 return Response({'error': 'Staff not found'}, status=status.HTTP_404_NOT_FOUND)
             return Response(serializer.data)
         else:
-            staff_members = Staff.objects.filter(is_deleted=False)
-            serializer = StaffSerializer(staff_members, many=True)
-            return Response(serializer.data)
+            staff_members = StaffSerializer.setup_eager_loading(Staff.objects.live())
+            return list_response(request, self, staff_members, StaffSerializer)
 
     # Create a new staff member
     def post(self, request):
@@ -193,12 +207,37 @@ class StaffAPIView(APIView):
         return Response(status=status.HTTP_204_NO_CONTENT)
     
 
+class BulkAPIView(APIView):
+    # Batch create (POST), update (PATCH, items carry their id) and soft
+    # delete (DELETE, a list of ids) for courses, subjects or staff
+    resource = None
+
+    def respond(self, key, rows, errors, ok_status):
+        if not errors:
+            return Response(rows if key != 'deleted' else {key: rows}, status=ok_status)
+        response_status = status.HTTP_207_MULTI_STATUS if rows else status.HTTP_400_BAD_REQUEST
+        return Response({key: rows, 'errors': errors}, status=response_status)
+
+    def post(self, request):
+        rows, errors = BULK_RESOURCES[self.resource].create(request.data)
+        return self.respond('created', rows, errors, status.HTTP_201_CREATED)
+
+    def patch(self, request):
+        rows, errors = BULK_RESOURCES[self.resource].update(request.data)
+        return self.respond('updated', rows, errors, status.HTTP_200_OK)
+
+    def delete(self, request):
+        ids, errors = BULK_RESOURCES[self.resource].delete(request.data)
+        return self.respond('deleted', ids, errors, status.HTTP_200_OK)
+
+
 class DayAPIView(APIView):
     # Handles List (GET) and Create (POST) for days
 
+    @cached_get(Day)
     def get(self, request):
         # List all days
-        days = Day.objects.filter(is_deleted=False)
+        days = Day.objects.live()
         serializer = DaySerializer(days, many=True)
         return Response(serializer.data)
 
@@ -206,6 +245,7 @@ class DayAPIView(APIView):
 class PeriodAPIView(APIView):
     # Handles List (GET), Create (POST), Retrieve (GET), Update (PUT/PATCH), and Soft Delete (DELETE)
 
+    @cached_get(Period)
     def get(self, request, pk=None):
         if pk:
             # Retrieve a single Period if pk is provided
@@ -214,30 +254,19 @@ class PeriodAPIView(APIView):
             return Response(serializer.data)
         else:
             # List all periods if pk is not provided
-            periods = Period.objects.filter(is_deleted=False)
-            serializer = PeriodSerializer(periods, many=True)
-            return Response(serializer.data)
+            periods = Period.objects.live()
+            return list_response(request, self, periods, PeriodSerializer)
 
     def post(self, request):
         data = request.data
         
         if isinstance(data, list):
-            # Handle bulk creation
-            created_periods = []
-            for period_data in data:
-                serializer = PeriodSerializer(data=period_data)
-                if serializer.is_valid():
-                    start_time = serializer.validated_data['start_time']
-                    end_time = serializer.validated_data['end_time']
-
-                    # Validate if there's any overlap with other periods
-                    if not Period.objects.filter(
-                        Q(start_time__lt=end_time, end_time__gt=start_time),
-                        is_deleted=False
-                    ).exists():
-                        serializer.save()
-                        created_periods.append(serializer.data)
-            return Response(created_periods, status=status.HTTP_201_CREATED)
+            # Handle bulk creation: one overlap sweep and one insert for the whole list
+            created_periods, errors = bulk_create_periods(data)
+            if not errors:
+                return Response(created_periods, status=status.HTTP_201_CREATED)
+            response_status = status.HTTP_207_MULTI_STATUS if created_periods else status.HTTP_400_BAD_REQUEST
+            return Response({'created': created_periods, 'errors': errors}, status=response_status)
 
         else:
             # Handle single creation
@@ -304,8 +333,6 @@ class PeriodAPIView(APIView):
         return Response({"message": "Period soft deleted successfully."}, status=status.HTTP_204_NO_CONTENT)
 
 
-import traceback
-
 class GenerateTimetableAPIView(APIView):
     def post(self, request):
         # Check for existing timetables
@@ -317,22 +344,91 @@ class GenerateTimetableAPIView(APIView):
                 'clear_timetables': True  # Indicates that there are existing timetables
             }, status=status.HTTP_200_OK)
 
-        # No existing timetables, proceed to generate
         try:
-            generate_timetables_for_all_courses()
-            return Response({'message': 'Timetables generated successfully for all courses!'}, status=status.HTTP_201_CREATED)
-        except Exception as e:
-            # Print full traceback for debugging purposes
-            traceback.print_exc()
-            return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+            workers = int(request.data.get('workers', 1))
+            if workers < 0:
+                raise ValueError
+        except (TypeError, ValueError):
+            return Response({'error': 'workers must be a non-negative integer'}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Optional solver backend and its limits
+        solver = request.data.get('solver') or getattr(settings, 'TIMETABLE_SOLVER', 'greedy')
+        if solver not in SOLVERS:
+            return Response({'error': f"solver must be one of: {', '.join(SOLVERS)}"}, status=status.HTTP_400_BAD_REQUEST)
+        if getattr(settings, 'TIMETABLE_GENERATION_STREAMING', False) and solver != 'greedy':
+            return Response({'error': 'Streaming generation only supports the greedy solver'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            time_budget = request.data.get('time_budget')
+            time_budget = float(time_budget) if time_budget is not None else None
+            max_daily_load = request.data.get('max_daily_load')
+            max_daily_load = int(max_daily_load) if max_daily_load is not None else None
+            if (time_budget is not None and time_budget <= 0) or (max_daily_load is not None and max_daily_load < 1):
+                raise ValueError
+        except (TypeError, ValueError):
+            return Response({'error': 'time_budget and max_daily_load must be positive numbers'}, status=status.HTTP_400_BAD_REQUEST)
+        job_timeout = getattr(settings, 'TIMETABLE_JOB_TIMEOUT', 3600)
+        if time_budget is not None and time_budget >= job_timeout:
+            return Response({'error': f'time_budget must be below {job_timeout} seconds (TIMETABLE_JOB_TIMEOUT)'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            seed = request.data.get('seed')
+            seed = int(seed) if seed is not None else None
+        except (TypeError, ValueError):
+            return Response({'error': 'seed must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+
+        # No existing timetables, generate in the background. Only one
+        # generation may run at a time; point the client at it
+        job = start_generation_job(workers=workers, solver=solver, time_budget=time_budget, max_daily_load=max_daily_load, seed=seed)
+        if job is None:
+            active_job = active_generation_job()
+            return Response({
+                'error': 'A timetable generation job is already running.',
+                'job': GenerationJobSerializer(active_job).data if active_job else None,
+            }, status=status.HTTP_409_CONFLICT)
+        return Response({
+            'message': 'Timetable generation started.',
+            'job_id': job.id,
+            'job': GenerationJobSerializer(job).data,
+        }, status=status.HTTP_202_ACCEPTED)
+
+
+class GenerationJobAPIView(APIView):
+    # Poll generation progress and results
+    def get(self, request, job_id=None):
+        if job_id:
+            job = get_object_or_404(GenerationJob, pk=job_id)
+            return Response(GenerationJobSerializer(job).data)
+        jobs = GenerationJob.objects.all()[:20]
+        return Response(GenerationJobSerializer(jobs, many=True).data)
+
+
+class RegenerateTimetableAPIView(APIView):
+    # Recompute only what changed: the timetables of the listed courses, of
+    # the courses the listed subjects/staff teach, and any slot made invalid
+    # by other edits (deleted subjects, new or removed periods, ...)
+    def post(self, request):
+        scope = {}
+        for field in ('courses', 'subjects', 'staff'):
+            ids = request.data.get(field, [])
+            if not isinstance(ids, list) or not all(isinstance(i, int) for i in ids):
+                return Response({'error': f'{field} must be a list of ids'}, status=status.HTTP_400_BAD_REQUEST)
+            scope[field] = ids
+
+        if active_generation_job():
+            return Response({'error': 'A timetable generation job is already running.'}, status=status.HTTP_409_CONFLICT)
 
+        summary = regenerate_timetables(
+            course_ids=scope['courses'], subject_ids=scope['subjects'], staff_ids=scope['staff']
+        )
+        return Response(summary, status=status.HTTP_200_OK)
 
 
 # View to handle clearing timetables based on user confirmation
 class ClearTimetableAPIView(APIView):
     def post(self, request):
         try:
-            Timetable.objects.all().delete()
+            with transaction.atomic():
+                Timetable.objects.all().delete()
+                rebuild_course_snapshots()
             return Response({'message': 'Existing timetables cleared successfully!'}, status=status.HTTP_204_NO_CONTENT)
         except:
             return Response({'message': 'Timetables not cleared.'}, status=status.HTTP_400_BAD_REQUEST)
@@ -356,19 +452,88 @@ class TimetableAPIView(APIView):
     serializer_class = TimetableSerializer
 
     def get(self, request):
+        # ?layout=compact sends lookup blocks plus id rows instead of nested objects
+        if request.query_params.get('layout') == 'compact':
+            return Response(compact_timetable_payload(Timetable.objects.live()))
+
+        # The full list is served from the per-course snapshots
+        params = request.query_params
+        if not any(param in params for param in ('stream', 'page_size', 'cursor')):
+            return HttpResponse(timetable_list_json(), content_type='application/json')
+
         # Get all timetables where `is_deleted=False`
-        timetables = Timetable.objects.filter(is_deleted=False)
-        
-        # Serialize the queryset
-        serializer = self.serializer_class(timetables, many=True)
-        
-        # Return the serialized data in the response
-        return Response(serializer.data)
+        timetables = self.serializer_class.setup_eager_loading(Timetable.objects.live())
+
+        # Serialize as a keyset page or a chunked stream
+        return list_response(request, self, timetables, self.serializer_class)
     
+class CourseGridAPIView(APIView):
+    def get(self, request, course_id=None):
+        # Day x period grid of one course, or of ?ids=1,2,3 in one response.
+        # grid[row][column] follows the order of `periods` and `days`.
+        axes = grid_axes()
+        if course_id is not None:
+            grid = course_grids([course_id], axes).get(course_id)
+            if grid is None:
+                return Response({'error': 'Course not found'}, status=status.HTTP_404_NOT_FOUND)
+            return Response({**axes, **grid})
+
+        try:
+            ids = [int(value) for value in request.query_params.get('ids', '').split(',') if value.strip()]
+        except ValueError:
+            return Response({'error': 'ids must be a comma separated list of course ids'}, status=status.HTTP_400_BAD_REQUEST)
+        if not ids or len(ids) > MAX_BATCH_COURSES:
+            return Response({'error': f'Pass between 1 and {MAX_BATCH_COURSES} course ids'}, status=status.HTTP_400_BAD_REQUEST)
+        grids = course_grids(ids, axes)
+        return Response({**axes, 'courses': [grids[pk] for pk in dict.fromkeys(ids) if pk in grids]})
+
+class StaffTimetableAPIView(APIView):
+    def get(self, request, pk):
+        # One staff member's live lessons in weekly order, from the
+        # (staff, day, period) index; ?day= narrows it to a day id or name
+        timetables = Timetable.objects.live().filter(staff_id=pk)
+        day = request.query_params.get('day')
+        if day:
+            timetables = timetables.filter(day_id=day) if day.isdigit() else timetables.filter(day__name__iexact=day)
+        timetables = TimetableSerializer.setup_eager_loading(timetables).order_by('day_id', 'period__start_time')
+
+        data = TimetableSerializer(timetables, many=True).data
+        if not data and not Staff.objects.live().filter(pk=pk).exists():
+            return Response({'error': 'Staff not found'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(data)
+
+class TimetableExportAPIView(APIView):
+    def get(self, request, export_format):
+        # Stream every live entry as CSV or JSONL, or one course's or staff
+        # member's lessons as an .ics calendar
+        if export_format not in EXPORT_FORMATS:
+            return Response({'error': f"Unknown export format. Use one of: {', '.join(EXPORT_FORMATS)}"}, status=status.HTTP_404_NOT_FOUND)
+
+        filters, name, filename = {}, 'Timetable', 'timetable'
+        for param, model in (('course', Course), ('staff', Staff)):
+            value = request.query_params.get(param)
+            if value is None:
+                continue
+            obj = model.objects.live().filter(pk=value if value.isdigit() else 0).first()
+            if obj is None:
+                return Response({'error': f'{model.__name__} not found'}, status=status.HTTP_404_NOT_FOUND)
+            filters[f'{param}_id'] = obj.pk
+            name, filename = obj.name, f'timetable-{param}-{obj.pk}'
+        if export_format == 'ics' and not filters:
+            return Response({'error': 'An .ics export needs a course or staff member, e.g. ?course=1'}, status=status.HTTP_400_BAD_REQUEST)
+
+        chunks = iter_export(export_format, export_rows(**filters), calendar_name=name)
+        response = StreamingHttpResponse(chunks, content_type=CONTENT_TYPES[export_format])
+        response['Content-Disposition'] = f'attachment; filename="{filename}.{export_format}"'
+        return response
+
+SLOT_FIELDS = ('day', 'period', 'subject', 'staff')
+
+
 class TimetableDetailView(APIView):
     def get_object(self, timetable_id):
         try:
-            return Timetable.objects.get(id=timetable_id, is_deleted=False)
+            return TimetableSerializer.setup_eager_loading(Timetable.objects).get(id=timetable_id, is_deleted=False)
         except Timetable.DoesNotExist:
             return None
 
@@ -377,9 +542,27 @@ class TimetableDetailView(APIView):
         if not timetable_entry:
             return Response({'error': 'Timetable entry not found'}, status=status.HTTP_404_NOT_FOUND)
 
+        # Slot, subject and teacher changes get the same clash checks as a move
+        if any(field in request.data for field in SLOT_FIELDS):
+            try:
+                ids = _entry_ids(request, optional=SLOT_FIELDS)
+                move_entry(
+                    timetable_entry.pk, ids['day'] or timetable_entry.day_id, ids['period'] or timetable_entry.period_id,
+                    subject_id=ids['subject'], staff_id=ids['staff'],
+                )
+            except Timetable.DoesNotExist:
+                return Response({'error': 'Timetable entry not found'}, status=status.HTTP_404_NOT_FOUND)
+            except InvalidEdit as e:
+                return _edit_error(e)
+            timetable_entry = self.get_object(timetable_id)
+            if set(request.data) <= set(SLOT_FIELDS):
+                return Response(TimetableSerializer(timetable_entry).data)
+
         serializer = TimetableSerializer(timetable_entry, data=request.data, partial=True)
         if serializer.is_valid():
-            serializer.save()
+            with transaction.atomic():
+                serializer.save()
+                rebuild_course_snapshots([timetable_entry.course_id])
             return Response(serializer.data)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -389,5 +572,89 @@ class TimetableDetailView(APIView):
             return Response({'error': 'Timetable entry not found'}, status=status.HTTP_404_NOT_FOUND)
 
         timetable_entry.is_deleted = True
-        timetable_entry.save()
-        return Response({'message': 'Timetable entry deleted successfully!'}, status=status.HTTP_204_NO_CONTENT)
\ No newline at end of file
+        with transaction.atomic():
+            timetable_entry.save()
+            rebuild_course_snapshots([timetable_entry.course_id])
+        return Response({'message': 'Timetable entry deleted successfully!'}, status=status.HTTP_204_NO_CONTENT)
+
+
+def _entry_ids(request, *fields, optional=()):
+    # Integer ids from the request body; optional ones may be missing or null
+    values = {}
+    for field in (*fields, *optional):
+        value = request.data.get(field)
+        if value is None and field in optional:
+            values[field] = None
+        elif isinstance(value, int) and not isinstance(value, bool):
+            values[field] = value
+        else:
+            raise InvalidEdit(f'{field} must be an id')
+    return values
+
+
+def _edit_response(entry_ids):
+    entries = TimetableSerializer.setup_eager_loading(Timetable.objects).filter(pk__in=entry_ids).order_by('id')
+    return Response(TimetableSerializer(entries, many=True).data)
+
+
+def _edit_error(error):
+    if isinstance(error, EditConflict):
+        return Response({'error': str(error), 'conflicts': error.conflicts}, status=status.HTTP_409_CONFLICT)
+    return Response({'error': str(error)}, status=status.HTTP_400_BAD_REQUEST)
+
+
+class TimetableMoveAPIView(APIView):
+    # Move an entry to {"day", "period"}, optionally with a new "subject" or
+    # "staff". 409 lists the clashing entries if the slot is not free.
+    def post(self, request, timetable_id):
+        try:
+            ids = _entry_ids(request, 'day', 'period', optional=('subject', 'staff'))
+            entry = move_entry(timetable_id, ids['day'], ids['period'], subject_id=ids['subject'], staff_id=ids['staff'])
+        except Timetable.DoesNotExist:
+            return Response({'error': 'Timetable entry not found'}, status=status.HTTP_404_NOT_FOUND)
+        except InvalidEdit as e:
+            return _edit_error(e)
+        return _edit_response([entry.pk])
+
+
+class TimetableSwapAPIView(APIView):
+    # Swap the lessons of this entry and {"with": other entry of the same course}
+    def post(self, request, timetable_id):
+        try:
+            other_id = _entry_ids(request, 'with')['with']
+            first, second = swap_entries(timetable_id, other_id)
+        except Timetable.DoesNotExist:
+            return Response({'error': 'Timetable entry not found'}, status=status.HTTP_404_NOT_FOUND)
+        except InvalidEdit as e:
+            return _edit_error(e)
+        return _edit_response([first.pk, second.pk])
+
+
+class TimetableAnalyticsAPIView(APIView):
+    # Staff workload, subject frequency and unfilled slots from SQL
+    # aggregates. Lists only overloaded staff, under-scheduled subjects and
+    # courses with unfilled slots unless ?all=1; ?max_daily_load= sets the cap.
+    def get(self, request):
+        try:
+            max_daily_load = request.query_params.get('max_daily_load')
+            max_daily_load = int(max_daily_load) if max_daily_load is not None else None
+            if max_daily_load is not None and max_daily_load < 1:
+                raise ValueError
+        except ValueError:
+            return Response({'error': 'max_daily_load must be a positive integer'}, status=status.HTTP_400_BAD_REQUEST)
+
+        report = timetable_analytics(max_daily_load)
+        if request.query_params.get('all') not in ('1', 'true'):
+            report = problems_only(report)
+        return Response(report)
+
+class MetricsAPIView(APIView):
+    def get(self, request):
+        # Prometheus scrape target; only served to local addresses by default.
+        # Behind a reverse proxy every request comes from the proxy's address,
+        # so requests it forwarded (X-Forwarded-For / Forwarded) are refused.
+        allowed = getattr(settings, 'TIMETABLE_METRICS_ALLOWED_IPS', ['127.0.0.1', '::1'])
+        forwarded = 'HTTP_X_FORWARDED_FOR' in request.META or 'HTTP_FORWARDED' in request.META
+        if request.META.get('REMOTE_ADDR') not in allowed or forwarded:
+            return Response({'error': 'Metrics are only available locally'}, status=status.HTTP_403_FORBIDDEN)
+        return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -44,6 +45,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'timetable.metrics.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -97,6 +99,33 @@ DATABASES = {
     }
 }
 
+# TIMETABLE_DB=sqlite runs against a local SQLite file instead, e.g. for
+# benchmarks on a machine without Postgres
+if os.environ.get('TIMETABLE_DB') == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db.sqlite3',
+        }
+    }
+
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# Local memory is per process: when running several server processes, point
+# this at a shared backend (Redis, Memcached) so writes in one process
+# invalidate the cached reference data of all the others.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'timetable',
+    }
+}
+
+# Seconds a cached GET response for days/periods/courses/subjects may live.
+# Writes invalidate it immediately regardless.
+TIMETABLE_CACHE_TIMEOUT = 3600
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -141,3 +170,53 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 CORS_ALLOWED_ORIGINS = [
     'http://localhost:3000',
 ]
+
+# Logging
+# Generation runs log structured records to the `timetable.generator` logger
+# (event name and fields in `extra`). With TIMETABLE_GENERATION_QUIET only the
+# per-run summary is logged, not every unfilled slot or unstaffed subject.
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'simple': {'format': '%(asctime)s %(levelname)s %(name)s: %(message)s'},
+    },
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler', 'formatter': 'simple'},
+    },
+    'loggers': {
+        'timetable': {'handlers': ['console'], 'level': 'INFO', 'propagate': False},
+    },
+}
+
+TIMETABLE_GENERATION_QUIET = False
+
+# Timetable solver backend: 'greedy' (single pass) or 'anneal' (simulated
+# annealing from the greedy result, stopping after the time budget in seconds
+# or at a perfect score). A staff member teaching more than
+# TIMETABLE_MAX_DAILY_LOAD lessons in a day is penalised; None means no cap.
+TIMETABLE_SOLVER = 'greedy'
+TIMETABLE_SOLVER_TIME_BUDGET = 5.0
+TIMETABLE_MAX_DAILY_LOAD = None
+
+# Streaming generation solves greedily one course at a time and writes the
+# entries as it goes, so memory stays flat however many courses there are.
+# Entries are inserted TIMETABLE_GENERATION_BATCH_SIZE rows per bulk insert.
+TIMETABLE_GENERATION_STREAMING = False
+TIMETABLE_GENERATION_BATCH_SIZE = 2000
+
+# Seconds a solved schedule of a seeded run stays cached for reuse
+TIMETABLE_SCHEDULE_CACHE_TIMEOUT = 86400
+
+# A generation job that has not updated its row for this many seconds is
+# taken to have died with its process and is marked failed, so new jobs can
+# start. Running jobs write a heartbeat every tenth of it.
+TIMETABLE_JOB_TIMEOUT = 3600
+
+# Request metrics (served at /api/metrics/ in Prometheus text format).
+# Requests slower than TIMETABLE_SLOW_REQUEST_MS are logged with their
+# slowest query; None turns the log off. Metrics are served only to
+# TIMETABLE_METRICS_ALLOWED_IPS, and never to requests forwarded by a proxy.
+TIMETABLE_SLOW_REQUEST_MS = None
+TIMETABLE_METRICS_ALLOWED_IPS = ['127.0.0.1', '::1']